@@ -0,0 +1,107 @@
+"""
+ICOS Analysis Cache
+Remembers the Analyst's verdict per post so metric refreshes don't re-run GPT-4o.
+
+Entries are keyed by a hash of the post text and store the virality-score
+bucket the verdict was made in plus the content_library row it was stored as.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from typing import Optional
+from embedding_cache import normalize_text
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "analyses.sqlite3")
+
+# Virality score bucket boundaries (benchmark: 20 = average, 50+ = viral)
+SCORE_BUCKET_EDGES = [10.0, 20.0, 35.0, 50.0, 80.0]
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(normalize_text(content).encode("utf-8")).hexdigest()
+
+
+def score_bucket(score: float) -> int:
+    """Index of the bucket a virality score falls in."""
+    return bisect_right(SCORE_BUCKET_EDGES, score)
+
+
+class AnalysisCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.counters = {"hit": 0, "stale": 0, "miss": 0}
+
+    @classmethod
+    def from_env(cls) -> "AnalysisCache":
+        return cls(
+            path=os.environ.get("ICOS_ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH),
+            enabled=os.environ.get("ICOS_ANALYSIS_CACHE", "1") != "0"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                create table if not exists analyses (
+                    content_hash text primary key,
+                    bucket integer not null,
+                    score real not null,
+                    analysis text not null,
+                    stored_id text,
+                    updated_at real not null
+                )
+            """)
+        return self._conn
+
+    def lookup(self, content: str, score: float) -> tuple[str, Optional[dict]]:
+        """
+        Classify a post against the cache as ("hit", entry) when its score is
+        still in the cached bucket, ("stale", entry) when it crossed a bucket
+        boundary, or ("miss", None). Entries hold bucket, score, analysis and stored_id.
+        """
+        if not self.enabled:
+            return "miss", None
+        with self._lock:
+            row = self._db().execute(
+                "select bucket, score, analysis, stored_id from analyses where content_hash = ?",
+                (content_hash(content),)
+            ).fetchone()
+            if row is None:
+                self.counters["miss"] += 1
+                return "miss", None
+
+            entry = {"bucket": row[0], "score": row[1], "analysis": json.loads(row[2]), "stored_id": row[3]}
+            status = "hit" if entry["bucket"] == score_bucket(score) else "stale"
+            self.counters[status] += 1
+            return status, entry
+
+    def put(self, content: str, score: float, analysis: dict, stored_id: Optional[str]) -> None:
+        """Remember the verdict made for a post at this score."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute(
+                "insert or replace into analyses (content_hash, bucket, score, analysis, stored_id, updated_at) values (?, ?, ?, ?, ?, ?)",
+                (content_hash(content), score_bucket(score), score, json.dumps(analysis), stored_id, time.time())
+            )
+            self._db().commit()
+
+    def update_score(self, content: str, score: float) -> None:
+        """Record a new score that stayed within the cached bucket."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute(
+                "update analyses set score = ?, updated_at = ? where content_hash = ?",
+                (score, time.time(), content_hash(content))
+            )
+            self._db().commit()
@@ -3,15 +3,25 @@ ICOS Analyst Agent - Feedback Loop
 Scores content and stores learnings back into the RAG system.
 """
 
-from openai import OpenAI
-from rag_core import ingest_content, ContentRecord
+from rag_core import ingest_content, ingest_content_bulk, update_content_performance, ContentRecord
+from analysis_cache import AnalysisCache
+from strategy_manager import record_style_score
+import llm_router
+import tracing
+from usage_ledger import workflow
 import os
+import csv
 import json
+import time
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 load_dotenv()
 
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+# Verdicts per post, reused while the score stays in the same bucket
+analysis_cache = AnalysisCache.from_env()
 
 ANALYST_SYSTEM_PROMPT = """### ROLE
 You are the Lead Data Analyst for a personal brand. You review content performance with brutal honesty.
@@ -33,6 +43,19 @@ Analyze WHY this post performed the way it did. Do not just summarize the number
 }
 """
 
+VERDICTS = ("FLOP", "AVERAGE", "WINNER")
+
+# Returned when the model's answer is not usable JSON
+FALLBACK_ANALYSIS = {
+    "verdict": "AVERAGE",
+    "primary_reason": "Could not parse analysis.",
+    "improvement_tip": "Review manually.",
+    "repurpose_recommendation": "No"
+}
+
+# Backends tried in order for analyze_post (ICOS_ROUTE_ANALYST overrides)
+llm_router.register_route("analyst", [("openai", "gpt-4o"), ("anthropic", "claude-3-5-sonnet-latest")])
+
 
 def calculate_virality_score(likes: int, comments: int, shares: int, impressions: int) -> float:
     """Calculate normalized virality score."""
@@ -42,22 +65,22 @@ def calculate_virality_score(likes: int, comments: int, shares: int, impressions
     return round(weighted / (impressions / 1000), 2)
 
 
-def analyze_and_store(
-    content: str,
-    topic: str,
-    style: str,
-    likes: int,
-    comments: int,
-    shares: int,
-    impressions: int,
-    platform: str = "linkedin"
-) -> dict:
-    """Analyze content performance and store in RAG system."""
-    
-    # Calculate score
-    score = calculate_virality_score(likes, comments, shares, impressions)
+def calculate_virality_scores(likes, comments, shares, impressions) -> np.ndarray:
+    """Vectorized calculate_virality_score over whole columns of metrics."""
+    likes, comments, shares, impressions = (
+        np.asarray(column, dtype=np.float64) for column in (likes, comments, shares, impressions)
+    )
+    weighted = likes * 1 + comments * 2 + shares * 3
+    per_thousand = np.divide(weighted * 1000, impressions, out=np.zeros_like(weighted), where=impressions != 0)
+    return np.round(per_thousand, 2)
+
+
+@tracing.traced("analyst.analyze_post")
+def analyze_post(content: str, likes: int, comments: int, shares: int, impressions: int, score: float) -> dict:
+    """Ask the analyst route (GPT-4o first) why a post performed the way it did."""
     
-    # Get AI analysis
+    # The system prompt (~190 tokens) is below OpenAI's 1024-token prefix-cache
+    # minimum, so these calls are not cached; cached tokens are still tracked.
     user_message = f"""## Post Text
 {content}
 
@@ -70,26 +93,72 @@ def analyze_and_store(
 
 Analyze this post now."""
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": ANALYST_SYSTEM_PROMPT},
-            {"role": "user", "content": user_message}
-        ],
-        temperature=0.3,
-        max_tokens=500
-    )
+    completion = llm_router.complete("analyst", ANALYST_SYSTEM_PROMPT, user_message, max_tokens=500, temperature=0.3)
+    tracing.annotate(content_chars=len(content))
     
-    # Parse JSON response
+    # Parse JSON response (a fallback backend may wrap it in a code fence)
+    text = completion.text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
     try:
-        analysis = json.loads(response.choices[0].message.content)
+        analysis = json.loads(text)
     except json.JSONDecodeError:
-        analysis = {
-            "verdict": "AVERAGE",
-            "primary_reason": "Could not parse analysis.",
-            "improvement_tip": "Review manually.",
-            "repurpose_recommendation": "No"
-        }
+        return dict(FALLBACK_ANALYSIS)
+    if not isinstance(analysis, dict):
+        return dict(FALLBACK_ANALYSIS)
+    # Valid JSON can still miss fields or invent a verdict; fill from the fallback
+    normalized = {**FALLBACK_ANALYSIS, **{k: v for k, v in analysis.items() if isinstance(v, str) and v.strip()}}
+    if normalized["verdict"] not in VERDICTS:
+        normalized["verdict"] = FALLBACK_ANALYSIS["verdict"]
+    return normalized
+
+
+@tracing.traced("analyst.analyze_and_store")
+def analyze_and_store(
+    content: str,
+    topic: str,
+    style: str,
+    likes: int,
+    comments: int,
+    shares: int,
+    impressions: int,
+    platform: str = "linkedin",
+    use_cache: bool = True
+) -> dict:
+    """
+    Analyze content performance and store in RAG system.
+    
+    Re-running for a post that was already analyzed updates its existing
+    content_library row: if the score is still in the same bucket only the
+    score changes and the cached verdict is returned without an LLM call.
+    """
+    
+    # Calculate score
+    score = calculate_virality_score(likes, comments, shares, impressions)
+    
+    status, cached = analysis_cache.lookup(content, score) if use_cache else ("miss", None)
+    tracing.annotate(cache=status if cached and cached["stored_id"] else "miss", score=score)
+    if cached and cached["stored_id"]:
+        if status == "hit":
+            update_content_performance(cached["stored_id"], virality_score=score)
+            record_style_score(style, score, previous=cached["score"])
+            analysis_cache.update_score(content, score)
+            return {"score": score, "analysis": cached["analysis"], "stored_id": cached["stored_id"], "cached": True}
+
+        # Crossed a bucket boundary: fresh verdict, same row
+        analysis = analyze_post(content, likes, comments, shares, impressions, score)
+        update_content_performance(
+            cached["stored_id"],
+            virality_score=score,
+            verdict=analysis["verdict"],
+            improvement_tip=analysis["improvement_tip"]
+        )
+        record_style_score(style, score, previous=cached["score"])
+        analysis_cache.put(content, score, analysis, cached["stored_id"])
+        return {"score": score, "analysis": analysis, "stored_id": cached["stored_id"], "cached": False}
+    
+    # Get AI analysis
+    analysis = analyze_post(content, likes, comments, shares, impressions, score)
     
     # Store in RAG
     record = ContentRecord(
@@ -103,16 +172,144 @@ Analyze this post now."""
     )
     
     stored = ingest_content(record)
+    record_style_score(style, score)
+    analysis_cache.put(content, score, analysis, stored.get("id"))
     
     return {
         "score": score,
         "analysis": analysis,
-        "stored_id": stored.get("id")
+        "stored_id": stored.get("id"),
+        "cached": False
     }
 
 
+# ========== BULK IMPORT ==========
+
+METRIC_FIELDS = ["likes", "comments", "shares", "impressions"]
+
+
+def load_posts(path: str) -> list[dict]:
+    """
+    Read a CSV or JSONL export of posts.
+    
+    Each row needs content, topic, style, likes, comments, shares and
+    impressions; platform and id are optional.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            posts = [json.loads(line) for line in f if line.strip()]
+        else:
+            posts = list(csv.DictReader(f))
+    for post in posts:
+        for metric in METRIC_FIELDS:
+            post[metric] = int(float(post.get(metric) or 0))
+        post["platform"] = post.get("platform") or "linkedin"
+    return posts
+
+
+def post_key(post: dict) -> str:
+    """Checkpoint key: the export's id if present, else a hash of the text."""
+    return str(post.get("id") or hashlib.sha256(post["content"].encode("utf-8")).hexdigest()[:16])
+
+
+def _load_checkpoint(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {json.loads(line)["key"] for line in f if line.strip()}
+
+
+@workflow("analyst-backfill")
+def bulk_analyze(
+    path: str,
+    concurrency: int = 4,
+    checkpoint_path: str = None,
+    batch_size: int = 50
+) -> dict:
+    """
+    Analyze and store a whole export of past posts.
+    
+    Scores are computed for the whole batch at once, GPT-4o analyses run
+    `concurrency` at a time, and results are written with ingest_content_bulk
+    every `batch_size` posts. Stored posts are appended to a checkpoint file,
+    so re-running the same command resumes where it stopped.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint.jsonl"
+    posts = load_posts(path)
+    done = _load_checkpoint(checkpoint_path)
+    pending = [p for p in posts if post_key(p) not in done]
+    scores = calculate_virality_scores(*([p[m] for p in pending] for m in METRIC_FIELDS))
+
+    summary = {"total": len(posts), "skipped": len(posts) - len(pending), "stored": 0, "failed": 0}
+    started = time.perf_counter()
+    buffer: list[tuple[dict, float, dict, ContentRecord]] = []
+
+    def flush():
+        outcomes = ingest_content_bulk([record for *_, record in buffer])
+        with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            for (post, score, analysis, _), outcome in zip(buffer, outcomes):
+                if "id" in outcome:
+                    checkpoint.write(json.dumps({"key": post_key(post), "stored_id": outcome["id"]}) + "\n")
+                    record_style_score(post["style"], score)
+                    # So a later analyze_and_store of this post updates its row instead of inserting another
+                    analysis_cache.put(post["content"], score, analysis, outcome["id"])
+                    summary["stored"] += 1
+                else:
+                    summary["failed"] += 1
+        buffer.clear()
+
+    analyze = tracing.propagate(analyze_post)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(analyze, p["content"], p["likes"], p["comments"], p["shares"], p["impressions"], float(score)): (p, float(score))
+            for p, score in zip(pending, scores)
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            post, score = futures[future]
+            try:
+                analysis = future.result()
+                buffer.append((post, score, analysis, ContentRecord(
+                    content=post["content"],
+                    topic=post["topic"],
+                    style=post["style"],
+                    platform=post["platform"],
+                    virality_score=score,
+                    verdict=analysis["verdict"],
+                    improvement_tip=analysis["improvement_tip"]
+                )))
+            except Exception as e:
+                summary["failed"] += 1
+                print(f"  ! {post_key(post)}: {e}")
+            if len(buffer) >= batch_size:
+                flush()
+
+            elapsed = time.perf_counter() - started
+            print(f"  [{completed}/{len(pending)}] {completed / elapsed * 60:.1f} posts/min", end="\r")
+        if buffer:
+            flush()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 1)
+    summary["posts_per_minute"] = round(len(pending) / elapsed * 60, 1) if pending and elapsed else 0.0
+    print()
+    return summary
+
+
 # CLI for testing
 if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 2 and sys.argv[1] == "bulk":
+        # python analyst_agent.py bulk posts.csv [--concurrency 8] [--checkpoint posts.ckpt.jsonl]
+        options = dict(zip(sys.argv[3::2], sys.argv[4::2]))
+        result = bulk_analyze(
+            sys.argv[2],
+            concurrency=int(options.get("--concurrency", 4)),
+            checkpoint_path=options.get("--checkpoint")
+        )
+        print(json.dumps(result, indent=2))
+        sys.exit(0)
+
     result = analyze_and_store(
         content="Test post about systems thinking.",
         topic="Systems",
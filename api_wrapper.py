@@ -4,15 +4,101 @@ Exposes Ghostwriter and Visualist agents via HTTP for n8n integration.
 """
 
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import asyncio
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
 from typing import Optional
 from sync_service import SyncService
-from ghostwriter_agent import generate_post, generate_with_auto_combo
-from visualist_agent import create_visual_for_post
+from ghostwriter_agent import generate_post_async, generate_with_auto_combo, generate_with_auto_combo_async, stream_post_async
+from visualist_agent import create_visual_for_post, create_visual_for_post_async
+from llm_usage import usage_summary
+from rate_limiter import limiter_stats
+from llm_router import router_stats
+from singleflight import singleflight_stats
+from job_queue import JobQueue
+from rag_core import embedding_cache, retrieval_stats
+import clients
+import tracing
+import usage_ledger
+import profiler
 
-app = FastAPI(title="ICOS API")
 service = SyncService()
+jobs = JobQueue.from_env()
+
+# Providers whose SDK clients are built in the background at startup, e.g.
+# "openai,anthropic" or "all" (default: none, each is built on first use)
+PREWARM_PROVIDERS = [p.strip() for p in os.environ.get("ICOS_PREWARM", "").split(",") if p.strip()]
+
+def _sync_profile_job(payload: dict) -> dict:
+    return {"branding": service.sync_branding(), "strategy": service.sync_strategy()}
+
+# Background job kinds (caps keep concurrent provider calls within quota). An
+# interrupted auto-run is failed, not replayed: it may already have scheduled its post.
+jobs.register("auto-run", lambda payload: generate_with_auto_combo(**payload), max_concurrent=2)
+jobs.register("sync-profile", _sync_profile_job, max_concurrent=1, idempotent=True)
+jobs.register("generate-visual", lambda payload: create_visual_for_post(**payload), max_concurrent=2, idempotent=True)
+
+async def _prewarm():
+    timings = await asyncio.to_thread(clients.prewarm, PREWARM_PROVIDERS)
+    print(f"Pre-warmed clients (ms): {timings}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.start()
+    if PREWARM_PROVIDERS:
+        # Off the startup path: the app serves requests while the SDKs load
+        app.state.prewarm = asyncio.create_task(_prewarm())
+    yield
+    jobs.stop()
+    await clients.aclose_all()
+
+app = FastAPI(title="ICOS API", lifespan=lifespan)
+
+def _route_of(request: Request) -> str:
+    """Route template (e.g. /jobs/{job_id}) so metrics don't explode per id."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """One span per request; X-Request-ID (given or generated) ties its stages together"""
+    route = _route_of(request)
+    # X-Workflow (e.g. from n8n) tags the request's LLM calls in the usage ledger
+    with tracing.request_context(request.headers.get("x-request-id")) as request_id, \
+            usage_ledger.workflow(request.headers.get("x-workflow") or f"api {route}"):
+        with tracing.span(f"http {request.method} {route}") as span:
+            response = await call_next(request)
+            span.set(status=response.status_code)
+            if response.status_code >= 500:
+                span.outcome = f"http:{response.status_code}"
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Statistical profile of requests sent with X-Profile: 1 or ?profile=1 (or sampled)"""
+    if not profiler.should_profile(request.headers.get("x-profile", request.query_params.get("profile"))):
+        return await call_next(request)
+    sampler = profiler.Sampler().start()
+    try:
+        response = await call_next(request)
+    finally:
+        duration_ms = sampler.stop()
+    # Streaming bodies are sent after this point and aren't in the profile
+    entry = await asyncio.to_thread(
+        profiler.save, sampler, duration_ms,
+        method=request.method, path=request.url.path, status=response.status_code,
+        request_id=response.headers.get("x-request-id")
+    )
+    response.headers["X-Profile"] = entry["name"]
+    return response
 
 class PostRequest(BaseModel):
     topic: str
@@ -25,12 +111,14 @@ class VisualRequest(BaseModel):
     style: Optional[str] = None
 
 @app.post("/sync-profile")
-def trigger_sync():
+async def trigger_sync():
     """Sync Notion branding and strategy to local/Supabase"""
     try:
         results = {}
-        results["branding"] = service.sync_branding()
-        results["strategy"] = service.sync_strategy()
+        results["branding"], results["strategy"] = await asyncio.gather(
+            service.sync_branding_async(),
+            service.sync_strategy_async()
+        )
         return {"status": "success", "data": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -41,10 +129,10 @@ class NotionUpdateRequest(BaseModel):
     draft: Optional[str] = None
 
 @app.post("/notion-update")
-def notion_update_page(req: NotionUpdateRequest):
+async def notion_update_page(req: NotionUpdateRequest):
     """Update a Notion page status and/or add a draft"""
     try:
-        service.update_idea_status(req.page_id, req.status, req.draft)
+        await service.update_idea_status_async(req.page_id, req.status, req.draft)
         return {"status": "success", "message": f"Updated Notion page {req.page_id}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -58,33 +146,157 @@ def get_combo():
         raise HTTPException(status_code=404, detail="No unused combinations available")
     return combo
 
+@app.get("/health")
+def health():
+    """Liveness check that touches no provider; lists the clients built so far"""
+    return {"status": "ok", "clients": clients.loaded()}
+
+@app.get("/usage")
+def get_usage():
+    """Token usage per agent since startup, including prompt-cache hit ratio and savings"""
+    return usage_summary()
+
+
+@app.get("/embedding-cache")
+def get_embedding_cache():
+    """Embedding cache hits (memory/disk), misses, hit rate and size since startup"""
+    return embedding_cache.stats()
+
+
+@app.get("/rate-limits")
+def get_rate_limits():
+    """Per-provider request rate, queue depth, throttle waits and retries since startup"""
+    return limiter_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Span latency histograms, in-flight gauges and error counters (Prometheus text format)"""
+    return PlainTextResponse(tracing.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+def traces(request_id: Optional[str] = None, limit: int = 200):
+    """Recent finished spans, oldest first; pass request_id for one request's stage breakdown"""
+    return tracing.recent_spans(request_id, limit)
+
+@app.get("/profiles")
+def profiles(limit: int = 50):
+    """Recent request profiles (newest first) with path, duration and sample count"""
+    return profiler.recent_profiles(limit)
+
+@app.get("/profiles/{name}")
+def profile_file(name: str):
+    """A profile in folded-stack format (feed to flamegraph.pl or speedscope)"""
+    path = profiler.profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain")
+
+@app.get("/llm-routes")
+def get_llm_routes():
+    """Per agent route: winning backend counts, hedges, failovers and backend p50/p95 latency"""
+    return router_stats()
+
+@app.get("/coalescing")
+def get_coalescing():
+    """Identical concurrent calls served by one in-flight call, per coalesced function"""
+    return singleflight_stats()
+
+@app.get("/retrieval-stats")
+def get_retrieval_stats():
+    """Per RAG stage (embedding, match_content, tips, bundle): calls, mean/max latency and deadline misses"""
+    return retrieval_stats()
+
 @app.post("/generate-post")
-def generate(req: PostRequest):
+async def generate(req: PostRequest):
     """Generate a post for a specific topic"""
     try:
-        content = generate_post(req.topic, req.style_instruction, req.platform)
+        content = await generate_post_async(req.topic, req.style_instruction, req.platform)
         return {"content": content}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-post/stream")
+async def generate_stream(req: PostRequest, request: Request):
+    """Stream a post as server-sent events: `token` events, then `done` with usage"""
+    async def events():
+        try:
+            async with aclosing(stream_post_async(req.topic, req.style_instruction, req.platform)) as stream:
+                async for event in stream:
+                    if await request.is_disconnected():
+                        # Leaving the block closes the upstream Claude stream
+                        break
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/generate-visual")
-def generate_visual(req: VisualRequest):
+async def generate_visual(req: VisualRequest):
     """Generate a visual concept for a post"""
     try:
-        concept = create_visual_for_post(req.topic, req.post_content, req.style)
+        concept = await create_visual_for_post_async(req.topic, req.post_content, req.style)
         return concept
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/auto-run")
-def auto_run():
+async def auto_run():
     """Run the full auto combo generation"""
     try:
-        result = generate_with_auto_combo()
+        result = await generate_with_auto_combo_async()
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ========== BACKGROUND JOBS ==========
+# Submit returns a job id right away; poll GET /jobs/{job_id} until it finishes.
+# An Idempotency-Key header makes n8n retries return the original job.
+
+@app.post("/jobs/auto-run", status_code=202)
+def submit_auto_run(idempotency_key: Optional[str] = Header(None)):
+    """Queue a full auto combo generation"""
+    return jobs.submit("auto-run", {}, idempotency_key)
+
+@app.post("/jobs/sync-profile", status_code=202)
+def submit_sync_profile(idempotency_key: Optional[str] = Header(None)):
+    """Queue a Notion branding + strategy sync"""
+    return jobs.submit("sync-profile", {}, idempotency_key)
+
+@app.post("/jobs/generate-visual", status_code=202)
+def submit_generate_visual(req: VisualRequest, idempotency_key: Optional[str] = Header(None)):
+    """Queue visual concept generation for a post"""
+    return jobs.submit("generate-visual", {"topic": req.topic, "post_content": req.post_content, "style": req.style}, idempotency_key)
+
+@app.get("/jobs")
+def job_stats():
+    """Job counts by status and running jobs per kind"""
+    return jobs.stats()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status (queued/running/succeeded/failed), timestamps, result and error of a job"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """Result of a finished job (409 while it is still queued or running)"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
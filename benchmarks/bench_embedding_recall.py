@@ -0,0 +1,119 @@
+"""
+ICOS Embedding Size Benchmark
+Recall vs. size for shortened and quantized content_library embeddings.
+
+Every setting (dimensions x local index dtype) is scored against the
+full-size float32 vectors: recall@k is the share of the exact top-k that the
+setting also returns, for queries drawn from the library itself. Alongside are
+index memory, pgvector column bytes, JSON payload bytes per vector and search
+latency, to pick ICOS_EMBEDDING_DIMENSIONS / ICOS_LOCAL_INDEX_DTYPE.
+
+The fake library's bag-of-words vectors lose recall fast when shortened (real
+text-embedding-3 vectors put the most information in the leading components),
+so decide dimensions with --live; the dtype columns carry over either way.
+
+Usage:
+  python benchmarks/bench_embedding_recall.py                 # fake library
+  python benchmarks/bench_embedding_recall.py --rows 20000
+  python benchmarks/bench_embedding_recall.py --live          # snapshot of content_library
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import LocalVectorIndex, STORAGE_DTYPES
+
+DIMENSIONS = [1536, 1024, 768, 512, 256]
+
+
+def fake_library(rows: int) -> list[list[float]]:
+    """Embeddings of the benchmark library, as the fake OpenAI returns them."""
+    import fakes
+    from run_benchmarks import seed_library
+
+    db = fakes.FakeDatabase()
+    seed_library(db, rows, with_embeddings=True)
+    return [r["embedding"] for r in db.tables["content_library"]]
+
+
+def live_library() -> list[list[float]]:
+    from clients import get_supabase
+    import rag_core
+
+    index = LocalVectorIndex(dimensions=rag_core.EMBEDDING_DIMENSIONS)
+    index.load_snapshot(get_supabase())
+    return index._matrix[:len(index)].tolist()
+
+
+def build(vectors: np.ndarray, dimensions: int, dtype: str) -> LocalVectorIndex:
+    index = LocalVectorIndex(dimensions=dimensions, dtype=dtype)
+    for i, vector in enumerate(vectors):
+        index.add({"id": str(i)}, vector)
+    return index
+
+
+def top_ids(index: LocalVectorIndex, query: np.ndarray, k: int) -> set:
+    return {row["id"] for row in index.search(query, match_threshold=-1.0, match_count=k)}
+
+
+def payload_bytes(vector: np.ndarray) -> dict:
+    """Bytes per vector on the wire: a JSON float list vs. the pgvector literal rag_core sends."""
+    from rag_core import to_pgvector
+
+    values = vector.tolist()
+    return {"json_list": len(json.dumps(values)), "pgvector_literal": len(to_pgvector(values))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", default=",".join(str(d) for d in DIMENSIONS))
+    parser.add_argument("--live", action="store_true", help="Use the real content_library")
+    args = parser.parse_args()
+
+    vectors = np.asarray(live_library() if args.live else fake_library(args.rows), dtype=np.float32)
+    full = vectors.shape[1]
+    rng = np.random.default_rng(3)
+    # Queries: library vectors with noise, so neighbours are close but not exact copies
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(0, 0.5 / np.sqrt(full), (len(picks), full)).astype(np.float32)
+
+    baseline = build(vectors, full, "float32")
+    truth = [top_ids(baseline, q, args.k) for q in queries]
+
+    report = {"rows": len(vectors), "source_dimensions": full, "queries": len(queries), "k": args.k, "settings": []}
+    for dimensions in [int(d) for d in args.dimensions.split(",") if int(d) <= full]:
+        head = vectors[0][:dimensions] / (np.linalg.norm(vectors[0][:dimensions]) or 1)
+        for dtype in STORAGE_DTYPES:
+            index = baseline if (dimensions, dtype) == (full, "float32") else build(vectors, dimensions, dtype)
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = top_ids(index, query, args.k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(found & expected) / len(expected))
+            report["settings"].append({
+                "dimensions": dimensions,
+                "dtype": dtype,
+                f"recall@{args.k}": round(statistics.fmean(recalls), 4),
+                "index_mb": round(index.memory_bytes() / 1e6, 2),
+                # pgvector stores 4 bytes per component plus an 8-byte header
+                "pgvector_bytes_per_row": 4 * dimensions + 8,
+                "payload_bytes_per_vector": payload_bytes(head),
+                "search_p50_ms": round(statistics.median(latencies), 3)
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+ICOS Retrieval Benchmark
+Compares the in-process LocalVectorIndex against the match_content RPC.
+
+Usage:
+  python benchmarks/bench_retrieval.py                 # synthetic library, local path only
+  python benchmarks/bench_retrieval.py --rows 20000
+  python benchmarks/bench_retrieval.py --live          # snapshot of content_library, both paths
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import LocalVectorIndex
+
+
+def time_calls(fn, repeat: int) -> dict:
+    """Run fn repeat times and summarize wall-clock latency in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+        "mean_ms": round(statistics.fmean(samples), 4)
+    }
+
+
+def synthetic_index(rows: int, dimensions: int, seed: int = 7) -> LocalVectorIndex:
+    rng = np.random.default_rng(seed)
+    index = LocalVectorIndex(dimensions=dimensions)
+    for i, vector in enumerate(rng.standard_normal((rows, dimensions), dtype=np.float32)):
+        index.add({"id": str(i), "content": f"post {i}", "verdict": "WINNER", "virality_score": 42.0}, vector)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--live", action="store_true", help="Use the real content_library and also time the RPC")
+    parser.add_argument("--query", default="Why systems beat goals")
+    args = parser.parse_args()
+
+    report = {"rows": args.rows, "dimensions": args.dimensions, "repeat": args.repeat}
+
+    if args.live:
+        import rag_core
+        from clients import get_supabase
+        start = time.perf_counter()
+        index = LocalVectorIndex(dimensions=rag_core.EMBEDDING_DIMENSIONS)
+        report["rows"] = index.load_snapshot(get_supabase())
+        report["snapshot_load_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        query = rag_core.get_embedding(args.query)
+        # Time the production RPC path (rate limiter, pgvector payload), not the local index
+        rag_core.LOCAL_INDEX_ENABLED = False
+        rag_core.local_index = None
+
+        def rpc():
+            rag_core._match_embedding(query, 3)
+
+        report["rpc"] = time_calls(rpc, min(args.repeat, 20))
+    else:
+        index = synthetic_index(args.rows, args.dimensions)
+        query = np.random.default_rng(11).standard_normal(args.dimensions).tolist()
+
+    report["index_bytes"] = index.memory_bytes()
+    report["local"] = time_calls(lambda: index.search(query, match_threshold=0.0, match_count=3), args.repeat)
+    if "rpc" in report:
+        report["speedup_p50"] = round(report["rpc"]["p50_ms"] / max(report["local"]["p50_ms"], 1e-9), 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+ICOS Startup Benchmark
+Measures cold-start cost of the API: `import api_wrapper` and time to the first
+HTTP response from a freshly spawned uvicorn process. Every sample runs in a
+new interpreter so module caches never carry over.
+
+Exits non-zero when a median exceeds its budget, so it can gate CI.
+
+Usage:
+  python benchmarks/bench_startup.py
+  python benchmarks/bench_startup.py --repeat 10 --budget-import-ms 800
+  python benchmarks/bench_startup.py --path /notion-update --prewarm all
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Provider SDKs that a cold import should not pull in
+PROVIDER_SDKS = ["openai", "anthropic", "supabase", "notion_client", "google.generativeai"]
+
+IMPORT_PROBE = f"""
+import sys, time, json
+started = time.perf_counter()
+import api_wrapper
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "sdks_loaded": [m for m in {PROVIDER_SDKS!r} if m in sys.modules]
+}}))
+"""
+
+
+def _env(prewarm: str) -> dict:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.pop("ICOS_PREWARM", None)
+    if prewarm:
+        env["ICOS_PREWARM"] = prewarm
+    return env
+
+
+def measure_import(prewarm: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=_env(prewarm),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(path: str, prewarm: str, method: str, timeout: float = 60.0) -> float:
+    """Milliseconds from spawning uvicorn to the first response on `path` (any status)."""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_wrapper:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=_env(prewarm), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method, data=b"{}" if method == "POST" else None,
+                                         headers={"Content-Type": "application/json"})
+        while time.perf_counter() - started < timeout:
+            try:
+                urllib.request.urlopen(request, timeout=timeout).read()
+                return (time.perf_counter() - started) * 1000
+            except urllib.error.HTTPError:
+                # The app answered; an error status still counts as a response
+                return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before serving a request")
+                time.sleep(0.01)
+        raise TimeoutError(f"No response from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--prewarm", default="", help="ICOS_PREWARM value for the measured process")
+    parser.add_argument("--budget-import-ms", type=float, default=1000.0)
+    parser.add_argument("--budget-first-response-ms", type=float, default=2500.0)
+    args = parser.parse_args()
+
+    imports = [measure_import(args.prewarm) for _ in range(args.repeat)]
+    first_responses = [measure_first_response(args.path, args.prewarm, args.method) for _ in range(args.repeat)]
+
+    report = {
+        "repeat": args.repeat,
+        "path": args.path,
+        "prewarm": args.prewarm or None,
+        "import": summarize([s["import_ms"] for s in imports]),
+        "sdks_loaded_at_import": imports[-1]["sdks_loaded"],
+        "first_response": summarize(first_responses),
+        "budget": {"import_ms": args.budget_import_ms, "first_response_ms": args.budget_first_response_ms}
+    }
+    report["within_budget"] = (
+        report["import"]["median_ms"] <= args.budget_import_ms
+        and report["first_response"]["median_ms"] <= args.budget_first_response_ms
+    )
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["within_budget"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,731 @@
+"""
+ICOS Benchmark Fakes
+Deterministic in-process stand-ins for the OpenAI, Anthropic, Gemini, Notion and
+Supabase/PostgREST clients, with injectable latency and error rates.
+
+Each fake implements only the surface ICOS calls, returns responses shaped like
+the real SDK's, and counts every call in `call_counts` ("openai.embeddings.create",
+"supabase.content_library.select", ...). install() puts a full set into the
+clients registry so rag_core, the agents and SyncService run unmodified.
+"""
+
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from types import SimpleNamespace as ns
+from typing import Callable, Optional
+import numpy as np
+
+call_counts: Counter = Counter()
+_counts_lock = threading.Lock()
+
+
+class FakeAPIError(Exception):
+    """Shaped like SDK status errors so rate_limiter retries it the same way."""
+
+    def __init__(self, status_code: int, message: str = "injected failure", code: str = None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.code = code  # PostgREST/Postgres error code, like postgrest.APIError.code
+        self.response = ns(status_code=status_code, headers={})
+
+
+class Faults:
+    """Latency and failure injection for one provider (seeded, so runs repeat)."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self, op: str) -> tuple[float, bool]:
+        with _counts_lock:
+            call_counts[op] += 1
+        with self._lock:
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            return delay, self._rng.random() < self.error_rate
+
+    def hit(self, op: str) -> None:
+        delay, fail = self._plan(op)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeAPIError(self.error_status, op)
+
+    async def hit_async(self, op: str) -> None:
+        delay, fail = self._plan(op)
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeAPIError(self.error_status, op)
+
+
+def _op(faults: Faults, name: str, fn: Callable, asynchronous: bool) -> Callable:
+    """Wrap fn so each call goes through fault injection first."""
+    if asynchronous:
+        async def call_async(*args, **kwargs):
+            await faults.hit_async(name)
+            return fn(*args, **kwargs)
+        call_async.__qualname__ = name.split(".", 1)[-1]
+        return call_async
+
+    def call(*args, **kwargs):
+        faults.hit(name)
+        return fn(*args, **kwargs)
+    # Span names in rate_limiter come from the callable's qualname
+    call.__qualname__ = name.split(".", 1)[-1]
+    return call
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _text_of(content) -> str:
+    """Flatten Anthropic-style content (str or list of blocks) to text."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _cached_prefix_tokens(system, messages: list[dict]) -> int:
+    """Tokens up to the last cache_control block, if that prefix reaches the 1024-token minimum."""
+    blocks = [system] if isinstance(system, str) else list(system or [])
+    for m in messages:
+        blocks.extend([m["content"]] if isinstance(m["content"], str) else m["content"])
+    prefix, cached = "", 0
+    for block in blocks:
+        prefix += _text_of([block]) if isinstance(block, dict) else block
+        if isinstance(block, dict) and "cache_control" in block:
+            cached = _tokens(prefix)
+    return cached if cached >= 1024 else 0
+
+
+# ========== EMBEDDINGS ==========
+
+@lru_cache(maxsize=50000)
+def _word_vector(word: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+
+
+def fake_embedding(text: str, dimensions: int = 1536) -> list[float]:
+    """Bag-of-words embedding: texts sharing words land close together, like real ones."""
+    words = [w.strip(".,!?:;\"'()").lower() for w in text.split()]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in words:
+        if word:
+            vector += _word_vector(word, dimensions)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+# ========== OPENAI ==========
+
+VERDICTS = ["FLOP", "AVERAGE", "WINNER"]
+
+
+class FakeOpenAI:
+    def __init__(self, faults: Faults = None, asynchronous: bool = False, dimensions: int = 1536):
+        self.faults = faults or Faults()
+        self.dimensions = dimensions
+        self.embeddings = ns(create=_op(self.faults, "openai.embeddings.create", self._embed, asynchronous))
+        self.chat = ns(completions=ns(
+            create=_op(self.faults, "openai.chat.completions.create", self._chat, asynchronous)
+        ))
+
+    def _embed(self, model: str, input, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        return ns(
+            data=[ns(index=i, embedding=fake_embedding(t, kwargs.get("dimensions") or self.dimensions)) for i, t in enumerate(texts)],
+            model=model,
+            usage=ns(prompt_tokens=sum(_tokens(t) for t in texts), total_tokens=sum(_tokens(t) for t in texts))
+        )
+
+    def _chat(self, model: str, messages: list[dict], **kwargs):
+        prompt = "".join(_text_of(m["content"]) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        answer = json.dumps({
+            "verdict": VERDICTS[digest[0] % 3],
+            "primary_reason": "Deterministic fake analysis.",
+            "improvement_tip": f"Tip {digest[1] % 20}: lead with a sharper hook.",
+            "repurpose_recommendation": "No"
+        })
+        system_tokens = sum(_tokens(_text_of(m["content"])) for m in messages if m["role"] == "system")
+        return ns(
+            choices=[ns(message=ns(content=answer), finish_reason="stop")],
+            usage=ns(
+                prompt_tokens=_tokens(prompt),
+                completion_tokens=_tokens(answer),
+                prompt_tokens_details=ns(cached_tokens=system_tokens if system_tokens >= 1024 else 0)
+            )
+        )
+
+
+# ========== ANTHROPIC ==========
+
+class _FakeStream:
+    def __init__(self, message, token_delay: float, asynchronous: bool):
+        self.message = message
+        self.token_delay = token_delay
+        self.asynchronous = asynchronous
+
+    def _words(self) -> list[str]:
+        words = self.message.content[0].text.split(" ")
+        return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        if self.asynchronous:
+            return self._async_text_stream()
+        return self._sync_text_stream()
+
+    def _sync_text_stream(self):
+        for word in self._words():
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word
+
+    async def _async_text_stream(self):
+        for word in self._words():
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word
+
+    def get_final_message(self):
+        if self.asynchronous:
+            async def final():
+                return self.message
+            return final()
+        return self.message
+
+
+class FakeAnthropic:
+    def __init__(self, faults: Faults = None, asynchronous: bool = False, output_words: int = 180,
+                 token_latency_ms: float = 0.0):
+        self.faults = faults or Faults()
+        self.asynchronous = asynchronous
+        self.output_words = output_words
+        self.token_latency_ms = token_latency_ms
+        self.messages = ns(
+            create=_op(self.faults, "anthropic.messages.create", self._create, asynchronous),
+            stream=self._stream
+        )
+
+    def with_options(self, **kwargs) -> "FakeAnthropic":
+        return self
+
+    def _create(self, model: str, max_tokens: int, messages: list[dict], system=None, **kwargs):
+        prompt = _text_of(system or "") + "".join(_text_of(m["content"]) for m in messages)
+        rng = random.Random(prompt)
+        text = " ".join(rng.choice(["systems", "leverage", "delegate", "focus", "build", "ship", "scale"])
+                        for _ in range(self.output_words))
+        cached = _cached_prefix_tokens(system, messages)
+        return ns(
+            content=[ns(type="text", text=text)],
+            stop_reason="end_turn",
+            usage=ns(
+                input_tokens=_tokens(prompt) - cached,
+                output_tokens=_tokens(text),
+                cache_read_input_tokens=cached,
+                cache_creation_input_tokens=0
+            )
+        )
+
+    def _stream(self, **kwargs):
+        # Only opening the stream goes through fault injection, as with the real SDK
+        self.faults.hit("anthropic.messages.stream")
+        return _FakeStream(self._create(**kwargs), self.token_latency_ms / 1000, self.asynchronous)
+
+
+# ========== GEMINI ==========
+
+class FakeGeminiModel:
+    def __init__(self, faults: Faults = None):
+        self.faults = faults or Faults()
+        self.generate_content = _op(self.faults, "gemini.generate_content", self._generate, False)
+        self.generate_content_async = _op(self.faults, "gemini.generate_content", self._generate, True)
+
+    def _generate(self, prompt: str, **kwargs):
+        concept = {
+            "style": "Napkin Sketch",
+            "concept": "A hand-drawn flywheel of the post's core idea.",
+            "imagen_prompt": "Hand-drawn flywheel on a white napkin, black pen, thick lines"
+        }
+        text = json.dumps(concept)
+        return ns(text=text, usage_metadata=ns(
+            prompt_token_count=_tokens(prompt), candidates_token_count=_tokens(text), cached_content_token_count=0
+        ))
+
+
+# ========== NOTION ==========
+
+class FakeNotionStore:
+    """Block trees and database rows shared by the sync and async Notion fakes."""
+
+    def __init__(self):
+        self.children: dict[str, list[dict]] = {}
+        self.databases: dict[str, list[dict]] = {}
+        self.pages: dict[str, dict] = {}
+
+    def add_blocks(self, parent_id: str, blocks: list[dict]) -> None:
+        self.children.setdefault(parent_id, []).extend(blocks)
+
+    def add_page(self, page_id: str, paragraphs: int, nested_every: int = 10, words: int = 18) -> int:
+        """
+        A page of `paragraphs` text blocks separated by empty paragraphs, with
+        every `nested_every`-th block a toggle holding one nested paragraph.
+        Returns the total number of blocks created.
+        """
+        rng = random.Random(page_id)
+        vocabulary = ["systems", "delegation", "founder", "leverage", "clarity", "process", "team",
+                      "automation", "focus", "leadership", "growth", "habits", "hiring", "offer"]
+        blocks, count = [], 0
+        for i in range(paragraphs):
+            text = " ".join(rng.choice(vocabulary) for _ in range(words)) + f" ({page_id} #{i})."
+            block_id = f"{page_id}-b{i}"
+            nested = nested_every and i % nested_every == nested_every - 1
+            block_type = "toggle" if nested else "paragraph"
+            blocks.append(_text_block(block_id, block_type, text, has_children=bool(nested)))
+            blocks.append(_text_block(f"{block_id}-gap", "paragraph", ""))
+            count += 2
+            if nested:
+                self.add_blocks(block_id, [_text_block(f"{block_id}-c", "paragraph", f"Nested note for {text}")])
+                count += 1
+        self.add_blocks(page_id, blocks)
+        return count
+
+    def paginate(self, items: list[dict], page_size: int = 100, start_cursor: str = None) -> dict:
+        start = int(start_cursor or 0)
+        end = start + page_size
+        return {
+            "object": "list",
+            "results": items[start:end],
+            "has_more": end < len(items),
+            "next_cursor": str(end) if end < len(items) else None
+        }
+
+
+def _text_block(block_id: str, block_type: str, text: str, has_children: bool = False) -> dict:
+    return {
+        "object": "block",
+        "id": block_id,
+        "type": block_type,
+        "has_children": has_children,
+        block_type: {"rich_text": [{"type": "text", "plain_text": text, "text": {"content": text}}] if text else []}
+    }
+
+
+class FakeNotion:
+    def __init__(self, store: FakeNotionStore = None, faults: Faults = None, asynchronous: bool = False):
+        self.store = store or FakeNotionStore()
+        self.faults = faults or Faults()
+        self.blocks = ns(children=ns(
+            list=_op(self.faults, "notion.blocks.children.list", self._list_children, asynchronous),
+            append=_op(self.faults, "notion.blocks.children.append", self._append_children, asynchronous)
+        ))
+        self.databases = ns(query=_op(self.faults, "notion.databases.query", self._query, asynchronous))
+        self.pages = ns(
+            create=_op(self.faults, "notion.pages.create", self._create_page, asynchronous),
+            update=_op(self.faults, "notion.pages.update", self._update_page, asynchronous)
+        )
+
+    def _list_children(self, block_id: str, page_size: int = 100, start_cursor: str = None, **kwargs) -> dict:
+        return self.store.paginate(self.store.children.get(block_id, []), page_size, start_cursor)
+
+    def _append_children(self, block_id: str, children: list[dict], **kwargs) -> dict:
+        self.store.add_blocks(block_id, children)
+        return {"object": "list", "results": children}
+
+    def _query(self, database_id: str, page_size: int = 100, start_cursor: str = None, **query) -> dict:
+        return self.store.paginate(self.store.databases.get(database_id, []), page_size, start_cursor)
+
+    def _create_page(self, parent: dict, properties: dict, **kwargs) -> dict:
+        page = {"object": "page", "id": str(uuid.uuid4()), "properties": properties}
+        self.store.pages[page["id"]] = page
+        if "database_id" in parent:
+            self.store.databases.setdefault(parent["database_id"], []).append(page)
+        return page
+
+    def _update_page(self, page_id: str, properties: dict, **kwargs) -> dict:
+        page = self.store.pages.setdefault(page_id, {"object": "page", "id": page_id, "properties": {}})
+        page["properties"].update(properties)
+        return page
+
+
+# ========== SUPABASE / POSTGREST ==========
+
+class FakeDatabase:
+    """In-memory tables plus the RPCs ICOS calls, shared by sync and async clients."""
+
+    def __init__(self, tables: list[str] = None):
+        self.tables: dict[str, list[dict]] = {name: [] for name in (tables or [
+            "content_library", "user_profile", "topics", "styles", "content_schedule"
+        ])}
+        self.rpcs: dict[str, Callable[[dict], object]] = {
+            "match_content": self._match_content,
+            "get_winners": self._get_winners,
+            "get_recent_tips": self._get_recent_tips,
+            "get_rag_bundle": self._get_rag_bundle,
+            "bulk_set_embeddings": self._bulk_set_embeddings
+        }
+        self.version = 0
+        self._clock = 0
+        self._matrix_cache = None
+        self._lock = threading.RLock()
+
+    def table(self, name: str) -> list[dict]:
+        if name not in self.tables:
+            raise FakeAPIError(404, f'relation "public.{name}" does not exist', code="42P01")
+        return self.tables[name]
+
+    def new_row(self, row: dict) -> dict:
+        """Fill server-side defaults (id, timestamps) like the real schema."""
+        self._clock += 1
+        stamp = datetime.fromtimestamp(1_700_000_000 + self._clock).isoformat()
+        return {"id": str(uuid.uuid4()), "created_at": stamp, "analyzed_at": stamp, **row}
+
+    def seed(self, name: str, rows: list[dict]) -> None:
+        with self._lock:
+            self.table(name).extend(self.new_row(r) for r in rows)
+            self.version += 1
+
+    def register_rpc(self, name: str, fn: Callable[[dict], object]) -> None:
+        self.rpcs[name] = fn
+
+    # ---- RPCs ----
+
+    @staticmethod
+    def _vector(value) -> list[float]:
+        """pgvector params and columns arrive as '[0.1,...]' literals or JSON lists."""
+        return json.loads(value) if isinstance(value, str) else value
+
+    def _embedded_matrix(self):
+        """Normalized content_library embeddings, rebuilt only after writes."""
+        if self._matrix_cache is None or self._matrix_cache[0] != self.version:
+            rows = [r for r in self.tables["content_library"] if r.get("embedding") is not None]
+            matrix = np.asarray([self._vector(r["embedding"]) for r in rows], dtype=np.float32).reshape(len(rows), -1)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True) if len(rows) else 1
+            self._matrix_cache = (self.version, rows, matrix / np.where(norms == 0, 1, norms))
+        return self._matrix_cache[1], self._matrix_cache[2]
+
+    def _match_content(self, params: dict) -> list[dict]:
+        rows, matrix = self._embedded_matrix()
+        if not rows:
+            return []
+        query = np.asarray(self._vector(params["query_embedding"]), dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1))
+        order = [i for i in np.argsort(-scores) if scores[i] > params.get("match_threshold", 0.7)]
+        return [
+            {**{k: rows[i].get(k) for k in ("id", "content", "topic", "style", "virality_score", "verdict", "improvement_tip")},
+             "similarity": float(scores[i])}
+            for i in order[:params.get("match_count", 5)]
+        ]
+
+    def _get_winners(self, params: dict) -> list[dict]:
+        winners = [r for r in self.tables["content_library"] if r.get("verdict") == "WINNER"]
+        winners.sort(key=lambda r: r.get("virality_score") or 0, reverse=True)
+        return [{k: r.get(k) for k in ("id", "content", "topic", "virality_score", "improvement_tip")}
+                for r in winners[:params.get("limit_count", 5)]]
+
+    def _get_recent_tips(self, params: dict) -> list[dict]:
+        rows = [r for r in self.tables["content_library"] if r.get("improvement_tip")]
+        rows.sort(key=lambda r: r["analyzed_at"], reverse=True)
+        return [{"improvement_tip": r["improvement_tip"]} for r in rows[:params.get("limit_count", 5)]]
+
+    def _bulk_set_embeddings(self, params: dict) -> int:
+        vectors = {r["id"]: r["embedding"] for r in params["p_rows"]}
+        updated = 0
+        for row in self.table(params["p_table"]):
+            if row["id"] in vectors:
+                row[params["p_column"]] = vectors[row["id"]]
+                updated += 1
+        self.version += 1
+        return updated
+
+    def _get_rag_bundle(self, params: dict) -> dict:
+        snippet = params.get("snippet_chars", 300)
+        return {
+            "similar": self._match_content(params),
+            "tips": [t["improvement_tip"] for t in self._get_recent_tips({"limit_count": params.get("tips_count", 5)})],
+            "winners": [{**w, "content": (w["content"] or "")[:snippet]}
+                        for w in self._get_winners({"limit_count": params.get("winners_count", 3)})]
+        }
+
+
+def _columns(select: str) -> Optional[list[str]]:
+    """Plain column names of a select string; None for '*' (embedded relations are ignored)."""
+    names, depth, current = [], 0, ""
+    for ch in select + ",":
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            names.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    plain = [n for n in names if n and "(" not in n]
+    return None if "*" in plain else plain
+
+
+def _comparable(value):
+    if value == "now()":
+        return datetime.now().isoformat()
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+FAKE_REST_URL = "http://fake-supabase/rest/v1"
+
+
+class _Query:
+    """Chainable PostgREST request builder over a FakeDatabase table."""
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table_name = table
+        self.action = "select"
+        self.columns = "*"
+        self.payload = None
+        self.on_conflict = None
+        self.filters: list[Callable[[dict], bool]] = []
+        self._negate = False
+        self._order: list[tuple[str, bool]] = []
+        self._range: Optional[tuple[int, int]] = None
+        self._limit: Optional[int] = None
+
+    # ---- actions ----
+
+    def select(self, columns: str = "*", **kwargs) -> "_Query":
+        self.columns = columns
+        return self
+
+    def insert(self, rows, **kwargs) -> "_Query":
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = None, **kwargs) -> "_Query":
+        self.action, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, fields: dict, **kwargs) -> "_Query":
+        self.action, self.payload = "update", fields
+        return self
+
+    def delete(self, **kwargs) -> "_Query":
+        self.action = "delete"
+        return self
+
+    # ---- filters and modifiers ----
+
+    @property
+    def not_(self) -> "_Query":
+        self._negate = True
+        return self
+
+    def _filter(self, predicate: Callable[[dict], bool]) -> "_Query":
+        if self._negate:
+            self.filters.append(lambda r, p=predicate: not p(r))
+            self._negate = False
+        else:
+            self.filters.append(predicate)
+        return self
+
+    def eq(self, column: str, value) -> "_Query":
+        return self._filter(lambda r: r.get(column) == value)
+
+    def neq(self, column: str, value) -> "_Query":
+        return self._filter(lambda r: r.get(column) != value)
+
+    def gt(self, column: str, value) -> "_Query":
+        return self._filter(lambda r: r.get(column) is not None and _comparable(r[column]) > _comparable(value))
+
+    def gte(self, column: str, value) -> "_Query":
+        return self._filter(lambda r: r.get(column) is not None and _comparable(r[column]) >= _comparable(value))
+
+    def lte(self, column: str, value) -> "_Query":
+        return self._filter(lambda r: r.get(column) is not None and _comparable(r[column]) <= _comparable(value))
+
+    def in_(self, column: str, values) -> "_Query":
+        values = set(values)
+        return self._filter(lambda r: r.get(column) in values)
+
+    def is_(self, column: str, value) -> "_Query":
+        expected = None if value in (None, "null") else value
+        return self._filter(lambda r: r.get(column) is expected or r.get(column) == expected)
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "_Query":
+        self._order.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self._range = (start, end)
+        return self
+
+    def limit(self, count: int) -> "_Query":
+        self._limit = count
+        return self
+
+    # ---- execution ----
+
+    def _project(self, rows: list[dict]) -> list[dict]:
+        columns = _columns(self.columns)
+        return [dict(r) if columns is None else {c: r.get(c) for c in columns} for r in rows]
+
+    def _run(self) -> ns:
+        db = self.client.db
+        with db._lock:
+            table = db.table(self.table_name)
+            matches = [r for r in table if all(f(r) for f in self.filters)]
+
+            if self.action == "insert":
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                created = [db.new_row(r) for r in rows]
+                table.extend(created)
+                db.version += 1
+                return ns(data=[dict(r) for r in created])
+
+            if self.action == "upsert":
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                stored = []
+                for row in rows:
+                    key = self.on_conflict or "id"
+                    existing = next((r for r in table if key in row and r.get(key) == row[key]), None)
+                    if existing:
+                        existing.update(row)
+                    else:
+                        existing = db.new_row(row)
+                        table.append(existing)
+                    stored.append(dict(existing))
+                db.version += 1
+                return ns(data=stored)
+
+            if self.action == "update":
+                for row in matches:
+                    row.update(self.payload)
+                db.version += 1
+                return ns(data=[dict(r) for r in matches])
+
+            if self.action == "delete":
+                doomed = {id(r) for r in matches}
+                table[:] = [r for r in table if id(r) not in doomed]
+                db.version += 1
+                return ns(data=[dict(r) for r in matches])
+
+            for column, desc in reversed(self._order):
+                matches.sort(key=lambda r: (r.get(column) is None, _comparable(r.get(column))), reverse=desc)
+            if self._range:
+                matches = matches[self._range[0]:self._range[1] + 1]
+            if self._limit is not None:
+                matches = matches[:self._limit]
+            return ns(data=self._project(matches))
+
+    @property
+    def request(self) -> ns:
+        """Path and method like postgrest's RequestConfig, for span naming."""
+        method = {"select": "GET", "insert": "POST", "upsert": "POST", "update": "PATCH", "delete": "DELETE"}[self.action]
+        prefer = "return=representation" + (",resolution=merge-duplicates" if self.action == "upsert" else "")
+        return ns(path=f"{FAKE_REST_URL}/{self.table_name}", http_method=method, headers={"prefer": prefer})
+
+    def execute(self):
+        return _op(self.client.faults, f"supabase.{self.table_name}.{self.action}", self._run, self.client.asynchronous)()
+
+
+class _RpcCall:
+    def __init__(self, client: "FakeSupabase", name: str, params: dict):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def _run(self) -> ns:
+        if self.name not in self.client.db.rpcs:
+            raise FakeAPIError(404, f"function public.{self.name} does not exist", code="PGRST202")
+        with self.client.db._lock:
+            return ns(data=self.client.db.rpcs[self.name](self.params))
+
+    @property
+    def request(self) -> ns:
+        return ns(path=f"{FAKE_REST_URL}/rpc/{self.name}", http_method="POST")
+
+    def execute(self):
+        return _op(self.client.faults, f"supabase.rpc.{self.name}", self._run, self.client.asynchronous)()
+
+
+class FakeSupabase:
+    def __init__(self, db: FakeDatabase = None, faults: Faults = None, asynchronous: bool = False):
+        self.db = db or FakeDatabase()
+        self.faults = faults or Faults()
+        self.asynchronous = asynchronous
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict = None) -> _RpcCall:
+        return _RpcCall(self, name, params)
+
+
+# ========== INSTALL ==========
+
+PROVIDERS = ["openai", "anthropic", "gemini", "notion", "supabase"]
+
+
+def install(faults: dict[str, Faults] = None, gemini_models: list[str] = ("gemini-2.0-flash",)) -> ns:
+    """
+    Register a full set of fakes (sync and async) in the clients registry.
+    Returns them with the shared Supabase database and Notion store.
+    """
+    import clients
+    faults = {p: (faults or {}).get(p) or Faults() for p in PROVIDERS}
+    db, store = FakeDatabase(), FakeNotionStore()
+    fakes = ns(
+        db=db,
+        notion_store=store,
+        supabase=FakeSupabase(db, faults["supabase"]),
+        async_supabase=FakeSupabase(db, faults["supabase"], asynchronous=True),
+        openai=FakeOpenAI(faults["openai"]),
+        async_openai=FakeOpenAI(faults["openai"], asynchronous=True),
+        anthropic=FakeAnthropic(faults["anthropic"]),
+        async_anthropic=FakeAnthropic(faults["anthropic"], asynchronous=True),
+        notion=FakeNotion(store, faults["notion"]),
+        async_notion=FakeNotion(store, faults["notion"], asynchronous=True),
+        gemini=FakeGeminiModel(faults["gemini"])
+    )
+    for name in ("supabase", "async_supabase", "openai", "async_openai", "anthropic", "async_anthropic", "notion", "async_notion"):
+        clients.override(name, getattr(fakes, name))
+    for model in gemini_models:
+        clients.override(f"gemini:{model}", fakes.gemini)
+    return fakes
+
+
+def reset_counts() -> None:
+    with _counts_lock:
+        call_counts.clear()
+
+
+def snapshot_counts() -> dict[str, int]:
+    with _counts_lock:
+        return dict(sorted(call_counts.items()))
@@ -0,0 +1,275 @@
+"""
+ICOS Benchmark Suite
+Runs hot paths against the deterministic fakes in benchmarks/fakes.py and
+reports per-function latency, allocations and outbound call counts as JSON.
+
+Latency comes from untraced runs; allocations from one extra run under
+tracemalloc (peak covers everything, allocated_kb excludes the fakes'
+own memory). Caches and rate limits are off unless asked for, so results
+measure the code path rather than warm state.
+
+Usage:
+  python benchmarks/run_benchmarks.py > before.json
+  python benchmarks/run_benchmarks.py --latency-ms 40 --jitter-ms 20 --error-rate 0.02
+  python benchmarks/run_benchmarks.py --only rag --compare before.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+
+TOPICS = ["Systems Thinking", "Delegation", "Founder Burnout", "Pricing", "Hiring", "Automation"]
+STYLES = ["Contrarian", "Story", "How-To", "Listicle", "Data Hero"]
+
+
+def _configure_env(args) -> None:
+    """Set before importing ICOS modules: they read their config at import time."""
+    if not args.with_caches:
+        os.environ["ICOS_EMBEDDING_CACHE"] = "0"
+        os.environ["ICOS_ANALYSIS_CACHE"] = "0"
+    if not args.with_rate_limits:
+        for provider in fakes.PROVIDERS:
+            os.environ[f"ICOS_RATE_{provider.upper()}"] = "1000000"
+    os.environ.setdefault("ICOS_LOCAL_INDEX", "0")
+    os.environ.setdefault("ICOS_USAGE_LEDGER", "0")
+
+
+def seed_library(db: fakes.FakeDatabase, rows: int, with_embeddings: bool) -> None:
+    """content_library rows spread over TOPICS/STYLES, embedded like the fake OpenAI would."""
+    library = []
+    for i in range(rows):
+        topic, style = TOPICS[i % len(TOPICS)], STYLES[i % len(STYLES)]
+        content = f"{topic} {topic} post {i} on {style.lower()} lessons"
+        library.append({
+            "content": content,
+            "topic": topic,
+            "style": style,
+            "platform": "linkedin",
+            "virality_score": float((i * 37) % 90),
+            "verdict": fakes.VERDICTS[i % 3],
+            "improvement_tip": f"Tip {i % 20}: lead with a sharper hook.",
+            "embedding": fakes.fake_embedding(content) if with_embeddings else None
+        })
+    db.seed("content_library", library)
+
+
+def seed_strategy(db: fakes.FakeDatabase) -> None:
+    db.seed("topics", [{"name": t, "is_active": True} for t in TOPICS])
+    db.seed("styles", [{"name": s, "instruction": f"Write it as a {s}.", "is_active": True} for s in STYLES])
+
+
+class Scenario:
+    def __init__(self, name: str, fn: Callable[[], object], setup: Callable[[], None] = None,
+                 before_each: Callable[[], None] = None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+        self.before_each = before_each
+
+
+def build_scenarios(installed, args) -> list[Scenario]:
+    import rag_core
+    import strategy_manager
+    from sync_service import SyncService
+    from ghostwriter_agent import generate_post
+    from analyst_agent import analyze_and_store
+
+    loop = asyncio.new_event_loop()
+    db = installed.db
+
+    def fresh_library(rows: int, with_embeddings: bool):
+        def setup():
+            db.tables["content_library"].clear()
+            seed_library(db, rows, with_embeddings)
+        return setup
+
+    service = SyncService()
+    service.branding_page_id = "bench-branding"
+    service.profile_path = os.path.join(tempfile.mkdtemp(prefix="icos-bench-"), "user_profile.json")
+
+    def branding_setup():
+        installed.notion_store.children.clear()
+        installed.notion_store.add_page("bench-branding", paragraphs=args.branding_paragraphs)
+        db.tables["user_profile"].clear()
+
+    def cold_sampler():
+        strategy_manager._combo_sampler = None
+
+    posts = iter(range(10 ** 9))
+
+    return [
+        Scenario("rag_core.build_rag_context",
+                 lambda: rag_core.build_rag_context("Systems Thinking"),
+                 setup=fresh_library(args.library_rows, True)),
+        Scenario("rag_core.build_rag_context_async",
+                 lambda: loop.run_until_complete(rag_core.build_rag_context_async("Systems Thinking")),
+                 setup=fresh_library(args.library_rows, True)),
+        Scenario(f"sync_service.sync_branding[{args.branding_paragraphs * 2}+ blocks, full]",
+                 lambda: service.sync_branding(incremental=False),
+                 setup=branding_setup, before_each=lambda: db.tables["user_profile"].clear()),
+        Scenario(f"sync_service.sync_branding[{args.branding_paragraphs * 2}+ blocks, unchanged]",
+                 lambda: service.sync_branding(incremental=True),
+                 setup=lambda: (branding_setup(), service.sync_branding(incremental=True))),
+        Scenario(f"strategy_manager.get_weighted_combo[{args.combo_rows} rows, cold]",
+                 strategy_manager.get_weighted_combo,
+                 setup=lambda: (fresh_library(args.combo_rows, False)(), seed_strategy(db)),
+                 before_each=cold_sampler),
+        Scenario(f"strategy_manager.get_weighted_combo[{args.combo_rows} rows, warm]",
+                 strategy_manager.get_weighted_combo,
+                 setup=lambda: (cold_sampler(), strategy_manager.get_weighted_combo())),
+        Scenario("ghostwriter_agent.generate_post",
+                 lambda: generate_post("Systems Thinking", "Write it as a Contrarian."),
+                 setup=fresh_library(args.library_rows, True)),
+        Scenario("analyst_agent.analyze_and_store",
+                 lambda: analyze_and_store(f"Benchmark post {next(posts)} about systems.", "Systems Thinking",
+                                           "Contrarian", 85, 22, 5, 4500, use_cache=False),
+                 setup=fresh_library(args.library_rows, True)),
+    ]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct * len(ordered))) - 1))]
+
+
+def run_scenario(scenario: Scenario, repeat: int, fakes_file: str) -> dict:
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        if scenario.setup:
+            scenario.setup()
+
+        # Warm-up run (imports, lazy singletons) is not measured
+        if scenario.before_each:
+            scenario.before_each()
+        scenario.fn()
+
+        samples, calls = [], None
+        for i in range(repeat):
+            if scenario.before_each:
+                scenario.before_each()
+            fakes.reset_counts()
+            started = time.perf_counter()
+            scenario.fn()
+            samples.append((time.perf_counter() - started) * 1000)
+            if i == 0:
+                calls = fakes.snapshot_counts()
+
+        if scenario.before_each:
+            scenario.before_each()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        scenario.fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    ignore = [tracemalloc.Filter(False, fakes_file), tracemalloc.Filter(False, tracemalloc.__file__)]
+    allocated = sum(
+        stat.size_diff for stat in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "filename")
+        if stat.size_diff > 0
+    )
+    return {
+        "runs": repeat,
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "peak_kb": round(peak / 1024, 1),
+        "allocated_kb": round(allocated / 1024, 1),
+        "calls": calls
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline_path: str) -> None:
+    """Print per-benchmark deltas against an earlier report (to stderr)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"{'benchmark':60} {'p50 ms':>18} {'allocated kb':>22} calls", file=sys.stderr)
+    for name, result in report["results"].items():
+        old = baseline.get(name)
+        if not old:
+            print(f"{name:60} (new)", file=sys.stderr)
+            continue
+        p50 = f"{old['p50_ms']:.1f} -> {result['p50_ms']:.1f}"
+        alloc = f"{old['allocated_kb']:.0f} -> {result['allocated_kb']:.0f}"
+        calls = "same" if old["calls"] == result["calls"] else f"{sum(old['calls'].values())} -> {sum(result['calls'].values())}"
+        print(f"{name:60} {p50:>18} {alloc:>22} {calls}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", help="Run benchmarks whose name contains this text")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected latency per provider call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider calls failing with 503")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--library-rows", type=int, default=2000)
+    parser.add_argument("--combo-rows", type=int, default=10000)
+    parser.add_argument("--branding-paragraphs", type=int, default=250, help="Text blocks on the branding page (plus gaps)")
+    parser.add_argument("--with-caches", action="store_true", help="Leave embedding/analysis caches on")
+    parser.add_argument("--with-rate-limits", action="store_true", help="Keep the default per-provider rate limits")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier report to diff against")
+    args = parser.parse_args()
+
+    _configure_env(args)
+    installed = fakes.install({
+        provider: fakes.Faults(args.latency_ms, args.jitter_ms, args.error_rate, seed=args.seed + i)
+        for i, provider in enumerate(fakes.PROVIDERS)
+    })
+
+    results = {}
+    for scenario in build_scenarios(installed, args):
+        if args.only and args.only not in scenario.name:
+            continue
+        results[scenario.name] = run_scenario(scenario, args.repeat, fakes.__file__)
+        print(f"  {scenario.name}: p50 {results[scenario.name]['p50_ms']} ms", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "faults": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "seed": args.seed},
+            "caches": args.with_caches,
+            "rate_limits": args.with_rate_limits
+        },
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+ICOS Clients
+Process-wide registry of SDK clients, each built lazily on first use.
+
+Every provider gets one pooled httpx transport (sync and async) shared by all
+modules, so a process keeps a single set of keep-alive connections per API
+instead of one pool per importing module. Size and keep-alive come from
+ICOS_HTTP_POOL_SIZE and ICOS_HTTP_KEEPALIVE_SECONDS.
+
+Provider SDKs are imported inside the getters, not at module import, so a
+process only pays for the SDKs its code paths actually use (cold starts).
+prewarm() builds clients ahead of time when that is preferred.
+
+Tests and benchmarks can swap any client with override(name, client).
+"""
+
+import os
+import time
+import importlib
+import threading
+from typing import Any, Callable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_POOL_SIZE = int(os.environ.get("ICOS_HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("ICOS_HTTP_KEEPALIVE_SECONDS", "30"))
+
+# Transport default (PostgREST's); OpenAI/Anthropic/Notion pass per-request timeouts
+HTTP_TIMEOUT_SECONDS = 120.0
+
+_clients: dict[str, Any] = {}
+_lock = threading.RLock()
+_genai_configured = False
+
+
+def _limits(client_cls):
+    # OpenAI/Anthropic ship their own httpx fork; Limits must come from the same package
+    package = next(c.__module__ for c in client_cls.__mro__ if c.__name__ in ("Client", "AsyncClient"))
+    return importlib.import_module(package.split(".")[0]).Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+    )
+
+
+def _get(name: str, build: Callable[[], Any]) -> Any:
+    with _lock:
+        if name not in _clients:
+            _clients[name] = build()
+        return _clients[name]
+
+
+def override(name: str, client: Any) -> None:
+    """Replace a registered client (e.g. with a fake); None removes it so it's rebuilt lazily."""
+    with _lock:
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+
+
+def http_client(provider: str, client_cls=None):
+    """The pooled sync transport for a provider (httpx.Client unless the SDK needs its own class)."""
+    if client_cls is None:
+        from httpx import Client as client_cls
+    return _get(f"http:{provider}", lambda: client_cls(
+        limits=_limits(client_cls), timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=True
+    ))
+
+
+def async_http_client(provider: str, client_cls=None):
+    """The pooled async transport for a provider (httpx.AsyncClient unless the SDK needs its own class)."""
+    if client_cls is None:
+        from httpx import AsyncClient as client_cls
+    return _get(f"async_http:{provider}", lambda: client_cls(
+        limits=_limits(client_cls), timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=True
+    ))
+
+
+# ========== PROVIDERS ==========
+# SDK retries are off everywhere: rate_limiter.call retries with shared backoff instead
+
+def get_supabase():
+    from supabase import create_client, ClientOptions
+    return _get("supabase", lambda: create_client(
+        os.environ.get("SUPABASE_URL", ""),
+        os.environ.get("SUPABASE_KEY", ""),
+        options=ClientOptions(httpx_client=http_client("supabase"))
+    ))
+
+
+async def get_async_supabase():
+    """Async Supabase client (building it needs an await)."""
+    if "async_supabase" not in _clients:
+        from supabase import acreate_client, AsyncClientOptions
+        client = await acreate_client(
+            os.environ.get("SUPABASE_URL", ""),
+            os.environ.get("SUPABASE_KEY", ""),
+            options=AsyncClientOptions(httpx_client=async_http_client("supabase"))
+        )
+        # Another task may have won the race while we awaited; keep the first
+        _get("async_supabase", lambda: client)
+    return _clients["async_supabase"]
+
+
+def get_openai():
+    import openai
+    return _get("openai", lambda: openai.OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY", ""),
+        max_retries=0,
+        http_client=http_client("openai", openai.DefaultHttpxClient)
+    ))
+
+
+def get_async_openai():
+    import openai
+    return _get("async_openai", lambda: openai.AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY", ""),
+        max_retries=0,
+        http_client=async_http_client("openai", openai.DefaultAsyncHttpxClient)
+    ))
+
+
+def get_anthropic():
+    import anthropic
+    return _get("anthropic", lambda: anthropic.Anthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY", ""),
+        max_retries=0,
+        http_client=http_client("anthropic", anthropic.DefaultHttpxClient)
+    ))
+
+
+def get_async_anthropic():
+    import anthropic
+    return _get("async_anthropic", lambda: anthropic.AsyncAnthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY", ""),
+        max_retries=0,
+        http_client=async_http_client("anthropic", anthropic.DefaultAsyncHttpxClient)
+    ))
+
+
+def get_notion():
+    # The Notion SDK sets its base URL and headers on the transport, so it gets its own
+    from notion_client import Client
+    return _get("notion", lambda: Client(
+        auth=os.environ.get("NOTION_API_KEY", ""), client=http_client("notion")
+    ))
+
+
+def get_async_notion():
+    from notion_client import AsyncClient
+    return _get("async_notion", lambda: AsyncClient(
+        auth=os.environ.get("NOTION_API_KEY", ""), client=async_http_client("notion")
+    ))
+
+
+def configure_gemini():
+    """Import and configure the Gemini SDK once; returns the genai module."""
+    global _genai_configured
+    import google.generativeai as genai
+    with _lock:
+        if not _genai_configured:
+            genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
+            _genai_configured = True
+    return genai
+
+
+def get_gemini(model_name: str):
+    """A Gemini GenerativeModel, cached per model name."""
+    return _get(f"gemini:{model_name}", lambda: configure_gemini().GenerativeModel(model_name))
+
+
+# ========== PRE-WARM ==========
+
+PREWARM_GETTERS = {
+    "supabase": get_supabase,
+    "openai": get_openai,
+    "anthropic": get_anthropic,
+    "notion": get_notion,
+    "gemini": configure_gemini
+}
+
+
+def prewarm(providers: list[str]) -> dict:
+    """
+    Import and build the sync clients for `providers` ("all" for every one).
+    Returns ms per provider, or the error for a provider that failed.
+    """
+    if "all" in providers:
+        providers = list(PREWARM_GETTERS)
+    timings = {}
+    for provider in providers:
+        if provider not in PREWARM_GETTERS:
+            continue
+        started = time.perf_counter()
+        try:
+            PREWARM_GETTERS[provider]()
+        except Exception as e:
+            timings[provider] = f"error: {e}"
+            continue
+        timings[provider] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+def loaded() -> list[str]:
+    """Names of the clients built so far."""
+    with _lock:
+        return sorted(_clients)
+
+
+# ========== SHUTDOWN ==========
+
+def close_all() -> None:
+    """Close the sync transports and forget every client (async ones need aclose_all)."""
+    with _lock:
+        for name, client in list(_clients.items()):
+            if name.startswith("http:"):
+                client.close()
+        _clients.clear()
+
+
+async def aclose_all() -> None:
+    """Close every pooled transport, sync and async, and forget every client."""
+    with _lock:
+        async_transports = [c for n, c in _clients.items() if n.startswith("async_http:")]
+    for client in async_transports:
+        await client.aclose()
+    close_all()
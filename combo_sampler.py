@@ -0,0 +1,208 @@
+"""
+ICOS Combo Sampler
+In-process, performance-weighted topic/style sampler used in place of the
+get_weighted_combo RPC.
+
+Style weights are kept as running (sum, count) aggregates of virality_score,
+recently scheduled combos are a bitmap over (topic, style) slots, and draws
+use Vose's alias method, so choosing a combo no longer scans content_library.
+"""
+
+import random
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+import rate_limiter
+
+# Same no-repeat window as the get_weighted_combo SQL function
+NO_REPEAT_DAYS = 14
+
+# Rejection draws before falling back to an exact scan of the free combos
+MAX_DRAW_ATTEMPTS = 32
+
+# Postgres "undefined_table" and PostgREST "table not in schema cache": style_stats isn't installed
+MISSING_TABLE_CODES = {"42P01", "PGRST205"}
+
+
+class AliasTable:
+    """O(1) draws from a fixed discrete distribution (Vose's alias method)."""
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng: random.Random) -> int:
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class ComboSampler:
+    def __init__(self, supabase, refresh_seconds: float = 300, rng: random.Random = None):
+        self.supabase = supabase
+        self.refresh_seconds = refresh_seconds
+        self.rng = rng or random.Random()
+
+        self.topics: list[dict] = []
+        self.styles: list[dict] = []
+        self.style_scores: dict[str, list[float]] = {}  # style name -> [score_sum, score_count]
+        self.used = 0  # bit (topic_index * len(styles) + style_index) set = scheduled recently
+
+        self._topic_index: dict[str, int] = {}
+        self._style_index: dict[str, int] = {}
+        self._alias: Optional[AliasTable] = None
+        self._loaded_at = 0.0
+        self._loaded_on: Optional[date] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    # ========== LOADING ==========
+
+    def _load_style_scores(self) -> dict[str, list[float]]:
+        """Running aggregates from style_stats, or one scan of content_library if it isn't installed."""
+        try:
+            rows = rate_limiter.execute(self.supabase.table("style_stats").select("style, score_sum, score_count")).data or []
+            return {r["style"]: [float(r["score_sum"]), int(r["score_count"])] for r in rows}
+        except Exception as e:
+            if getattr(e, "code", None) not in MISSING_TABLE_CODES:
+                raise
+            print("style_stats is not installed (supabase_style_stats_schema.sql); scanning content_library")
+            scores: dict[str, list[float]] = {}
+            start = 0
+            while True:
+                page = rate_limiter.execute(self.supabase.table("content_library").select("style, virality_score").not_.is_(
+                    "virality_score", "null"
+                ).order("id").range(start, start + 999)).data or []
+                for row in page:
+                    agg = scores.setdefault(row["style"], [0.0, 0])
+                    agg[0] += row["virality_score"]
+                    agg[1] += 1
+                if len(page) < 1000:
+                    return scores
+                start += 1000
+
+    def refresh(self) -> None:
+        """Reload active topics/styles, style aggregates and the recent-schedule bitmap."""
+        topics = rate_limiter.execute(self.supabase.table("topics").select("id, name").eq("is_active", True).order("name")).data or []
+        styles = rate_limiter.execute(self.supabase.table("styles").select("id, name, instruction").eq("is_active", True).order("name")).data or []
+        scores = self._load_style_scores()
+        since = date.today() - timedelta(days=NO_REPEAT_DAYS)
+        recent = rate_limiter.execute(self.supabase.table("content_schedule").select("topic_id, style_id").gte(
+            "scheduled_date", since.isoformat()
+        )).data or []
+
+        with self._lock:
+            self.topics, self.styles, self.style_scores = topics, styles, scores
+            self._topic_index = {t["id"]: i for i, t in enumerate(topics)}
+            self._style_index = {s["id"]: i for i, s in enumerate(styles)}
+            self.used = 0
+            for row in recent:
+                self._set_used(row["topic_id"], row["style_id"])
+            self._rebuild_alias()
+            self._loaded_at = time.monotonic()
+            self._loaded_on = date.today()
+
+    def _is_stale(self) -> bool:
+        # A new day can release combos from the no-repeat window
+        return self._loaded_on != date.today() or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def _maybe_refresh(self) -> None:
+        if self._is_stale():
+            # One caller reloads; the rest wait for it instead of loading too
+            with self._refresh_lock:
+                if self._is_stale():
+                    self.refresh()
+
+    # ========== WEIGHTS ==========
+
+    def style_weight(self, style_name: str) -> float:
+        """1.0 base + average virality score, as in the SQL function."""
+        score_sum, count = self.style_scores.get(style_name, (0.0, 0))
+        return 1.0 + (score_sum / count if count else 0.0)
+
+    def _rebuild_alias(self) -> None:
+        # Only the style distribution needs a table; topics are drawn uniformly
+        weights = [max(self.style_weight(s["name"]), 1e-9) for s in self.styles]
+        self._alias = AliasTable(weights) if weights else None
+
+    def record_score(self, style_name: str, score: float, previous: Optional[float] = None) -> None:
+        """
+        Fold a virality score into the running style aggregate: a new row adds
+        to it, a re-scored row (previous given) swaps its old score for the new one.
+        """
+        with self._lock:
+            agg = self.style_scores.setdefault(style_name, [0.0, 0])
+            if previous is None:
+                agg[0] += score
+                agg[1] += 1
+            else:
+                agg[0] += score - previous
+            self._rebuild_alias()
+
+    # ========== SCHEDULE BITMAP ==========
+
+    def _set_used(self, topic_id: str, style_id: str) -> None:
+        t, s = self._topic_index.get(topic_id), self._style_index.get(style_id)
+        if t is not None and s is not None:
+            self.used |= 1 << (t * len(self.styles) + s)
+
+    def mark_used(self, topic_id: str, style_id: str) -> None:
+        """Exclude a just-scheduled combo from the no-repeat window."""
+        with self._lock:
+            self._set_used(topic_id, style_id)
+
+    def _is_used(self, t: int, s: int) -> bool:
+        return bool(self.used >> (t * len(self.styles) + s) & 1)
+
+    # ========== SAMPLING ==========
+
+    def _combo(self, t: int, s: int) -> dict:
+        topic, style = self.topics[t], self.styles[s]
+        return {
+            "topic_name": topic["name"],
+            "topic_id": topic["id"],
+            "style_name": style["name"],
+            "style_id": style["id"],
+            "style_instruction": style["instruction"]
+        }
+
+    def sample(self) -> Optional[dict]:
+        """
+        Draw an unused combo with probability proportional to its style weight.
+        Returns None when every active combo was scheduled in the window.
+        """
+        self._maybe_refresh()
+        with self._lock:
+            if not self.topics or self._alias is None:
+                return None
+
+            # Rejection sampling keeps draws O(1) while few combos are used
+            for _ in range(MAX_DRAW_ATTEMPTS):
+                s = self._alias.draw(self.rng)
+                t = self.rng.randrange(len(self.topics))
+                if not self._is_used(t, s):
+                    return self._combo(t, s)
+
+            free = [
+                (t, s) for t in range(len(self.topics)) for s in range(len(self.styles))
+                if not self._is_used(t, s)
+            ]
+            if not free:
+                return None
+            weights = [self.style_weight(self.styles[s]["name"]) for _, s in free]
+            t, s = self.rng.choices(free, weights=weights)[0]
+            return self._combo(t, s)
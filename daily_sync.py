@@ -11,13 +11,12 @@ Schedule this with:
 import os
 import json
 from datetime import datetime
-from notion_client import Client
 from dotenv import load_dotenv
+from clients import get_notion
+from notion_reader import NotionReader
 
 load_dotenv()
 
-notion = Client(auth=os.environ.get("NOTION_API_KEY", ""))
-
 # Your CMBA Notion page ID (extracted from URL)
 NOTION_PAGE_ID = os.environ.get("NOTION_BRANDING_PAGE_ID", "1be03013ad1e80a6a996ea7ee43e6c41")
 OUTPUT_PATH = os.path.join(os.path.dirname(__file__), "user_profile.json")
@@ -25,33 +24,13 @@ STRATEGY_PATH = os.path.join(os.path.dirname(__file__), "strategy_matrix.json")
 
 
 def extract_page_content(page_id: str) -> str:
-    """Extract text from a Notion page."""
-    blocks = notion.blocks.children.list(block_id=page_id)
-    text_parts = []
-    
-    for block in blocks.get("results", []):
-        block_type = block.get("type")
-        if block_type in ["paragraph", "heading_1", "heading_2", "heading_3", 
-                          "bulleted_list_item", "numbered_list_item", "callout"]:
-            rich_text = block.get(block_type, {}).get("rich_text", [])
-            for text in rich_text:
-                text_parts.append(text.get("plain_text", ""))
-    
-    return "\n".join(text_parts)
+    """Extract text from a Notion page (all pages of blocks, nested included)."""
+    return NotionReader(get_notion()).page_text(page_id)
 
 
 def extract_child_pages(page_id: str) -> dict:
-    """Extract content from child pages."""
-    blocks = notion.blocks.children.list(block_id=page_id)
-    child_content = {}
-    
-    for block in blocks.get("results", []):
-        if block.get("type") == "child_page":
-            child_id = block["id"]
-            child_title = block.get("child_page", {}).get("title", "Untitled")
-            child_content[child_title] = extract_page_content(child_id)
-    
-    return child_content
+    """Extract content from child pages, fetched concurrently."""
+    return NotionReader(get_notion()).child_pages(page_id)
 
 
 def sync_profile():
@@ -0,0 +1,204 @@
+"""
+ICOS Embedding Cache
+Content-addressed, disk-backed cache for OpenAI embeddings.
+
+Entries are keyed by (model, dimensions, sha256 of whitespace-normalized text),
+stored in a local SQLite file and fronted by a small in-memory LRU. Reads
+never write: disk hits record their recency in memory and write it back in
+batches, so eviction order is approximate between flushes.
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "embeddings.sqlite3")
+
+# Disk hits bump last_used in batches of this many keys (or before an eviction)
+TOUCH_BATCH = 256
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic edits map to the same cache entry."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, dimensions: int, text: str) -> str:
+    """Content address for an embedding."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{dimensions}:{digest}"
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = 20000,
+        memory_entries: int = 1024,
+        enabled: bool = True
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Row count, kept in memory so put() doesn't count(*) the table; recounted before evicting
+        self._disk_entries = 0
+        # key -> last_used for disk hits not yet written back
+        self._touched: dict[str, float] = {}
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        """Build a cache from ICOS_EMBEDDING_CACHE_* environment variables."""
+        return cls(
+            path=os.environ.get("ICOS_EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_entries=int(os.environ.get("ICOS_EMBEDDING_CACHE_MAX_ENTRIES", "20000")),
+            memory_entries=int(os.environ.get("ICOS_EMBEDDING_CACHE_MEMORY_ENTRIES", "1024")),
+            enabled=os.environ.get("ICOS_EMBEDDING_CACHE", "1") != "0"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        """Open the SQLite store on first use."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("pragma journal_mode=wal")
+            self._conn.execute("""
+                create table if not exists embeddings (
+                    key text primary key,
+                    model text not null,
+                    dimensions integer not null,
+                    embedding blob not null,
+                    last_used real not null
+                )
+            """)
+            self._conn.execute("create index if not exists embeddings_last_used on embeddings (last_used)")
+            self._disk_entries = self._conn.execute("select count(*) from embeddings").fetchone()[0]
+        return self._conn
+
+    def _flush_touched(self, db: sqlite3.Connection) -> None:
+        """Write back the recency of disk hits since the last flush (caller commits)."""
+        if self._touched:
+            db.executemany(
+                "update embeddings set last_used = ? where key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _remember(self, key: str, embedding: list[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, dimensions: int, text: str) -> Optional[list[float]]:
+        """Return a cached embedding, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        key = cache_key(model, dimensions, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._memory[key]
+
+            db = self._db()
+            row = db.execute("select embedding from embeddings where key = ?", (key,)).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._flush_touched(db)
+                db.commit()
+            embedding = array("f", row[0]).tolist()
+            self._remember(key, embedding)
+            self.counters["disk_hits"] += 1
+            return embedding
+
+    def put(self, model: str, dimensions: int, text: str, embedding: list[float]) -> None:
+        """Store an embedding and evict the least recently used entries past max_entries."""
+        if not self.enabled:
+            return
+
+        key = cache_key(model, dimensions, text)
+        with self._lock:
+            db = self._db()
+            row = (key, model, dimensions, array("f", embedding).tobytes(), time.time())
+            if db.execute("insert or ignore into embeddings (key, model, dimensions, embedding, last_used) "
+                          "values (?, ?, ?, ?, ?)", row).rowcount:
+                self._disk_entries += 1
+            else:
+                db.execute("update embeddings set model = ?, dimensions = ?, embedding = ?, last_used = ? "
+                           "where key = ?", row[1:] + row[:1])
+            self._touched.pop(key, None)
+            self.counters["writes"] += 1
+
+            if self._disk_entries > self.max_entries:
+                # Other processes may share the file: recount before deciding what to evict
+                self._flush_touched(db)
+                self._disk_entries = db.execute("select count(*) from embeddings").fetchone()[0]
+            if self._disk_entries > self.max_entries:
+                # Evict down to 90% so we don't pay for a delete on every write
+                excess = self._disk_entries - int(self.max_entries * 0.9)
+                db.execute(
+                    "delete from embeddings where key in (select key from embeddings order by last_used limit ?)",
+                    (excess,)
+                )
+                self._disk_entries -= excess
+                self.counters["evictions"] += excess
+            db.commit()
+            self._remember(key, list(embedding))
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus current sizes."""
+        with self._lock:
+            entries = self._db().execute("select count(*) from embeddings").fetchone()[0] if self.enabled else 0
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": entries,
+                "enabled": self.enabled
+            }
+
+    def clear(self) -> None:
+        """Drop every cached embedding."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._db().execute("delete from embeddings")
+            self._db().commit()
+            self._disk_entries = 0
+
+
+# CLI
+if __name__ == "__main__":
+    import sys
+    import json
+
+    cache = EmbeddingCache.from_env()
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+
+    if command == "stats":
+        # Hit/miss counters live in the process doing the lookups (GET /embedding-cache on the API)
+        stats = cache.stats()
+        print(json.dumps({"path": cache.path, "disk_entries": stats["disk_entries"], "enabled": stats["enabled"]}, indent=2))
+    elif command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    else:
+        print("Usage: python embedding_cache.py [stats|clear]")
@@ -0,0 +1,183 @@
+"""
+ICOS Embedding Migration
+Backfills a shadow vector column (embedding_next) with a new embedding model
+or dimension, so ICOS_EMBEDDING_MODEL / ICOS_EMBEDDING_DIMENSIONS can change
+without downtime or re-ingesting rows one at a time.
+
+  --mode truncate  shortens the stored vectors (first N components,
+                   re-normalized). No API calls; text-embedding-3 vectors are
+                   trained to stay meaningful when shortened. Same model only.
+  --mode reembed   embeds each row's content with --model at N dimensions,
+                   in batched requests under the shared OpenAI rate limit.
+
+Rows whose shadow column is still null are read in id order, a batch at a
+time, and written with the bulk_set_embeddings RPC. After each batch the last
+id is saved to the checkpoint file, so a crashed run picks up where it
+stopped. A final sweep from the start catches rows inserted behind the cursor
+and rows whose batch failed.
+
+Rollout:
+  1. supabase_embedding_migration.sql step 1 (shadow columns + RPC)
+  2. deploy with ICOS_EMBEDDING_SHADOW_COLUMN=embedding_next (plus
+     ICOS_EMBEDDING_SHADOW_MODEL / _DIMENSIONS) so new rows are dual-written;
+     reads stay on `embedding`
+  3. python embedding_migration.py (defaults come from the shadow settings)
+  4. cutover step in the SQL file, then deploy with the new model/dimensions
+     and without the shadow settings
+
+Usage:
+  python embedding_migration.py --dimensions 512
+  python embedding_migration.py --model text-embedding-3-large --dimensions 1024 --table content_library
+  python embedding_migration.py --dimensions 512 --reset   # start over
+"""
+
+import os
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+from clients import get_supabase
+from rag_core import (
+    EMBEDDING_MODEL, SHADOW_COLUMN, SHADOW_MODEL, SHADOW_DIMENSIONS,
+    _embed_many, shorten_embedding, to_pgvector
+)
+from vector_index import parse_embedding
+import rate_limiter
+
+load_dotenv()
+
+TABLES = ["content_library", "user_profile"]
+DEFAULT_COLUMN = SHADOW_COLUMN or "embedding_next"
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), ".cache", "embedding_migration.json")
+
+# Passes over the table: the backfill itself, then one sweep for rows it missed
+PASSES = ["backfill", "sweep"]
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    """Write via a temp file so a crash never leaves a torn checkpoint."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _fetch_batch(table: str, mode: str, column: str, after_id: str, batch_size: int) -> list[dict]:
+    """Next rows still missing `column` after `after_id` (keyset pagination: no OFFSET rescans)."""
+    columns = "id, embedding" if mode == "truncate" else "id, content"
+    query = get_supabase().table(table).select(columns).not_.is_("embedding", "null").is_(column, "null")
+    if after_id:
+        query = query.gt("id", after_id)
+    result = rate_limiter.execute(query.order("id").limit(batch_size))
+    return result.data or []
+
+
+def _target_vectors(rows: list[dict], mode: str, model: str, dimensions: int) -> list:
+    """New vector (or the exception that prevented it) per row."""
+    if mode == "truncate":
+        return [shorten_embedding(parse_embedding(r["embedding"]), dimensions) for r in rows]
+    return _embed_many([r["content"] for r in rows], use_cache=False, dimensions=dimensions, model=model)
+
+
+def migrate_table(
+    table: str,
+    dimensions: int,
+    mode: str = "truncate",
+    column: str = DEFAULT_COLUMN,
+    batch_size: int = 200,
+    checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+    model: str = EMBEDDING_MODEL
+) -> dict:
+    """Fill `column` of every embedded row in `table`, resuming from the checkpoint."""
+    if mode == "truncate" and model != EMBEDDING_MODEL:
+        raise ValueError(f"--mode truncate keeps the current model ({EMBEDDING_MODEL}); use --mode reembed for {model}")
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    settings = {"model": model, "dimensions": dimensions, "mode": mode, "column": column}
+    state = checkpoint.get(table)
+    if state and any(state.get(k) != v for k, v in settings.items()):
+        raise ValueError(
+            f"Checkpoint for {table} was made with {({k: state.get(k) for k in settings})}; "
+            f"rerun with those settings or pass --reset"
+        )
+    state = state or {**settings, "pass": PASSES[0], "last_id": None, "migrated": 0, "failed": 0, "done": False}
+    if state["done"]:
+        print(f"  {table}: already migrated ({state['migrated']} rows)")
+        return state
+
+    started, resumed_at = time.perf_counter(), state["migrated"]
+    while True:
+        rows = _fetch_batch(table, mode, column, state["last_id"], batch_size)
+        if not rows:
+            if state["pass"] == PASSES[-1]:
+                break
+            state["pass"], state["last_id"], state["failed"] = PASSES[PASSES.index(state["pass"]) + 1], None, 0
+            continue
+
+        updates = []
+        for row, vector in zip(rows, _target_vectors(rows, mode, model, dimensions)):
+            if isinstance(vector, Exception):
+                state["failed"] += 1
+                print(f"  ! {table} {row['id']}: {vector}")
+            else:
+                updates.append({"id": row["id"], "embedding": to_pgvector(vector)})
+        if updates:
+            rate_limiter.execute(get_supabase().rpc("bulk_set_embeddings", {
+                "p_table": table,
+                "p_column": column,
+                "p_rows": updates
+            }))
+
+        state["last_id"] = rows[-1]["id"]
+        state["migrated"] += len(updates)
+        checkpoint[table] = state
+        save_checkpoint(checkpoint_path, checkpoint)
+        rate = (state["migrated"] - resumed_at) / max(time.perf_counter() - started, 1e-9)
+        print(f"  {table} [{state['pass']}]: {state['migrated']} rows ({rate:.0f}/s), last id {state['last_id']}")
+
+    state["done"] = True
+    checkpoint[table] = state
+    save_checkpoint(checkpoint_path, checkpoint)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=SHADOW_MODEL, help="Embedding model for the shadow column")
+    parser.add_argument("--dimensions", type=int, default=SHADOW_DIMENSIONS, help="Target vector size, e.g. 512")
+    parser.add_argument("--mode", choices=["truncate", "reembed"],
+                        help="Default: truncate for the current model, reembed for another")
+    parser.add_argument("--table", choices=TABLES, action="append", help="Default: both tables")
+    parser.add_argument("--column", default=DEFAULT_COLUMN, help="Shadow column to fill")
+    parser.add_argument("--batch", type=int, default=200, help="Rows per read/write round trip")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--reset", action="store_true", help="Ignore and overwrite the checkpoint")
+    args = parser.parse_args()
+
+    mode = args.mode or ("truncate" if args.model == EMBEDDING_MODEL else "reembed")
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    if SHADOW_COLUMN != args.column:
+        print(f"Note: ICOS_EMBEDDING_SHADOW_COLUMN is not {args.column}; rows inserted after this run won't have it")
+
+    print(f"Backfilling {args.column} with {args.model} at {args.dimensions} dimensions ({mode})")
+    for table in args.table or TABLES:
+        try:
+            state = migrate_table(table, args.dimensions, mode, args.column, args.batch, args.checkpoint, args.model)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{table}: {state['migrated']} migrated, {state['failed']} failed")
+    print("Next: the cutover step in supabase_embedding_migration.sql, then deploy with "
+          f"ICOS_EMBEDDING_MODEL={args.model} ICOS_EMBEDDING_DIMENSIONS={args.dimensions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,30 @@ ICOS Ghostwriter Agent - Claude Edition
 Uses Anthropic Claude for content generation.
 """
 
-import os
-import anthropic
-from rag_core import build_rag_context
+import time
+import asyncio
+from typing import AsyncIterator, Iterator
+from clients import get_anthropic, get_async_anthropic
+from rag_core import build_rag_context, build_rag_context_async
+from llm_usage import extract_usage, record_usage
+import llm_router
+import rate_limiter
+import tracing
+from singleflight import coalesce
+from usage_ledger import workflow
 from strategy_manager import get_weighted_combo, schedule_content
 from datetime import date
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", ""))
+GHOSTWRITER_MODEL = "claude-3-5-sonnet-latest"
 
+# Backends tried in order for generate_post (ICOS_ROUTE_GHOSTWRITER overrides)
+llm_router.register_route("ghostwriter", [("anthropic", GHOSTWRITER_MODEL), ("openai", "gpt-4o")])
+
+# Static across calls, but at ~400 tokens below the 1024-token prompt-cache
+# minimum, so it is sent without a cache breakpoint
 GHOSTWRITER_SYSTEM_PROMPT = """### ROLE & IDENTITY
 You are the Ghostwriter Agent for Wadi Bardawil, a Fractional CSTO. Your writing style is heavily inspired by Justin Welsh's content systems. You write with extreme clarity, high "skim-ability," and zero fluff.
 
@@ -57,11 +70,8 @@ You are the Ghostwriter Agent for Wadi Bardawil, a Fractional CSTO. Your writing
 """
 
 
-def generate_post(topic: str, style_instruction: str = None, platform: str = "linkedin") -> str:
-    """Generate a post using Claude."""
-    
-    rag_context = build_rag_context(topic)
-    
+def _build_user_message(topic: str, style_instruction: str, platform: str, rag_context: str) -> str:
+    """Assemble the per-call user message around the RAG context."""
     # Priority: Latest Analyst Feedback
     impact_feedback = ""
     if "improvement_tip" in rag_context:
@@ -71,7 +81,7 @@ def generate_post(topic: str, style_instruction: str = None, platform: str = "li
     if style_instruction:
         style_block = f"\n## Style Instruction\n{style_instruction}"
     
-    user_message = f"""## Topic
+    return f"""## Topic
 {topic}
 
 ## Platform
@@ -84,18 +94,119 @@ Draft the content following the VSL framework.
 IMPORTANT: Integrate the 'CRITICAL IMPACT FEEDBACK' above to ensure this post outperforms previous ones.
 Output ONLY the post text."""
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-latest",
-        max_tokens=1024,
-        system=GHOSTWRITER_SYSTEM_PROMPT,
-        messages=[
-            {"role": "user", "content": user_message}
-        ]
-    )
+
+@coalesce("generate_post")
+@tracing.traced("ghostwriter.generate_post")
+def generate_post(topic: str, style_instruction: str = None, platform: str = "linkedin") -> str:
+    """Generate a post (Claude first; hedged/failed over to the route's other backends)."""
+    
+    rag_context = build_rag_context(topic)
+    user_message = _build_user_message(topic, style_instruction, platform, rag_context)
+
+    completion = llm_router.complete("ghostwriter", GHOSTWRITER_SYSTEM_PROMPT, user_message, max_tokens=1024)
+    tracing.annotate(topic=topic, context_chars=len(rag_context), output_chars=len(completion.text))
+    
+    return completion.text
+
+
+@coalesce("generate_post")
+@tracing.traced("ghostwriter.generate_post")
+async def generate_post_async(topic: str, style_instruction: str = None, platform: str = "linkedin") -> str:
+    """Async variant of generate_post for the API's event loop."""
+    
+    rag_context = await build_rag_context_async(topic)
+    user_message = _build_user_message(topic, style_instruction, platform, rag_context)
+
+    completion = await llm_router.complete_async("ghostwriter", GHOSTWRITER_SYSTEM_PROMPT, user_message, max_tokens=1024)
+    tracing.annotate(topic=topic, context_chars=len(rag_context), output_chars=len(completion.text))
+    
+    return completion.text
+
+
+def _done_event(final_message, started: float, first_token_at: float) -> dict:
+    """Final stream event with usage and timing stats."""
+    return {
+        "type": "done",
+        "stop_reason": final_message.stop_reason,
+        "usage": extract_usage(final_message),
+        "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _stream_attrs(final_message, started: float, first_token_at: float) -> dict:
+    """Span attributes for a finished Claude stream."""
+    return {
+        "output_tokens": extract_usage(final_message).get("output_tokens"),
+        "time_to_first_token_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None
+    }
+
+
+def stream_post(topic: str, style_instruction: str = None, platform: str = "linkedin") -> Iterator[dict]:
+    """
+    Generate a post with Claude, yielding {"type": "token"} events as text arrives
+    and a final {"type": "done"} event with usage. Closing the generator early
+    closes the Claude stream.
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    
+    rag_context = build_rag_context(topic)
+    user_message = _build_user_message(topic, style_instruction, platform, rag_context)
+
+    # A stream can't be replayed once tokens are out, so only its opening
+    # request is retried (by the SDK); the shared limiter still paces it.
+    rate_limiter.acquire("anthropic")
+    call_started = time.perf_counter()
+    with tracing.span("anthropic.messages.stream", context_chars=len(rag_context)) as span:
+        with get_anthropic().with_options(max_retries=rate_limiter.MAX_RETRIES).messages.stream(
+            model=GHOSTWRITER_MODEL,
+            max_tokens=1024,
+            system=GHOSTWRITER_SYSTEM_PROMPT,
+            messages=[
+                {"role": "user", "content": user_message}
+            ]
+        ) as stream:
+            for text in stream.text_stream:
+                first_token_at = first_token_at or time.perf_counter()
+                yield {"type": "token", "text": text}
+            final_message = stream.get_final_message()
+        span.set(**_stream_attrs(final_message, started, first_token_at))
+    record_usage("ghostwriter", "anthropic", final_message, model=GHOSTWRITER_MODEL, started=call_started)
     
-    return message.content[0].text
+    yield _done_event(final_message, started, first_token_at)
 
 
+async def stream_post_async(topic: str, style_instruction: str = None, platform: str = "linkedin") -> AsyncIterator[dict]:
+    """Async variant of stream_post."""
+    started = time.perf_counter()
+    first_token_at = None
+    
+    rag_context = await build_rag_context_async(topic)
+    user_message = _build_user_message(topic, style_instruction, platform, rag_context)
+
+    await rate_limiter.acquire_async("anthropic")
+    call_started = time.perf_counter()
+    with tracing.span("anthropic.messages.stream", context_chars=len(rag_context)) as span:
+        async with get_async_anthropic().with_options(max_retries=rate_limiter.MAX_RETRIES).messages.stream(
+            model=GHOSTWRITER_MODEL,
+            max_tokens=1024,
+            system=GHOSTWRITER_SYSTEM_PROMPT,
+            messages=[
+                {"role": "user", "content": user_message}
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                first_token_at = first_token_at or time.perf_counter()
+                yield {"type": "token", "text": text}
+            final_message = await stream.get_final_message()
+        span.set(**_stream_attrs(final_message, started, first_token_at))
+    record_usage("ghostwriter", "anthropic", final_message, model=GHOSTWRITER_MODEL, started=call_started)
+    
+    yield _done_event(final_message, started, first_token_at)
+
+
+@workflow("auto-run")
 def generate_with_auto_combo(platform: str = "linkedin") -> dict:
     """Generate a post using an auto-selected topic/style combo weighted by performance."""
     
@@ -122,6 +233,34 @@ def generate_with_auto_combo(platform: str = "linkedin") -> dict:
     }
 
 
+async def generate_with_auto_combo_async(platform: str = "linkedin") -> dict:
+    """Async variant of generate_with_auto_combo (strategy calls run in a worker thread)."""
+    
+    combo = await asyncio.to_thread(get_weighted_combo)
+    if not combo:
+        return {"error": "No unused topic/style combinations available!"}
+    
+    with workflow("auto-run"):
+        content = await generate_post_async(
+            topic=combo["topic_name"],
+            style_instruction=combo["style_instruction"],
+            platform=platform
+        )
+    
+    await asyncio.to_thread(
+        schedule_content,
+        topic_id=combo["topic_id"],
+        style_id=combo["style_id"],
+        scheduled_date=str(date.today())
+    )
+    
+    return {
+        "topic": combo["topic_name"],
+        "style": combo["style_name"],
+        "content": content
+    }
+
+
 if __name__ == "__main__":
     import sys
     
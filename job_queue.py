@@ -0,0 +1,266 @@
+"""
+ICOS Job Queue
+SQLite-backed background jobs for long-running API work.
+
+Jobs survive a restart, a bounded pool of worker threads executes them, and
+each job kind can be capped separately so concurrency matches provider quotas.
+
+Several processes may share one database: a job is claimed with a single
+UPDATE, and its owner heartbeats it while it runs. A running job whose
+heartbeat is older than LEASE_SECONDS was interrupted (crash, kill, restart).
+It is re-queued if its kind was registered as idempotent and it has attempts
+left; otherwise it is marked failed, since replaying e.g. an auto-run could
+publish the same post twice.
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional
+import tracing
+import usage_ledger
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), ".cache", "jobs.sqlite3")
+
+# Finished jobs older than this are purged on start
+RETENTION_SECONDS = 7 * 24 * 3600
+
+# A running job not heartbeated for this long is treated as interrupted
+LEASE_SECONDS = float(os.environ.get("ICOS_JOB_LEASE_SECONDS", "60"))
+
+# Starts of an idempotent job before an interruption fails it for good
+MAX_ATTEMPTS = 3
+
+
+class JobQueue:
+    def __init__(self, path: str = DEFAULT_DB_PATH, workers: int = 2):
+        self.path = path
+        self.workers = workers
+        self._handlers: dict[str, Callable[[dict], Any]] = {}
+        self._limits: dict[str, int] = {}
+        self._idempotent: set[str] = set()
+        # Identifies this process's claims in a shared database
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._heartbeat_due = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: list[threading.Thread] = []
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("""
+            create table if not exists jobs (
+                id text primary key,
+                kind text not null,
+                payload text not null,
+                status text not null,
+                result text,
+                error text,
+                idempotency_key text unique,
+                created_at real not null,
+                started_at real,
+                finished_at real,
+                attempts integer not null default 0,
+                owner text,
+                heartbeat_at real
+            )
+        """)
+        # Databases created before attempts/leases existed
+        columns = {r["name"] for r in self._conn.execute("pragma table_info(jobs)")}
+        for name, decl in (("attempts", "integer not null default 0"), ("owner", "text"), ("heartbeat_at", "real")):
+            if name not in columns:
+                self._conn.execute(f"alter table jobs add column {name} {decl}")
+        self._conn.execute("create index if not exists jobs_status_created on jobs (status, created_at)")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            path=os.environ.get("ICOS_JOB_DB_PATH", DEFAULT_DB_PATH),
+            workers=int(os.environ.get("ICOS_JOB_WORKERS", "2"))
+        )
+
+    def register(self, kind: str, handler: Callable[[dict], Any], max_concurrent: int = None,
+                 idempotent: bool = False) -> None:
+        """
+        Route jobs of `kind` to handler(payload); optionally cap how many run at
+        once. Only idempotent kinds are re-run after an interruption.
+        """
+        self._handlers[kind] = handler
+        if max_concurrent:
+            self._limits[kind] = max_concurrent
+        if idempotent:
+            self._idempotent.add(kind)
+
+    # ========== CLIENT SIDE ==========
+
+    def _row(self, row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def submit(self, kind: str, payload: dict = None, idempotency_key: str = None) -> dict:
+        """
+        Queue a job and return it immediately. Re-submitting with the same
+        idempotency key returns the existing job instead of a duplicate.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._lock:
+            if idempotency_key:
+                existing = self._conn.execute(
+                    "select * from jobs where idempotency_key = ?", (idempotency_key,)
+                ).fetchone()
+                if existing:
+                    return self._row(existing)
+
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "insert into jobs (id, kind, payload, status, idempotency_key, created_at) values (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload or {}), idempotency_key, time.time())
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+            return self._row(self._conn.execute("select * from jobs where id = ?", (job_id,)).fetchone())
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def stats(self) -> dict:
+        """Job counts by status plus jobs running per kind."""
+        with self._lock:
+            counts = dict(self._conn.execute("select status, count(*) from jobs group by status").fetchall())
+            return {"by_status": counts, "running_by_kind": dict(self._running), "workers": self.workers}
+
+    # ========== WORKER SIDE ==========
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Take the oldest queued job whose kind has spare capacity (caller holds the lock)."""
+        saturated = [k for k, limit in self._limits.items() if self._running.get(k, 0) >= limit]
+        placeholders = ",".join("?" * len(saturated))
+        now = time.time()
+        # One statement, so another process can't claim the same row in between
+        row = self._conn.execute(
+            f"""update jobs set status = 'running', started_at = ?, heartbeat_at = ?, owner = ?, attempts = attempts + 1
+                where id = (
+                    select id from jobs where status = 'queued' and kind not in ({placeholders})
+                    order by created_at limit 1
+                ) and status = 'queued'
+                returning *""",
+            (now, now, self.owner, *saturated)
+        ).fetchone()
+        self._conn.commit()
+        if row is None:
+            return None
+        self._running[row["kind"]] = self._running.get(row["kind"], 0) + 1
+        return row
+
+    def _recover_interrupted(self) -> None:
+        """Re-queue or fail running jobs whose lease expired (caller holds the lock and commits)."""
+        cutoff = time.time() - LEASE_SECONDS
+        stale = self._conn.execute(
+            "select id, kind, attempts from jobs where status = 'running' and coalesce(heartbeat_at, started_at, 0) < ?",
+            (cutoff,)
+        ).fetchall()
+        for row in stale:
+            # The lease check is repeated so a job another process just recovered and re-claimed is left alone
+            if row["kind"] in self._idempotent and row["attempts"] < MAX_ATTEMPTS:
+                self._conn.execute(
+                    """update jobs set status = 'queued', started_at = null, owner = null, heartbeat_at = null
+                       where id = ? and status = 'running' and coalesce(heartbeat_at, started_at, 0) < ?""",
+                    (row["id"], cutoff)
+                )
+            else:
+                reason = "not idempotent" if row["kind"] not in self._idempotent else f"{row['attempts']} attempts"
+                self._conn.execute(
+                    """update jobs set status = 'failed', error = ?, finished_at = ?
+                       where id = ? and status = 'running' and coalesce(heartbeat_at, started_at, 0) < ?""",
+                    (f"Interrupted while running; not retried ({reason})", time.time(), row["id"], cutoff)
+                )
+        if stale:
+            self._wakeup.notify_all()
+
+    def _heartbeat(self) -> None:
+        """Keep this process's running jobs leased and recover other owners' expired ones."""
+        with self._lock:
+            while not self._stopping:
+                self._conn.execute(
+                    "update jobs set heartbeat_at = ? where owner = ? and status = 'running'", (time.time(), self.owner)
+                )
+                self._recover_interrupted()
+                self._conn.commit()
+                self._heartbeat_due.wait(timeout=LEASE_SECONDS / 4)
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                row = None
+                while not self._stopping and (row := self._claim()) is None:
+                    self._wakeup.wait(timeout=1.0)
+                if self._stopping:
+                    if row is not None:
+                        # Put it back for the next start; it never ran, so the attempt doesn't count
+                        self._conn.execute(
+                            """update jobs set status = 'queued', started_at = null, owner = null, heartbeat_at = null,
+                               attempts = attempts - 1 where id = ?""",
+                            (row["id"],)
+                        )
+                        self._conn.commit()
+                    return
+
+            result, error = None, None
+            try:
+                # Spans of a job share its id, so /traces?request_id=job-<id> shows its breakdown
+                with tracing.request_context(f"job-{row['id']}"), tracing.span(f"job.{row['kind']}"), \
+                        usage_ledger.workflow(row["kind"]):
+                    result = json.dumps(self._handlers[row["kind"]](json.loads(row["payload"])), default=str)
+            except Exception:
+                error = traceback.format_exc(limit=5)
+
+            with self._lock:
+                self._conn.execute(
+                    "update jobs set status = ?, result = ?, error = ?, finished_at = ? where id = ?",
+                    ("failed" if error else "succeeded", result, error, time.time(), row["id"])
+                )
+                self._conn.commit()
+                self._running[row["kind"]] -= 1
+                # A slot for this kind just freed up
+                self._wakeup.notify_all()
+
+    def start(self) -> None:
+        """Recover interrupted jobs, purge old ones and start the workers."""
+        with self._lock:
+            self._stopping = False
+            self._recover_interrupted()
+            self._conn.execute(
+                "delete from jobs where status in ('succeeded', 'failed') and finished_at < ?",
+                (time.time() - RETENTION_SECONDS,)
+            )
+            self._conn.commit()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"icos-job-{i}", daemon=True)
+            for i in range(self.workers)
+        ] + [threading.Thread(target=self._heartbeat, name="icos-job-heartbeat", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop claiming new jobs and wait briefly for running ones."""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+            self._heartbeat_due.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
@@ -0,0 +1,324 @@
+"""
+ICOS LLM Router
+Provider-agnostic completions with latency budgets, hedging and failover.
+
+Agents register a route (an ordered list of provider:model backends) and call
+`complete(route, system, user)`. The first backend starts right away; if it
+hasn't answered after its own p95 latency (a fixed delay until enough calls
+have been seen), the next backend is started as a hedge and the first answer
+wins. Backends are called once, without rate_limiter's retries, so an error
+fails over to the next backend immediately; the hedge timer then restarts
+from the backend just started. Each attempt's rate-limit wait and request
+timeout fit in what's left of the route's budget, and nothing is returned
+after it: the call raises TimeoutError instead.
+
+Hedges are capped at ICOS_HEDGE_MAX_RATIO of recent calls so a slow provider
+can't double spend across the board. Which backend won each call is kept in
+router_stats(), on the trace span and in the usage ledger.
+
+Routes can be overridden per agent, e.g.
+ICOS_ROUTE_GHOSTWRITER=anthropic:claude-3-5-sonnet-latest,openai:gpt-4o
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional
+from clients import get_anthropic, get_async_anthropic, get_openai, get_async_openai
+from llm_usage import record_usage
+import rate_limiter
+import tracing
+
+# Whole-call budget (all attempts and hedges), seconds
+DEFAULT_BUDGET_SECONDS = float(os.environ.get("ICOS_LLM_BUDGET_SECONDS", "60"))
+# Hedge delay until a backend has HEDGE_MIN_SAMPLES latencies, then its p95
+HEDGE_DELAY_SECONDS = float(os.environ.get("ICOS_HEDGE_DELAY_SECONDS", "15"))
+HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("ICOS_HEDGE_MIN_DELAY_SECONDS", "2"))
+HEDGE_MIN_SAMPLES = 20
+# Most calls (out of the last HEDGE_WINDOW) that may start a hedge
+HEDGE_MAX_RATIO = float(os.environ.get("ICOS_HEDGE_MAX_RATIO", "0.1"))
+HEDGE_WINDOW = 100
+LATENCY_WINDOW = 200
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+
+
+@dataclass
+class Completion:
+    text: str
+    backend: str
+    latency_ms: float
+    hedged: bool = False
+    failovers: int = 0
+
+
+class Backend:
+    def __init__(self, provider: str, model: str):
+        if provider not in ("anthropic", "openai"):
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        self.provider = provider
+        self.model = model
+        self.name = f"{provider}:{model}"
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"calls": 0, "errors": 0}
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+    def hedge_delay(self, budget: float) -> float:
+        """Seconds to wait on this backend before hedging."""
+        delay = self.percentile(0.95) if len(self.latencies) >= HEDGE_MIN_SAMPLES else HEDGE_DELAY_SECONDS
+        return min(budget, max(HEDGE_MIN_DELAY_SECONDS, delay))
+
+    def _request(self, system: str, user: str, max_tokens: int, temperature: Optional[float]) -> dict:
+        kwargs = {"model": self.model, "max_tokens": max_tokens}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if self.provider == "anthropic":
+            kwargs["system"] = system
+            kwargs["messages"] = [{"role": "user", "content": user}]
+        else:
+            kwargs["messages"] = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+        return kwargs
+
+    def _text(self, response) -> str:
+        if self.provider == "anthropic":
+            return response.content[0].text
+        return response.choices[0].message.content
+
+    def _observe(self, agent: str, response, started: float) -> str:
+        self.latencies.append(time.perf_counter() - started)
+        record_usage(agent, self.provider, response, model=self.model, started=started)
+        return self._text(response)
+
+    def complete(self, agent: str, system: str, user: str, max_tokens: int, temperature: Optional[float], deadline: float) -> str:
+        self.stats["calls"] += 1
+        create = get_anthropic().messages.create if self.provider == "anthropic" else get_openai().chat.completions.create
+        started = time.perf_counter()
+        try:
+            response = rate_limiter.call_once(self.provider, create, deadline, **self._request(system, user, max_tokens, temperature))
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        return self._observe(agent, response, started)
+
+    async def complete_async(self, agent: str, system: str, user: str, max_tokens: int, temperature: Optional[float], deadline: float) -> str:
+        self.stats["calls"] += 1
+        create = get_async_anthropic().messages.create if self.provider == "anthropic" else get_async_openai().chat.completions.create
+        started = time.perf_counter()
+        try:
+            response = await rate_limiter.call_once_async(
+                self.provider, create, deadline, **self._request(system, user, max_tokens, temperature)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        return self._observe(agent, response, started)
+
+
+class Route:
+    def __init__(self, name: str, backends: list[Backend], budget: float):
+        self.name = name
+        self.backends = backends
+        self.budget = budget
+        self._hedges: deque = deque(maxlen=HEDGE_WINDOW)
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "failovers": 0, "exhausted": 0, "wins": {b.name: 0 for b in backends}}
+
+    def may_hedge(self) -> bool:
+        with self._lock:
+            return sum(self._hedges) < HEDGE_MAX_RATIO * HEDGE_WINDOW
+
+    def finish(self, winner: Optional[Backend], hedged: bool, failovers: int) -> None:
+        with self._lock:
+            self._hedges.append(hedged)
+            self.stats["calls"] += 1
+            self.stats["hedged"] += hedged
+            self.stats["failovers"] += failovers
+            if winner is None:
+                self.stats["exhausted"] += 1
+            else:
+                self.stats["wins"][winner.name] += 1
+
+
+_routes: dict[str, Route] = {}
+
+
+def _parse_backends(spec: str) -> list[Backend]:
+    backends = []
+    for item in spec.split(","):
+        provider, _, model = item.strip().partition(":")
+        backends.append(Backend(provider, model))
+    return backends
+
+
+def register_route(name: str, backends: list[tuple[str, str]], budget: float = None) -> Route:
+    """
+    Define the (provider, model) backends tried for `name`, in order.
+    ICOS_ROUTE_<NAME> and ICOS_LLM_BUDGET_<NAME> override them.
+    """
+    configured = os.environ.get(f"ICOS_ROUTE_{name.upper()}")
+    budget = float(os.environ.get(f"ICOS_LLM_BUDGET_{name.upper()}", budget or DEFAULT_BUDGET_SECONDS))
+    route = Route(
+        name,
+        _parse_backends(configured) if configured else [Backend(provider, model) for provider, model in backends],
+        budget
+    )
+    _routes[name] = route
+    return route
+
+
+def complete(
+    route_name: str,
+    system: str,
+    user: str,
+    max_tokens: int = 1024,
+    temperature: Optional[float] = None
+) -> Completion:
+    """Run a completion on the route's backends with hedging and failover (see module docstring)."""
+    route = _routes[route_name]
+    with tracing.span(f"llm.{route_name}") as span:
+        started = time.monotonic()
+        deadline = started + route.budget
+        queue = list(route.backends)
+        pending = {}
+        hedged, failovers, errors = False, 0, []
+        hedge_at = deadline
+
+        def launch():
+            # The hedge timer follows the newest backend, so a fresh failover isn't hedged at once
+            nonlocal hedge_at
+            backend = queue.pop(0)
+            future = _pool.submit(
+                tracing.propagate(backend.complete),
+                route_name, system, user, max_tokens, temperature, deadline
+            )
+            pending[future] = backend
+            now = time.monotonic()
+            hedge_at = now + backend.hedge_delay(deadline - now)
+
+        launch()
+        while pending and time.monotonic() < deadline:
+            can_hedge = bool(queue) and not hedged and route.may_hedge()
+            until = min(deadline, hedge_at) if can_hedge else deadline
+            done, _ = wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                if can_hedge and time.monotonic() >= hedge_at:
+                    hedged = True
+                    launch()
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    if queue and not pending:
+                        failovers += 1
+                        launch()
+                    continue
+                # Losing calls finish in the background; their usage is still recorded
+                route.finish(backend, hedged, failovers)
+                latency_ms = round((time.monotonic() - started) * 1000, 1)
+                span.set(backend=backend.name, hedged=hedged, failovers=failovers)
+                return Completion(text, backend.name, latency_ms, hedged, failovers)
+
+        route.finish(None, hedged, failovers)
+        span.set(hedged=hedged, failovers=failovers, errors=errors)
+        if not pending and errors:
+            raise RuntimeError(f"All {route_name} backends failed: {'; '.join(errors)}")
+        raise TimeoutError(f"No {route_name} completion within {route.budget:.0f}s ({'; '.join(errors) or 'no answer'})")
+
+
+async def complete_async(
+    route_name: str,
+    system: str,
+    user: str,
+    max_tokens: int = 1024,
+    temperature: Optional[float] = None
+) -> Completion:
+    """Async variant of complete; losing and timed-out calls are cancelled."""
+    route = _routes[route_name]
+    with tracing.span(f"llm.{route_name}") as span:
+        started = time.monotonic()
+        deadline = started + route.budget
+        queue = list(route.backends)
+        pending = {}
+        hedged, failovers, errors = False, 0, []
+        hedge_at = deadline
+
+        def launch():
+            # The hedge timer follows the newest backend, so a fresh failover isn't hedged at once
+            nonlocal hedge_at
+            backend = queue.pop(0)
+            task = asyncio.ensure_future(
+                backend.complete_async(route_name, system, user, max_tokens, temperature, deadline)
+            )
+            pending[task] = backend
+            now = time.monotonic()
+            hedge_at = now + backend.hedge_delay(deadline - now)
+
+        launch()
+        try:
+            while pending and time.monotonic() < deadline:
+                can_hedge = bool(queue) and not hedged and route.may_hedge()
+                until = min(deadline, hedge_at) if can_hedge else deadline
+                done, _ = await asyncio.wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and time.monotonic() >= hedge_at:
+                        hedged = True
+                        launch()
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(f"{backend.name}: {task.exception()}")
+                        if queue and not pending:
+                            failovers += 1
+                            launch()
+                        continue
+                    route.finish(backend, hedged, failovers)
+                    latency_ms = round((time.monotonic() - started) * 1000, 1)
+                    span.set(backend=backend.name, hedged=hedged, failovers=failovers)
+                    return Completion(task.result(), backend.name, latency_ms, hedged, failovers)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        route.finish(None, hedged, failovers)
+        span.set(hedged=hedged, failovers=failovers, errors=errors)
+        if not pending and errors:
+            raise RuntimeError(f"All {route_name} backends failed: {'; '.join(errors)}")
+        raise TimeoutError(f"No {route_name} completion within {route.budget:.0f}s ({'; '.join(errors) or 'no answer'})")
+
+
+def router_stats() -> dict:
+    """Per route: calls, hedges, failovers, wins per backend and backend latency/error stats."""
+    stats = {}
+    for name, route in _routes.items():
+        with route._lock:
+            stats[name] = {
+                "budget_seconds": route.budget,
+                "hedge_delay_seconds": round(route.backends[0].hedge_delay(route.budget), 3),
+                **{k: dict(v) if isinstance(v, dict) else v for k, v in route.stats.items()},
+                "backends": {
+                    b.name: {
+                        **b.stats,
+                        "p50_ms": round(b.percentile(0.5) * 1000, 1) if b.latencies else None,
+                        "p95_ms": round(b.percentile(0.95) * 1000, 1) if b.latencies else None
+                    }
+                    for b in route.backends
+                }
+            }
+    return stats
@@ -0,0 +1,122 @@
+"""
+ICOS LLM Usage
+Normalizes token usage across providers and measures prompt-cache savings.
+Every recorded call is also appended to the usage ledger (usage_ledger.py).
+"""
+
+import time
+import threading
+from typing import Optional
+import tracing
+import usage_ledger
+
+# Price of cached input relative to regular input tokens, per provider
+CACHE_PRICE_FACTORS = {
+    "anthropic": {"read": 0.1, "write": 1.25},
+    "openai": {"read": 0.5, "write": 1.0},
+    "google": {"read": 0.25, "write": 1.0}
+}
+
+_totals: dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def cached_block(text: str) -> dict:
+    """
+    Anthropic text block marked as a prompt-cache breakpoint. Only prefixes of
+    at least 1024 tokens (2048 on Haiku) are cached; shorter ones are billed as
+    regular input, so mark only blocks that can reach that size.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def extract_usage(response) -> dict:
+    """
+    Token usage of an Anthropic, OpenAI or Gemini response as
+    {input_tokens, cached_input_tokens, cache_write_tokens, output_tokens},
+    where input_tokens counts only uncached input.
+    """
+    usage = getattr(response, "usage", None)
+    metadata = getattr(response, "usage_metadata", None)
+
+    if usage is not None and hasattr(usage, "input_tokens"):
+        # Anthropic: input_tokens already excludes cache reads and writes
+        return {
+            "input_tokens": usage.input_tokens or 0,
+            "cached_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "output_tokens": usage.output_tokens or 0
+        }
+    if usage is not None:
+        # OpenAI: prompt_tokens includes the cached prefix
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        return {
+            "input_tokens": (usage.prompt_tokens or 0) - cached,
+            "cached_input_tokens": cached,
+            "cache_write_tokens": 0,
+            "output_tokens": getattr(usage, "completion_tokens", None) or 0
+        }
+    if metadata is not None:
+        # Gemini: prompt_token_count includes cached content
+        cached = getattr(metadata, "cached_content_token_count", None) or 0
+        return {
+            "input_tokens": (metadata.prompt_token_count or 0) - cached,
+            "cached_input_tokens": cached,
+            "cache_write_tokens": 0,
+            "output_tokens": getattr(metadata, "candidates_token_count", None) or 0
+        }
+    return {"input_tokens": 0, "cached_input_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+
+
+def record_usage(agent: str, provider: str, response, model: Optional[str] = None, started: Optional[float] = None) -> dict:
+    """
+    Add a response's usage to the per-agent totals and the ledger, and return
+    the normalized usage. `started` is the perf_counter() taken before the call.
+    """
+    usage = extract_usage(response)
+    usage_ledger.record(
+        agent,
+        provider,
+        model or getattr(response, "model", None),
+        usage,
+        latency_ms=round((time.perf_counter() - started) * 1000, 1) if started is not None else None,
+        request_id=tracing.request_id_var.get()
+    )
+    with _lock:
+        totals = _totals.setdefault(agent, {
+            "provider": provider,
+            "calls": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "cache_write_tokens": 0,
+            "output_tokens": 0
+        })
+        totals["calls"] += 1
+        for key, value in usage.items():
+            totals[key] += value
+    return usage
+
+
+def usage_summary() -> dict:
+    """
+    Per-agent token totals with cache hit ratio and the input-token cost saved
+    by caching (in regular-input-token equivalents, net of cache-write premiums).
+    """
+    with _lock:
+        summary = {}
+        for agent, t in _totals.items():
+            factors = CACHE_PRICE_FACTORS.get(t["provider"], {"read": 1.0, "write": 1.0})
+            total_input = t["input_tokens"] + t["cached_input_tokens"] + t["cache_write_tokens"]
+            billed = (
+                t["input_tokens"]
+                + t["cached_input_tokens"] * factors["read"]
+                + t["cache_write_tokens"] * factors["write"]
+            )
+            summary[agent] = {
+                **t,
+                "cache_hit_ratio": round(t["cached_input_tokens"] / total_input, 4) if total_input else 0.0,
+                "input_tokens_saved": round(total_input - billed),
+                "input_cost_saved_pct": round(100 * (total_input - billed) / total_input, 1) if total_input else 0.0
+            }
+        return summary
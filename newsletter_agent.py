@@ -3,28 +3,27 @@ ICOS Bilingual Newsletter Agent
 Synthesizes weekly content and drafts newsletters in English and Spanish.
 """
 
-import os
 import json
+import time
 from datetime import datetime
-from anthropic import Anthropic
+from clients import get_anthropic
 from dotenv import load_dotenv
+from llm_usage import cached_block, record_usage
+from usage_ledger import workflow
+import rate_limiter
 
 load_dotenv()
 
 class NewsletterAgent:
     def __init__(self):
-        self.client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
         self.voice_profile = "Justin Welsh style: Clear, minimalist, actionable, VSL-driven."
 
-    def generate_newsletter(self, weekly_posts: list[dict], language: str = "english") -> str:
-        """Drafts a newsletter based on a summary of weekly posts."""
-        posts_context = "\n".join([f"- Topic: {p['topic']}\n  Content: {p['content']}" for p in weekly_posts])
-        
-        system_prompt = f"""You are a High-Performance Newsletter Ghostwriter for Wadi Bardawil.
+    def _system_prompt(self) -> str:
+        """Static per agent: the target language goes in the user turn so the prompt + posts prefix is shared."""
+        return f"""You are a High-Performance Newsletter Ghostwriter for Wadi Bardawil.
 Your goal is to synthesize the week's best content into a cohesive, high-impact weekly newsletter.
 
 Voice Profile: {self.voice_profile}
-Target Language: {language}
 
 Structure:
 1. Hook: A punchy opening that validates a common pain point.
@@ -37,20 +36,32 @@ Rules:
 - No fluff. Use whitespace for readability.
 """
 
-        user_message = f"""Here are the top posts from this week:
-{posts_context}
-
-Draft a 500-word newsletter deep-dive based on these themes. Output ONLY the newsletter text."""
+    def generate_newsletter(self, weekly_posts: list[dict], language: str = "english") -> str:
+        """Drafts a newsletter based on a summary of weekly posts."""
+        posts_context = "\n".join([f"- Topic: {p['topic']}\n  Content: {p['content']}" for p in weekly_posts])
 
-        response = self.client.messages.create(
+        # System prompt and the week's posts are identical for every language, so
+        # the breakpoint after the posts caches both for the second language's call.
+        # The system prompt alone (~150 tokens) is below the 1024-token minimum.
+        started = time.perf_counter()
+        response = rate_limiter.call(
+            "anthropic",
+            get_anthropic().messages.create,
             model="claude-3-5-sonnet-latest",
             max_tokens=2000,
-            system=system_prompt,
-            messages=[{"role": "user", "content": user_message}]
+            system=self._system_prompt(),
+            messages=[{"role": "user", "content": [
+                cached_block(f"Here are the top posts from this week:\n{posts_context}"),
+                {"type": "text", "text": f"""Target Language: {language}
+
+Draft a 500-word newsletter deep-dive based on these themes. Output ONLY the newsletter text."""}
+            ]}]
         )
+        record_usage("newsletter", "anthropic", response, model="claude-3-5-sonnet-latest", started=started)
         
         return response.content[0].text
 
+    @workflow("newsletter")
     def create_bilingual_edition(self, weekly_posts: list[dict]):
         """Generates both English and Spanish versions."""
         print(f"[{datetime.now()}] Generating Bilingual Newsletter...")
@@ -0,0 +1,110 @@
+"""
+ICOS Notion Reader
+Shared paginated, recursive reader for Notion pages and databases.
+
+Every list/query call follows `next_cursor` lazily, nested blocks are fetched
+level by level with sibling subtrees in parallel, and all requests go through
+the shared "notion" rate limiter so bursts stay under Notion's ~3 requests/second
+limit (and 429s are retried after Retry-After).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+import rate_limiter
+import tracing
+
+TEXT_BLOCK_TYPES = [
+    "paragraph", "heading_1", "heading_2", "heading_3", "bulleted_list_item",
+    "numbered_list_item", "callout", "quote", "to_do", "toggle"
+]
+
+# Blocks whose children belong to another page/database, not to this page's text
+SEPARATE_CONTENT_TYPES = ["child_page", "child_database"]
+
+
+def block_text(block: dict) -> str:
+    """Plain text of a single block ('' for non-text blocks)."""
+    block_type = block.get("type")
+    if block_type not in TEXT_BLOCK_TYPES:
+        return ""
+    rich_text = block.get(block_type, {}).get("rich_text", [])
+    return "".join(t.get("plain_text", "") for t in rich_text)
+
+
+class NotionReader:
+    def __init__(self, notion, max_workers: int = 3):
+        self.notion = notion
+        self.max_workers = max_workers
+
+    def _paginate(self, fetch, **kwargs) -> Iterator[dict]:
+        """Yield results across pages, requesting the next page only when needed."""
+        cursor = None
+        while True:
+            if cursor:
+                kwargs["start_cursor"] = cursor
+            response = rate_limiter.call("notion", fetch, **kwargs)
+            yield from response.get("results", [])
+            if not response.get("has_more"):
+                return
+            cursor = response.get("next_cursor")
+
+    def iter_block_children(self, block_id: str) -> Iterator[dict]:
+        """Direct children of a block or page."""
+        return self._paginate(self.notion.blocks.children.list, block_id=block_id, page_size=100)
+
+    def iter_database(self, database_id: str, **query) -> Iterator[dict]:
+        """Every page of a database query (filters/sorts passed through)."""
+        return self._paginate(self.notion.databases.query, database_id=database_id, page_size=100, **query)
+
+    @tracing.traced("notion.read_blocks")
+    def read_blocks(self, block_id: str) -> list[dict]:
+        """
+        Every block under `block_id` in document order, including nested children.
+
+        The tree is fetched one depth level at a time with all blocks on a level
+        requested concurrently, so wall-clock time scales with depth, not size.
+        """
+        children: dict[str, list[dict]] = {}
+        level = [block_id]
+        depth = 0
+        fetch_children = tracing.propagate(lambda b: list(self.iter_block_children(b)))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while level:
+                depth += 1
+                fetched = pool.map(fetch_children, level)
+                next_level = []
+                for parent, blocks in zip(level, fetched):
+                    children[parent] = blocks
+                    next_level.extend(
+                        b["id"] for b in blocks
+                        if b.get("has_children") and b.get("type") not in SEPARATE_CONTENT_TYPES
+                    )
+                level = next_level
+
+        ordered = []
+
+        def walk(parent: str):
+            for block in children.get(parent, []):
+                ordered.append(block)
+                walk(block["id"])
+
+        walk(block_id)
+        tracing.annotate(blocks=len(ordered), depth=depth)
+        return ordered
+
+    def page_text(self, page_id: str) -> str:
+        """Text of a page, one line per text block, nested blocks included."""
+        # Empty paragraphs are kept as blank lines; callers chunk on "\n\n"
+        return "\n".join(
+            block_text(b) for b in self.read_blocks(page_id) if b.get("type") in TEXT_BLOCK_TYPES
+        )
+
+    def child_pages(self, page_id: str) -> dict[str, str]:
+        """Title -> text for every child page, fetched concurrently."""
+        pages = [b for b in self.read_blocks(page_id) if b.get("type") == "child_page"]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            texts = pool.map(tracing.propagate(lambda b: self.page_text(b["id"])), pages)
+            return {
+                b.get("child_page", {}).get("title", "Untitled"): text
+                for b, text in zip(pages, texts)
+            }
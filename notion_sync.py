@@ -3,38 +3,28 @@ ICOS Notion Integration
 Syncs branding, topics, and content ideas from Notion into the RAG system.
 """
 
-import os
-from notion_client import Client
-from rag_core import ingest_user_profile, get_embedding
-from supabase import create_client
+from clients import get_notion, get_supabase
+from notion_reader import NotionReader
+import rate_limiter
+from rag_core import ingest_user_profile_bulk, sync_user_profile_chunks
 
-# Initialize clients
-notion = Client(auth=os.environ.get("NOTION_API_KEY", ""))
-supabase = create_client(
-    os.environ.get("SUPABASE_URL", ""),
-    os.environ.get("SUPABASE_KEY", "")
-)
+
+def _reader() -> NotionReader:
+    return NotionReader(get_notion())
 
 
 def get_page_content(page_id: str) -> str:
-    """Extract text content from a Notion page."""
-    blocks = notion.blocks.children.list(block_id=page_id)
-    text_parts = []
-    
-    for block in blocks.get("results", []):
-        block_type = block.get("type")
-        if block_type in ["paragraph", "heading_1", "heading_2", "heading_3", "bulleted_list_item", "numbered_list_item"]:
-            rich_text = block.get(block_type, {}).get("rich_text", [])
-            for text in rich_text:
-                text_parts.append(text.get("plain_text", ""))
-    
-    return "\n".join(text_parts)
+    """Extract text content from a Notion page (all pages of blocks, nested included)."""
+    return _reader().page_text(page_id)
 
 
-def sync_branding_page(page_id: str) -> dict:
+def sync_branding_page(page_id: str, incremental: bool = True) -> dict:
     """
     Sync a Notion page containing branding info into the RAG user_profile.
     
+    Incremental mode diffs chunk fingerprints against stored rows and reports
+    added/removed/unchanged counts; a page with no changes costs no embeddings.
+    
     Expected page structure:
     - Bio section
     - Values section
@@ -44,15 +34,14 @@ def sync_branding_page(page_id: str) -> dict:
     content = get_page_content(page_id)
     
     # Chunk the content and ingest
-    chunks = content.split("\n\n")
-    ingested = []
-    
-    for chunk in chunks:
-        if len(chunk.strip()) > 50:  # Only meaningful chunks
-            result = ingest_user_profile(chunk, category="voice_sample")
-            ingested.append(result)
+    chunks = [c for c in content.split("\n\n") if len(c.strip()) > 50]  # Only meaningful chunks
+    if incremental:
+        return sync_user_profile_chunks(chunks, category="voice_sample")
+
+    outcomes = ingest_user_profile_bulk(chunks, category="voice_sample")
+    ingested = [o for o in outcomes if "id" in o]
     
-    return {"ingested_chunks": len(ingested)}
+    return {"ingested_chunks": len(ingested), "failed_chunks": len(outcomes) - len(ingested)}
 
 
 def sync_topics_database(database_id: str) -> dict:
@@ -64,10 +53,9 @@ def sync_topics_database(database_id: str) -> dict:
     - Description (rich_text)
     - Active (checkbox)
     """
-    results = notion.databases.query(database_id=database_id)
     synced = 0
     
-    for page in results.get("results", []):
+    for page in _reader().iter_database(database_id):
         props = page.get("properties", {})
         
         # Extract name
@@ -83,11 +71,11 @@ def sync_topics_database(database_id: str) -> dict:
         
         if name:
             # Upsert into Supabase
-            supabase.table("topics").upsert({
+            rate_limiter.execute(get_supabase().table("topics").upsert({
                 "name": name,
                 "description": description,
                 "is_active": is_active
-            }, on_conflict="name").execute()
+            }, on_conflict="name"))
             synced += 1
     
     return {"synced_topics": synced}
@@ -102,10 +90,9 @@ def sync_styles_database(database_id: str) -> dict:
     - Instruction (rich_text)
     - Active (checkbox)
     """
-    results = notion.databases.query(database_id=database_id)
     synced = 0
     
-    for page in results.get("results", []):
+    for page in _reader().iter_database(database_id):
         props = page.get("properties", {})
         
         name_prop = props.get("Name", {}).get("title", [])
@@ -117,11 +104,11 @@ def sync_styles_database(database_id: str) -> dict:
         is_active = props.get("Active", {}).get("checkbox", True)
         
         if name and instruction:
-            supabase.table("styles").upsert({
+            rate_limiter.execute(get_supabase().table("styles").upsert({
                 "name": name,
                 "instruction": instruction,
                 "is_active": is_active
-            }, on_conflict="name").execute()
+            }, on_conflict="name"))
             synced += 1
     
     return {"synced_styles": synced}
@@ -136,13 +123,13 @@ def sync_content_ideas_database(database_id: str) -> list[dict]:
     - Status (select) - "Idea", "Drafted", "Scheduled"
     - Platform (select) - "LinkedIn", "Twitter"
     """
-    results = notion.databases.query(
-        database_id=database_id,
+    results = _reader().iter_database(
+        database_id,
         filter={"property": "Status", "select": {"equals": "Idea"}}
     )
     
     ideas = []
-    for page in results.get("results", []):
+    for page in results:
         props = page.get("properties", {})
         
         name_prop = props.get("Name", {}).get("title", [])
@@ -163,7 +150,9 @@ def sync_content_ideas_database(database_id: str) -> list[dict]:
 
 def update_notion_with_draft(page_id: str, draft_content: str) -> None:
     """Update a Notion page with the generated draft."""
-    notion.pages.update(
+    rate_limiter.call(
+        "notion",
+        get_notion().pages.update,
         page_id=page_id,
         properties={
             "Status": {"select": {"name": "Drafted"}}
@@ -171,7 +160,9 @@ def update_notion_with_draft(page_id: str, draft_content: str) -> None:
     )
     
     # Add draft as a child block
-    notion.blocks.children.append(
+    rate_limiter.call_write(
+        "notion",
+        get_notion().blocks.children.append,
         block_id=page_id,
         children=[{
             "object": "block",
@@ -192,7 +183,7 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python notion_sync.py <command> [args]")
         print("Commands:")
-        print("  sync-branding <page_id>     - Sync branding page to RAG")
+        print("  sync-branding <page_id>     - Sync branding page to RAG (--full to re-ingest all)")
         print("  sync-topics <database_id>   - Sync topics database")
         print("  sync-styles <database_id>   - Sync styles database")
         print("  get-ideas <database_id>     - Get pending content ideas")
@@ -201,7 +192,7 @@ if __name__ == "__main__":
     command = sys.argv[1]
     
     if command == "sync-branding" and len(sys.argv) > 2:
-        result = sync_branding_page(sys.argv[2])
+        result = sync_branding_page(sys.argv[2], incremental="--full" not in sys.argv)
         print(f"Synced: {result}")
     
     elif command == "sync-topics" and len(sys.argv) > 2:
@@ -0,0 +1,171 @@
+"""
+ICOS Profiler
+On-demand statistical profiling of single API requests.
+
+While a profiled request runs, a sampler thread reads every thread's Python
+stack (sys._current_frames) each ICOS_PROFILE_INTERVAL_MS and counts the
+stacks. The result is saved under ICOS_PROFILE_DIR in the folded format read
+by flamegraph.pl, speedscope and inferno:
+
+    MainThread;run (api_wrapper.py:120);build_rag_context (rag_core.py:560) 42
+
+Idle threads (waiting on a selector, lock or queue) are left out. Threads
+are not tied to a request, so requests that overlap a profiled one show up
+in its samples too.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(__file__), "profiles")
+PROFILE_DIR = os.environ.get("ICOS_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("ICOS_PROFILE_INTERVAL_MS", "5")) / 1000
+# Fraction of requests profiled without being asked to (0 = only on demand)
+PROFILE_SAMPLE_RATE = float(os.environ.get("ICOS_PROFILE_SAMPLE_RATE", "0"))
+# Profiles kept on disk; older ones are deleted
+PROFILE_KEEP = int(os.environ.get("ICOS_PROFILE_KEEP", "200"))
+
+INDEX_FILE = "index.jsonl"
+
+# Innermost frames of threads that are waiting rather than working
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker")
+}
+
+_index_lock = threading.Lock()
+
+
+def should_profile(flag: Optional[str]) -> bool:
+    """True when the request asked for a profile (header/query flag) or is sampled."""
+    if flag is not None:
+        return flag.lower() not in ("", "0", "false", "no")
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Counts folded stacks of every busy thread until stopped."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="icos-profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        """Stop sampling and return the profiled wall time in milliseconds."""
+        self._stop.set()
+        self._thread.join()
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def save(sampler: Sampler, duration_ms: float, **meta) -> dict:
+    """Write the folded profile and add it to the index; returns its index entry."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    created_at = datetime.now(timezone.utc)
+    # Request ids come from a client header; keep them filename-safe
+    label = re.sub(r"[^A-Za-z0-9_-]", "", meta.get("request_id") or "")[:64] or "request"
+    name = f"{created_at.strftime('%Y%m%dT%H%M%S%f')}-{label}.folded"
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+
+    entry = {
+        "name": name,
+        "created_at": created_at.isoformat(timespec="milliseconds"),
+        "duration_ms": duration_ms,
+        "samples": sampler.samples,
+        "interval_ms": sampler.interval * 1000,
+        **meta
+    }
+    with _index_lock:
+        with open(os.path.join(PROFILE_DIR, INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        _prune()
+    return entry
+
+
+def _read_index() -> list[dict]:
+    path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def _prune() -> None:
+    """Delete the oldest profiles past PROFILE_KEEP and rewrite the index (caller holds the lock)."""
+    entries = _read_index()
+    if len(entries) <= PROFILE_KEEP:
+        return
+    for entry in entries[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+        except FileNotFoundError:
+            pass
+    tmp = os.path.join(PROFILE_DIR, INDEX_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(entry) + "\n" for entry in entries[-PROFILE_KEEP:])
+    os.replace(tmp, os.path.join(PROFILE_DIR, INDEX_FILE))
+
+
+def recent_profiles(limit: int = 50) -> list[dict]:
+    """Most recent profiles first, with their request, duration and sample count."""
+    with _index_lock:
+        return list(reversed(_read_index()[-limit:]))
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a listed profile, or None (names not in the index are refused)."""
+    with _index_lock:
+        if name not in {entry["name"] for entry in _read_index()}:
+            return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.exists(path) else None
@@ -4,20 +4,69 @@ Handles embeddings, storage, and retrieval for the Content OS.
 """
 
 import os
-from typing import Optional
-from dataclasses import dataclass
-from supabase import create_client, Client
-from openai import OpenAI
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Optional, Union
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
+from embedding_cache import EmbeddingCache, normalize_text
+from llm_usage import record_usage
+from clients import get_supabase, get_async_supabase, get_openai, get_async_openai
+import rate_limiter
+import tracing
+from singleflight import coalesce
 
 load_dotenv()
 
-# Initialize clients
-supabase: Client = create_client(
-    os.environ.get("SUPABASE_URL", ""),
-    os.environ.get("SUPABASE_KEY", "")
-)
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+EMBEDDING_MODEL = os.environ.get("ICOS_EMBEDDING_MODEL", "text-embedding-3-small")
+# text-embedding-3 models return shortened vectors on request; the vector(N)
+# columns and RPC signatures must match (see supabase_embedding_migration.sql)
+EMBEDDING_DIMENSIONS = int(os.environ.get("ICOS_EMBEDDING_DIMENSIONS", "1536"))
+
+# Dual-write during a model/dimension change: new rows also get a vector from
+# the next model in this column, while reads stay on `embedding` until cutover
+SHADOW_COLUMN = os.environ.get("ICOS_EMBEDDING_SHADOW_COLUMN", "")
+SHADOW_MODEL = os.environ.get("ICOS_EMBEDDING_SHADOW_MODEL") or EMBEDDING_MODEL
+SHADOW_DIMENSIONS = int(os.environ.get("ICOS_EMBEDDING_SHADOW_DIMENSIONS") or EMBEDDING_DIMENSIONS)
+
+# OpenAI embeddings request limits (inputs per request, tokens per request, tokens per input)
+EMBEDDING_MAX_BATCH_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300000
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+
+# Rows per multi-row insert
+INSERT_BATCH_SIZE = 500
+
+embedding_cache = EmbeddingCache.from_env()
+
+# Optional in-process mirror of content_library (see vector_index.py)
+LOCAL_INDEX_ENABLED = os.environ.get("ICOS_LOCAL_INDEX", "0") == "1"
+# float32, float16 or int8 storage for the local index
+LOCAL_INDEX_DTYPE = os.environ.get("ICOS_LOCAL_INDEX_DTYPE", "float32")
+# Rebuild the snapshot after this long, so rows written by other processes (e.g. the analyst CLI) show up
+LOCAL_INDEX_REFRESH_SECONDS = float(os.environ.get("ICOS_LOCAL_INDEX_REFRESH_SECONDS", "300"))
+LOCAL_INDEX_RETRY_SECONDS = 30
+local_index = None
+_local_index_lock = threading.Lock()
+_local_index_loading = False
+_local_index_next_load = 0.0
+
+# Overall time budget for build_rag_context's parallel retrieval legs
+RAG_DEADLINE_SECONDS = float(os.environ.get("ICOS_RAG_DEADLINE_SECONDS", "3.0"))
+
+# Characters of each past post quoted in the Ghostwriter context
+RAG_SNIPPET_CHARS = 300
+
+# Fetch similar content, tips and winners with one get_rag_bundle RPC (see supabase_rag_bundle_schema.sql)
+RAG_BUNDLE_ENABLED = os.environ.get("ICOS_RAG_BUNDLE", "0") == "1"
+
+# Retrieval legs outlive a missed deadline, so they run on a long-lived pool
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag")
+_retrieval_stats: dict[str, dict] = {}
+_retrieval_stats_lock = threading.Lock()
 
 
 @dataclass
@@ -31,80 +80,459 @@ class ContentRecord:
     improvement_tip: Optional[str] = None
 
 
-def get_embedding(text: str) -> list[float]:
-    """Generate embedding using OpenAI."""
-    response = openai_client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+@dataclass
+class RagRetrieval:
+    """What build_rag_context retrieved, which legs missed the deadline, and how long each took."""
+    similar: list[dict] = field(default_factory=list)
+    tips: list[str] = field(default_factory=list)
+    winners: list[dict] = field(default_factory=list)
+    timed_out: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    latencies_ms: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def context(self) -> str:
+        return _format_rag_context(self.similar, self.tips)
+
+
+@coalesce("get_embedding")
+def get_embedding(text: str, use_cache: bool = True) -> list[float]:
+    """Generate embedding using OpenAI, served from the local cache when possible."""
+    with tracing.span("rag.embedding", chars=len(text)):
+        return _get_embedding(text, use_cache)
+
+
+def _dimensions_arg(model: str, dimensions: int) -> dict:
+    """Only text-embedding-3 models accept `dimensions` (ada-002 rejects it)."""
+    return {"dimensions": dimensions} if model.startswith("text-embedding-3") else {}
+
+
+def _get_embedding(text: str, use_cache: bool) -> list[float]:
+    if use_cache:
+        cached = embedding_cache.get(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text)
+        tracing.annotate(cached=cached is not None)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    response = rate_limiter.call(
+        "openai",
+        get_openai().embeddings.create,
+        model=EMBEDDING_MODEL,
+        input=text,
+        **_dimensions_arg(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
     )
-    return response.data[0].embedding
+    record_usage("embeddings", "openai", response, model=EMBEDDING_MODEL, started=started)
+    embedding = response.data[0].embedding
+
+    if use_cache:
+        embedding_cache.put(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text, embedding)
+    return embedding
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars/token) used only to size batches."""
+    return len(text) // 4 + 1
+
+
+def _embedding_batches(texts: list[str]) -> list[list[int]]:
+    """Group text indices into requests that fit the embeddings API limits."""
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = _estimate_tokens(text)
+        if tokens > EMBEDDING_MAX_INPUT_TOKENS:
+            # Oversized inputs go alone so their rejection doesn't fail a whole batch
+            batches.append([i])
+            continue
+        if current and (len(current) >= EMBEDDING_MAX_BATCH_INPUTS or current_tokens + tokens > EMBEDDING_MAX_BATCH_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+@tracing.traced("rag.embed_many")
+def _embed_many(
+    texts: list[str],
+    use_cache: bool = True,
+    dimensions: int = None,
+    model: str = None
+) -> list[Union[list[float], Exception]]:
+    """
+    Embed many texts in batched requests; failed batches yield the exception per text.
+    `model` and `dimensions` override the configured ones (shadow writes and backfills).
+    """
+    dimensions = dimensions or EMBEDDING_DIMENSIONS
+    model = model or EMBEDDING_MODEL
+    results: list[Union[list[float], Exception, None]] = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        cached = embedding_cache.get(model, dimensions, text) if use_cache else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    pending_texts = [texts[i] for i in pending]
+    batches = _embedding_batches(pending_texts)
+    tracing.annotate(texts=len(texts), cached=len(texts) - len(pending), batches=len(batches))
+    for batch in batches:
+        try:
+            started = time.perf_counter()
+            response = rate_limiter.call(
+                "openai",
+                get_openai().embeddings.create,
+                model=model,
+                input=[pending_texts[j] for j in batch],
+                **_dimensions_arg(model, dimensions)
+            )
+        except Exception as e:
+            for j in batch:
+                results[pending[j]] = e
+            continue
+        record_usage("embeddings", "openai", response, model=model, started=started)
+
+        for item in response.data:
+            text = pending_texts[batch[item.index]]
+            results[pending[batch[item.index]]] = item.embedding
+            if use_cache:
+                embedding_cache.put(model, dimensions, text, item.embedding)
+    return results
+
+
+def to_pgvector(embedding: list[float]) -> str:
+    """
+    pgvector text literal for inserts and RPC params. Postgres parses it the
+    same as a JSON list, at float32 precision and about half the bytes.
+    """
+    return "[" + ",".join(format(x, ".7g") for x in embedding) + "]"
+
+
+def shorten_embedding(embedding: list[float], dimensions: int) -> list[float]:
+    """First `dimensions` components scaled back to unit length (what the API returns for a smaller size)."""
+    head = embedding[:dimensions]
+    norm = sum(x * x for x in head) ** 0.5
+    return [x / norm for x in head] if norm else head
+
+
+def _shadow_fields(texts: list[str], embeddings: list[list[float]]) -> list[dict]:
+    """
+    Shadow-column value per row while dual-writing, {} otherwise. A shorter
+    size of the same model is cut from the primary vector; another model is
+    embedded. Failures leave the column null for embedding_migration.py's sweep.
+    """
+    if not SHADOW_COLUMN:
+        return [{} for _ in texts]
+    if SHADOW_MODEL == EMBEDDING_MODEL and SHADOW_DIMENSIONS <= EMBEDDING_DIMENSIONS:
+        vectors = [shorten_embedding(e, SHADOW_DIMENSIONS) for e in embeddings]
+    else:
+        vectors = _embed_many(texts, dimensions=SHADOW_DIMENSIONS, model=SHADOW_MODEL)
+    return [{} if isinstance(v, Exception) else {SHADOW_COLUMN: to_pgvector(v)} for v in vectors]
+
+
+def get_embeddings(texts: list[str], use_cache: bool = True) -> list[list[float]]:
+    """Generate embeddings for many texts with as few OpenAI requests as possible."""
+    results = _embed_many(texts, use_cache)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
+
+
+def _wire_row(row: dict) -> dict:
+    return {**row, "embedding": to_pgvector(row["embedding"])}
+
+
+@tracing.traced("rag.insert_bulk")
+def _insert_bulk(
+    table: str,
+    rows: list[dict],
+    texts: list[str],
+    on_stored: Optional[Callable[[dict], None]] = None
+) -> list[dict]:
+    """Embed and insert rows in batches, returning {"id"} or {"error"} per input row."""
+    tracing.annotate(table=table, rows=len(rows))
+    outcomes = [{} for _ in rows]
+    ready = []
+    for i, (row, embedding) in enumerate(zip(rows, _embed_many(texts))):
+        if isinstance(embedding, Exception):
+            outcomes[i] = {"error": f"embedding failed: {embedding}"}
+        else:
+            ready.append((i, {**row, "embedding": embedding}))
+    shadows = _shadow_fields([texts[i] for i, _ in ready], [row["embedding"] for _, row in ready])
+    ready = [(i, {**row, **shadow}) for (i, row), shadow in zip(ready, shadows)]
+
+    for start in range(0, len(ready), INSERT_BATCH_SIZE):
+        chunk = ready[start:start + INSERT_BATCH_SIZE]
+        try:
+            result = rate_limiter.execute(get_supabase().table(table).insert([_wire_row(row) for _, row in chunk]))
+            for (i, _), stored in zip(chunk, result.data or []):
+                outcomes[i] = {"id": stored.get("id")}
+        except Exception as e:
+            if not isinstance(getattr(e, "code", None), str):
+                # No PostgREST error code: the statement may have committed before the failure
+                for i, _ in chunk:
+                    outcomes[i] = {"error": str(e)}
+                continue
+            # The server rejected the statement (e.g. one bad row); retry row by row to isolate it
+            for i, row in chunk:
+                try:
+                    result = rate_limiter.execute(get_supabase().table(table).insert(_wire_row(row)))
+                    outcomes[i] = {"id": result.data[0].get("id") if result.data else None}
+                except Exception as e:
+                    outcomes[i] = {"error": str(e)}
+
+    tracing.annotate(errors=sum(1 for o in outcomes if "error" in o))
+    if on_stored:
+        for i, row in ready:
+            if outcomes[i].get("id"):
+                on_stored({**row, "id": outcomes[i]["id"]})
+    return outcomes
+
+
+def _content_row(record: ContentRecord) -> dict:
+    return {
+        "content": record.content,
+        "topic": record.topic,
+        "style": record.style,
+        "platform": record.platform,
+        "virality_score": record.virality_score,
+        "verdict": record.verdict,
+        "improvement_tip": record.improvement_tip
+    }
 
 
 def ingest_user_profile(content: str, category: str) -> dict:
     """Add a user profile chunk to the knowledge base."""
     embedding = get_embedding(content)
-    result = supabase.table("user_profile").insert({
+    result = rate_limiter.execute(get_supabase().table("user_profile").insert({
         "content": content,
         "category": category,
-        "embedding": embedding
-    }).execute()
+        "embedding": to_pgvector(embedding),
+        **_shadow_fields([content], [embedding])[0]
+    }))
     return result.data[0] if result.data else {}
 
 
+def ingest_user_profile_bulk(chunks: list[str], category: str) -> list[dict]:
+    """Add many user profile chunks with batched embeddings and multi-row inserts."""
+    rows = [{"content": chunk, "category": category} for chunk in chunks]
+    return _insert_bulk("user_profile", rows, chunks)
+
+
+def enable_local_index():
+    """Build the in-process content_library index from a fresh snapshot and swap it in."""
+    global local_index, _local_index_next_load
+    from vector_index import LocalVectorIndex
+
+    index = LocalVectorIndex(dimensions=EMBEDDING_DIMENSIONS, dtype=LOCAL_INDEX_DTYPE)
+    index.load_snapshot(get_supabase())
+    local_index = index
+    _local_index_next_load = time.monotonic() + LOCAL_INDEX_REFRESH_SECONDS
+    return local_index
+
+
+def _load_local_index_in_background() -> None:
+    global _local_index_loading, _local_index_next_load
+    try:
+        with tracing.span("rag.local_index_load"):
+            enable_local_index()
+    except Exception as e:
+        print(f"Local index load failed: {e}")
+        _local_index_next_load = time.monotonic() + LOCAL_INDEX_RETRY_SECONDS
+    finally:
+        with _local_index_lock:
+            _local_index_loading = False
+
+
+def _ready_local_index():
+    """
+    The local index to query, or None to use the RPC. A missing or stale
+    snapshot is (re)loaded on one background thread, so queries never wait
+    on it: they use the RPC until the first load, then the previous snapshot.
+    """
+    global _local_index_loading
+    if LOCAL_INDEX_ENABLED and time.monotonic() >= _local_index_next_load:
+        with _local_index_lock:
+            start = not _local_index_loading
+            _local_index_loading = True
+        if start:
+            threading.Thread(target=_load_local_index_in_background, name="local-index", daemon=True).start()
+    return local_index
+
+
+def _index_stored_row(row: dict) -> None:
+    """Keep the local index (if loaded) in step with content_library inserts."""
+    if local_index is not None:
+        local_index.add(row, row["embedding"])
+
+
+def chunk_fingerprint(content: str) -> str:
+    """Stable fingerprint of a profile chunk, insensitive to whitespace edits."""
+    return hashlib.sha256(normalize_text(content).encode("utf-8")).hexdigest()
+
+
+def _select_all(table: str, columns: str, page_size: int = 1000, **filters) -> list[dict]:
+    """Read every matching row, paging past PostgREST's row limit."""
+    rows, start = [], 0
+    while True:
+        query = get_supabase().table(table).select(columns)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        page = rate_limiter.execute(query.order("id").range(start, start + page_size - 1)).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+@tracing.traced("rag.sync_profile_chunks")
+def sync_user_profile_chunks(chunks: list[str], category: str) -> dict:
+    """
+    Make the stored chunks of a category match `chunks`.
+    
+    Only chunks whose fingerprint isn't stored yet are embedded and inserted;
+    rows whose chunk disappeared (or duplicates of a chunk) are deleted.
+    """
+    stored: dict[str, list[str]] = {}
+    for row in _select_all("user_profile", "id, content", category=category):
+        stored.setdefault(chunk_fingerprint(row["content"]), []).append(row["id"])
+
+    wanted: dict[str, str] = {}
+    for chunk in chunks:
+        wanted.setdefault(chunk_fingerprint(chunk), chunk)
+
+    to_add = [chunk for fingerprint, chunk in wanted.items() if fingerprint not in stored]
+    stale_ids = []
+    for fingerprint, ids in stored.items():
+        stale_ids.extend(ids if fingerprint not in wanted else ids[1:])
+
+    outcomes = ingest_user_profile_bulk(to_add, category) if to_add else []
+    for start in range(0, len(stale_ids), INSERT_BATCH_SIZE):
+        rate_limiter.execute(get_supabase().table("user_profile").delete().in_("id", stale_ids[start:start + INSERT_BATCH_SIZE]))
+
+    errors = [o["error"] for o in outcomes if "error" in o]
+    tracing.annotate(category=category, chunks=len(chunks), added=len(to_add), removed=len(stale_ids))
+    return {
+        "added": len(to_add) - len(errors),
+        "removed": len(stale_ids),
+        "unchanged": len(wanted) - len(to_add),
+        "errors": errors
+    }
+
+
 def ingest_content(record: ContentRecord) -> dict:
     """Add published content with performance data."""
     embedding = get_embedding(record.content)
-    result = supabase.table("content_library").insert({
-        "content": record.content,
-        "topic": record.topic,
-        "style": record.style,
-        "platform": record.platform,
-        "virality_score": record.virality_score,
-        "verdict": record.verdict,
-        "improvement_tip": record.improvement_tip,
-        "embedding": embedding
-    }).execute()
+    result = rate_limiter.execute(get_supabase().table("content_library").insert({
+        **_content_row(record),
+        "embedding": to_pgvector(embedding),
+        **_shadow_fields([record.content], [embedding])[0]
+    }))
+    stored = result.data[0] if result.data else {}
+    if stored.get("id"):
+        _index_stored_row({**_content_row(record), "id": stored["id"], "embedding": embedding})
+    return stored
+
+
+def ingest_content_bulk(records: list[ContentRecord]) -> list[dict]:
+    """Add many content records with batched embeddings and multi-row inserts."""
+    rows = [_content_row(r) for r in records]
+    return _insert_bulk("content_library", rows, [r.content for r in records], on_stored=_index_stored_row)
+
+
+def update_content_performance(content_id: str, **fields) -> dict:
+    """
+    Update performance columns (virality_score, verdict, improvement_tip) of
+    an existing content_library row instead of inserting a duplicate.
+    """
+    result = rate_limiter.execute(get_supabase().table("content_library").update(fields).eq("id", content_id))
+    if local_index is not None:
+        local_index.update(content_id, **fields)
     return result.data[0] if result.data else {}
 
 
+def _match_embedding(query_embedding: list[float], limit: int) -> list[dict]:
+    """Nearest content_library rows for an embedding (local index or match_content RPC)."""
+    with tracing.span("rag.match_content", limit=limit) as span:
+        index = _ready_local_index()
+        if index is not None:
+            matches = index.search(query_embedding, match_threshold=0.7, match_count=limit)
+            span.set(source="local_index", rows=len(matches))
+            return matches
+
+        result = rate_limiter.execute(get_supabase().rpc("match_content", {
+            "query_embedding": to_pgvector(query_embedding),
+            "match_threshold": 0.7,
+            "match_count": limit
+        }))
+        matches = result.data if result.data else []
+        span.set(source="rpc", rows=len(matches))
+        return matches
+
+
 def search_similar_content(query: str, limit: int = 3) -> list[dict]:
     """Find semantically similar past content."""
-    query_embedding = get_embedding(query)
-    result = supabase.rpc("match_content", {
-        "query_embedding": query_embedding,
-        "match_threshold": 0.7,
-        "match_count": limit
-    }).execute()
-    return result.data if result.data else []
+    return _match_embedding(get_embedding(query), limit)
 
 
 def get_top_winners(limit: int = 5) -> list[dict]:
     """Retrieve highest performing content."""
-    result = supabase.rpc("get_winners", {"limit_count": limit}).execute()
+    result = rate_limiter.execute(get_supabase().rpc("get_winners", {"limit_count": limit}))
     return result.data if result.data else []
 
 
 def get_recent_improvement_tips(limit: int = 5) -> list[str]:
     """Get recent feedback to avoid past mistakes."""
-    result = supabase.rpc("get_recent_tips", {"limit_count": limit}).execute()
+    result = rate_limiter.execute(get_supabase().rpc("get_recent_tips", {"limit_count": limit}))
     return [r["improvement_tip"] for r in result.data] if result.data else []
 
 
-def build_rag_context(topic: str) -> str:
-    """Build context for the Ghostwriter from RAG sources."""
-    # Get similar winning content
-    similar = search_similar_content(topic, limit=3)
+def _bundle_params(
+    query_embedding: list[float],
+    match_count: int,
+    tips_count: int,
+    winners_count: int,
+    snippet_chars: int
+) -> dict:
+    return {
+        "query_embedding": to_pgvector(query_embedding),
+        "match_threshold": 0.7,
+        "match_count": match_count,
+        "tips_count": tips_count,
+        "winners_count": winners_count,
+        "snippet_chars": snippet_chars
+    }
+
+
+def get_rag_bundle(
+    query_embedding: list[float],
+    match_count: int = 3,
+    tips_count: int = 5,
+    winners_count: int = 5,
+    snippet_chars: int = RAG_SNIPPET_CHARS
+) -> dict:
+    """Similar content, recent tips and top winners in one round trip (content pre-truncated)."""
+    result = rate_limiter.execute(get_supabase().rpc(
+        "get_rag_bundle",
+        _bundle_params(query_embedding, match_count, tips_count, winners_count, snippet_chars)
+    ))
+    return result.data or {"similar": [], "tips": [], "winners": []}
+
+
+def _format_rag_context(similar: list[dict], tips: list[str]) -> str:
+    """Render retrieved content and tips into the Ghostwriter context block."""
     winners = [c for c in similar if c.get("verdict") == "WINNER"]
     
-    # Get improvement tips
-    tips = get_recent_improvement_tips(limit=5)
-    
     context_parts = []
     
     if winners:
         context_parts.append("## Examples of High-Performing Content on This Topic:")
         for w in winners:
-            context_parts.append(f"- Score: {w['virality_score']}\n{w['content'][:300]}...")
+            context_parts.append(f"- Score: {w['virality_score']}\n{w['content'][:RAG_SNIPPET_CHARS]}...")
     
     if tips:
         context_parts.append("\n## Avoid These Mistakes (From Recent Analysis):")
@@ -112,3 +540,278 @@ def build_rag_context(topic: str) -> str:
             context_parts.append(f"- {tip}")
     
     return "\n".join(context_parts) if context_parts else "No historical data yet."
+
+
+def _record_latency(latencies: dict, stage: str, started: float) -> None:
+    elapsed = (time.perf_counter() - started) * 1000
+    latencies[stage] = round(elapsed, 2)
+    with _retrieval_stats_lock:
+        stats = _retrieval_stats.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed
+        stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+
+def _record_timeouts(sources: list[str]) -> None:
+    with _retrieval_stats_lock:
+        for source in sources:
+            _retrieval_stats.setdefault(source, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "timeouts": 0})["timeouts"] += 1
+
+
+def retrieval_stats() -> dict:
+    """Per-stage latency summary (count, mean/max ms, deadline misses) since process start."""
+    with _retrieval_stats_lock:
+        return {
+            stage: {
+                "count": s["count"],
+                "mean_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                "max_ms": round(s["max_ms"], 2),
+                "timeouts": s["timeouts"]
+            }
+            for stage, s in _retrieval_stats.items()
+        }
+
+
+@tracing.traced("rag.similar")
+def _similar_leg(topic: str, latencies: dict) -> list[dict]:
+    started = time.perf_counter()
+    query_embedding = get_embedding(topic)
+    _record_latency(latencies, "embedding", started)
+
+    started = time.perf_counter()
+    similar = _match_embedding(query_embedding, 3)
+    _record_latency(latencies, "match_content", started)
+    return similar
+
+
+@tracing.traced("rag.tips")
+def _tips_leg(latencies: dict) -> list[str]:
+    started = time.perf_counter()
+    tips = get_recent_improvement_tips(limit=5)
+    _record_latency(latencies, "tips", started)
+    return tips
+
+
+@tracing.traced("rag.bundle")
+def _bundle_leg(topic: str, latencies: dict) -> dict:
+    started = time.perf_counter()
+    query_embedding = get_embedding(topic)
+    _record_latency(latencies, "embedding", started)
+
+    started = time.perf_counter()
+    bundle = get_rag_bundle(query_embedding)
+    _record_latency(latencies, "rag_bundle", started)
+    return bundle
+
+
+def _collect_leg(retrieval: RagRetrieval, source: str, result) -> None:
+    """Store a finished leg's result; the bundle leg fills every section at once."""
+    if source == "bundle":
+        retrieval.similar = result.get("similar") or []
+        retrieval.tips = result.get("tips") or []
+        retrieval.winners = result.get("winners") or []
+    else:
+        setattr(retrieval, source, result)
+
+
+def _retrieval_attrs(retrieval: RagRetrieval) -> dict:
+    return {
+        "similar": len(retrieval.similar),
+        "tips": len(retrieval.tips),
+        "timed_out": retrieval.timed_out,
+        "failed": sorted(retrieval.failed)
+    }
+
+
+@tracing.traced("rag.retrieve")
+def retrieve_rag_context(topic: str, deadline: float = None) -> RagRetrieval:
+    """
+    Run the independent retrieval legs concurrently under one deadline.
+    
+    Legs that miss the deadline (or fail) are reported on the result and left
+    out of the context instead of failing the whole generation. With
+    ICOS_RAG_BUNDLE=1 a single get_rag_bundle leg replaces the separate RPCs.
+    """
+    deadline = RAG_DEADLINE_SECONDS if deadline is None else deadline
+    latencies: dict[str, float] = {}
+    started = time.perf_counter()
+    if RAG_BUNDLE_ENABLED:
+        futures = {"bundle": _retrieval_pool.submit(tracing.propagate(_bundle_leg), topic, latencies)}
+    else:
+        futures = {
+            "similar": _retrieval_pool.submit(tracing.propagate(_similar_leg), topic, latencies),
+            "tips": _retrieval_pool.submit(tracing.propagate(_tips_leg), latencies)
+        }
+    wait(futures.values(), timeout=deadline)
+
+    retrieval = RagRetrieval()
+    for source, future in futures.items():
+        if not future.done():
+            future.cancel()
+            retrieval.timed_out.append(source)
+        elif future.exception() is not None:
+            retrieval.failed[source] = str(future.exception())
+        else:
+            _collect_leg(retrieval, source, future.result())
+
+    _record_timeouts(retrieval.timed_out)
+    _record_latency(latencies, "total", started)
+    retrieval.latencies_ms = dict(latencies)
+    tracing.annotate(**_retrieval_attrs(retrieval))
+    return retrieval
+
+
+@coalesce("build_rag_context")
+def build_rag_context(topic: str) -> str:
+    """Build context for the Ghostwriter from RAG sources."""
+    return retrieve_rag_context(topic).context
+
+
+# ========== ASYNC ==========
+
+@coalesce("get_embedding")
+async def get_embedding_async(text: str, use_cache: bool = True) -> list[float]:
+    """Async variant of get_embedding."""
+    with tracing.span("rag.embedding", chars=len(text)):
+        return await _get_embedding_async(text, use_cache)
+
+
+async def _get_embedding_async(text: str, use_cache: bool) -> list[float]:
+    if use_cache:
+        cached = embedding_cache.get(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text)
+        tracing.annotate(cached=cached is not None)
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    response = await rate_limiter.call_async(
+        "openai",
+        get_async_openai().embeddings.create,
+        model=EMBEDDING_MODEL,
+        input=text,
+        **_dimensions_arg(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    )
+    record_usage("embeddings", "openai", response, model=EMBEDDING_MODEL, started=started)
+    embedding = response.data[0].embedding
+
+    if use_cache:
+        embedding_cache.put(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, text, embedding)
+    return embedding
+
+
+async def _match_embedding_async(query_embedding: list[float], limit: int) -> list[dict]:
+    """Async variant of _match_embedding."""
+    with tracing.span("rag.match_content", limit=limit) as span:
+        index = _ready_local_index()
+        if index is not None:
+            matches = index.search(query_embedding, match_threshold=0.7, match_count=limit)
+            span.set(source="local_index", rows=len(matches))
+            return matches
+
+        client = await get_async_supabase()
+        result = await rate_limiter.execute_async(client.rpc("match_content", {
+            "query_embedding": to_pgvector(query_embedding),
+            "match_threshold": 0.7,
+            "match_count": limit
+        }))
+        matches = result.data if result.data else []
+        span.set(source="rpc", rows=len(matches))
+        return matches
+
+
+async def search_similar_content_async(query: str, limit: int = 3) -> list[dict]:
+    """Async variant of search_similar_content."""
+    return await _match_embedding_async(await get_embedding_async(query), limit)
+
+
+async def get_recent_improvement_tips_async(limit: int = 5) -> list[str]:
+    """Async variant of get_recent_improvement_tips."""
+    client = await get_async_supabase()
+    result = await rate_limiter.execute_async(client.rpc("get_recent_tips", {"limit_count": limit}))
+    return [r["improvement_tip"] for r in result.data] if result.data else []
+
+
+@tracing.traced("rag.similar")
+async def _similar_leg_async(topic: str, latencies: dict) -> list[dict]:
+    started = time.perf_counter()
+    query_embedding = await get_embedding_async(topic)
+    _record_latency(latencies, "embedding", started)
+
+    started = time.perf_counter()
+    similar = await _match_embedding_async(query_embedding, 3)
+    _record_latency(latencies, "match_content", started)
+    return similar
+
+
+@tracing.traced("rag.tips")
+async def _tips_leg_async(latencies: dict) -> list[str]:
+    started = time.perf_counter()
+    tips = await get_recent_improvement_tips_async(limit=5)
+    _record_latency(latencies, "tips", started)
+    return tips
+
+
+async def get_rag_bundle_async(
+    query_embedding: list[float],
+    match_count: int = 3,
+    tips_count: int = 5,
+    winners_count: int = 5,
+    snippet_chars: int = RAG_SNIPPET_CHARS
+) -> dict:
+    """Async variant of get_rag_bundle."""
+    client = await get_async_supabase()
+    result = await rate_limiter.execute_async(client.rpc(
+        "get_rag_bundle",
+        _bundle_params(query_embedding, match_count, tips_count, winners_count, snippet_chars)
+    ))
+    return result.data or {"similar": [], "tips": [], "winners": []}
+
+
+@tracing.traced("rag.bundle")
+async def _bundle_leg_async(topic: str, latencies: dict) -> dict:
+    started = time.perf_counter()
+    query_embedding = await get_embedding_async(topic)
+    _record_latency(latencies, "embedding", started)
+
+    started = time.perf_counter()
+    bundle = await get_rag_bundle_async(query_embedding)
+    _record_latency(latencies, "rag_bundle", started)
+    return bundle
+
+
+@tracing.traced("rag.retrieve")
+async def retrieve_rag_context_async(topic: str, deadline: float = None) -> RagRetrieval:
+    """Async variant of retrieve_rag_context; legs past the deadline are cancelled."""
+    deadline = RAG_DEADLINE_SECONDS if deadline is None else deadline
+    latencies: dict[str, float] = {}
+    started = time.perf_counter()
+    if RAG_BUNDLE_ENABLED:
+        tasks = {"bundle": asyncio.ensure_future(_bundle_leg_async(topic, latencies))}
+    else:
+        tasks = {
+            "similar": asyncio.ensure_future(_similar_leg_async(topic, latencies)),
+            "tips": asyncio.ensure_future(_tips_leg_async(latencies))
+        }
+    await asyncio.wait(tasks.values(), timeout=deadline)
+
+    retrieval = RagRetrieval()
+    for source, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            retrieval.timed_out.append(source)
+        elif task.exception() is not None:
+            retrieval.failed[source] = str(task.exception())
+        else:
+            _collect_leg(retrieval, source, task.result())
+
+    _record_timeouts(retrieval.timed_out)
+    _record_latency(latencies, "total", started)
+    retrieval.latencies_ms = dict(latencies)
+    tracing.annotate(**_retrieval_attrs(retrieval))
+    return retrieval
+
+
+@coalesce("build_rag_context")
+async def build_rag_context_async(topic: str) -> str:
+    """Async variant of build_rag_context."""
+    return (await retrieve_rag_context_async(topic)).context
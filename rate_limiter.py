@@ -0,0 +1,353 @@
+"""
+ICOS Rate Limiter
+One token bucket per provider, shared by every module in the process, with
+retry and adaptive backoff for outbound API calls.
+
+Wrap a call with `call("openai", fn, *args)` (or `await call_async(...)`):
+the call waits for a token, and 429/5xx/connection errors are retried with
+exponential backoff, honoring Retry-After. A 429 also halves the provider's
+rate and pauses its bucket for everyone; successes restore it gradually.
+
+Writes that aren't safe to repeat (inserts, Notion creates/appends) go
+through `call_write` instead, or are detected by `execute`: they are only
+retried when the request provably never took effect, i.e. a 429 or an error
+before the connection was made. A timeout after sending may have committed.
+
+Callers with their own failover (llm_router) use `call_once`: one attempt,
+bounded by the caller's deadline, so an error surfaces right away.
+
+Rates come from ICOS_RATE_<PROVIDER>=<requests per second>[:<burst>].
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+import tracing
+
+# requests/second, burst
+DEFAULT_RATES = {
+    "openai": (20.0, 20),
+    "anthropic": (4.0, 8),
+    "gemini": (4.0, 8),
+    "notion": (3.0, 3),
+    "supabase": (50.0, 50)
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504, 529}
+# httpx errors raised before the request was sent (SDKs wrap them; see _never_sent)
+CONNECT_PHASE_ERRORS = ("ConnectError", "ConnectTimeout", "PoolTimeout")
+MAX_RETRIES = int(os.environ.get("ICOS_MAX_RETRIES", "4"))
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class TokenBucket:
+    def __init__(self, provider: str, rate: float, burst: int):
+        self.provider = provider
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "throttle_wait_seconds": 0.0, "retries": 0, "rate_limited": 0, "waiting": 0}
+
+    def _reserve(self, max_wait: float = None) -> float:
+        """
+        Take a token (possibly going into debt) and return how long to wait for it.
+        Raises TimeoutError, without taking the token, if that's longer than max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate, self._paused_until - now)
+            if max_wait is not None and delay > max_wait:
+                self._tokens += 1
+                raise TimeoutError(f"{self.provider}: next rate-limit token in {delay:.1f}s, past the deadline")
+            self.stats["calls"] += 1
+            if delay > 0:
+                self.stats["throttled"] += 1
+                self.stats["throttle_wait_seconds"] += delay
+                self.stats["waiting"] += 1
+            return delay
+
+    def _done_waiting(self) -> None:
+        with self._lock:
+            self.stats["waiting"] -= 1
+
+    def acquire(self, max_wait: float = None) -> float:
+        delay = self._reserve(max_wait)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self._done_waiting()
+        return delay
+
+    async def acquire_async(self, max_wait: float = None) -> float:
+        delay = self._reserve(max_wait)
+        if delay > 0:
+            # A cancelled waiter (hedge loser, client disconnect) must still leave the queue
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._done_waiting()
+        return delay
+
+    def on_rate_limited(self, retry_after: float) -> None:
+        """Provider pushed back: halve the rate and pause every caller for retry_after."""
+        with self._lock:
+            self.rate = max(self.max_rate * 0.1, self.rate * 0.5)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self.stats["rate_limited"] += 1
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    """The process-wide bucket for a provider."""
+    with _buckets_lock:
+        if provider not in _buckets:
+            rate, burst = DEFAULT_RATES.get(provider, (10.0, 10))
+            configured = os.environ.get(f"ICOS_RATE_{provider.upper()}")
+            if configured:
+                rate_text, _, burst_text = configured.partition(":")
+                rate = float(rate_text)
+                burst = int(burst_text) if burst_text else max(1, int(rate))
+            _buckets[provider] = TokenBucket(provider, rate, burst)
+        return _buckets[provider]
+
+
+def _status_of(error: Exception) -> Optional[int]:
+    """HTTP status from OpenAI/Anthropic, Notion, httpx and Google API errors."""
+    for attr in ("status_code", "status", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _never_sent(error: Exception) -> bool:
+    """True if the error (or one it wraps) happened before the request reached the server."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if type(error).__name__ in CONNECT_PHASE_ERRORS:
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int, idempotent: bool = True) -> Optional[float]:
+    """Seconds to wait before retrying, or None if the error isn't retryable."""
+    status = _status_of(error)
+    name = type(error).__name__
+    if status not in RETRYABLE_STATUS and not (status is None and ("Connection" in name or "Timeout" in name)):
+        return None
+    if not idempotent and status != 429 and not _never_sent(error):
+        return None
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass
+    return min(MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
+def acquire(provider: str) -> None:
+    """Wait for a token without retry handling (e.g. before opening a stream)."""
+    get_bucket(provider).acquire()
+
+
+async def acquire_async(provider: str) -> None:
+    await get_bucket(provider).acquire_async()
+
+
+def _span_name(provider: str, fn: Callable) -> str:
+    """e.g. "openai.embeddings.create", "notion.blocks_children.list"."""
+    op = (getattr(fn, "__qualname__", None) or type(fn).__name__).replace("Endpoint", "")
+    return f"{provider}.{re.sub(r'(?<=[a-z0-9])(?=[A-Z])', '_', op).lower()}"
+
+
+def call(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run fn under the provider's rate limit, retrying transient failures."""
+    return _call(provider, _span_name(provider, fn), fn, args, kwargs)
+
+
+def call_once(provider: str, fn: Callable, deadline: float, **kwargs) -> Any:
+    """
+    Run fn(timeout=..., **kwargs) once under the provider's rate limit, for
+    callers that fail over instead of retrying. The token wait and the request
+    timeout both fit in what's left until `deadline` (a time.monotonic() value).
+    """
+    bucket = get_bucket(provider)
+    with tracing.span(_span_name(provider, fn)) as span:
+        waited = bucket.acquire(max_wait=deadline - time.monotonic())
+        span.set(attempts=1, throttle_wait_ms=round(waited * 1000, 1))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{provider}: deadline passed while waiting for a rate-limit token")
+        try:
+            result = fn(timeout=remaining, **kwargs)
+        except Exception as e:
+            span.set(status=_status_of(e))
+            if _status_of(e) == 429:
+                bucket.on_rate_limited(_retry_delay(e, 0))
+            raise
+        bucket.on_success()
+        return result
+
+
+async def call_once_async(provider: str, fn: Callable, deadline: float, **kwargs) -> Any:
+    """Async variant of call_once: fn(...) must return an awaitable."""
+    bucket = get_bucket(provider)
+    with tracing.span(_span_name(provider, fn)) as span:
+        waited = await bucket.acquire_async(max_wait=deadline - time.monotonic())
+        span.set(attempts=1, throttle_wait_ms=round(waited * 1000, 1))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{provider}: deadline passed while waiting for a rate-limit token")
+        try:
+            result = await fn(timeout=remaining, **kwargs)
+        except Exception as e:
+            span.set(status=_status_of(e))
+            if _status_of(e) == 429:
+                bucket.on_rate_limited(_retry_delay(e, 0))
+            raise
+        bucket.on_success()
+        return result
+
+
+def call_write(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """Like call, for writes that must not be repeated: retried only on 429 and connect errors."""
+    return _call(provider, _span_name(provider, fn), fn, args, kwargs, idempotent=False)
+
+
+def _call(provider: str, name: str, fn: Callable, args: tuple, kwargs: dict, idempotent: bool = True) -> Any:
+    bucket = get_bucket(provider)
+    with tracing.span(name) as span:
+        waited = 0.0
+        for attempt in range(MAX_RETRIES + 1):
+            waited += bucket.acquire()
+            span.set(attempts=attempt + 1, throttle_wait_ms=round(waited * 1000, 1))
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt, idempotent)
+                if delay is None or attempt == MAX_RETRIES:
+                    span.set(status=_status_of(e))
+                    raise
+                if _status_of(e) == 429:
+                    bucket.on_rate_limited(delay)
+                bucket.stats["retries"] += 1
+                time.sleep(delay)
+                continue
+            bucket.on_success()
+            return result
+
+
+async def call_async(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """Async variant of call: fn(*args, **kwargs) must return an awaitable."""
+    return await _call_async(provider, _span_name(provider, fn), fn, args, kwargs)
+
+
+async def call_write_async(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """Async variant of call_write."""
+    return await _call_async(provider, _span_name(provider, fn), fn, args, kwargs, idempotent=False)
+
+
+async def _call_async(provider: str, name: str, fn: Callable, args: tuple, kwargs: dict, idempotent: bool = True) -> Any:
+    bucket = get_bucket(provider)
+    with tracing.span(name) as span:
+        waited = 0.0
+        for attempt in range(MAX_RETRIES + 1):
+            waited += await bucket.acquire_async()
+            span.set(attempts=attempt + 1, throttle_wait_ms=round(waited * 1000, 1))
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt, idempotent)
+                if delay is None or attempt == MAX_RETRIES:
+                    span.set(status=_status_of(e))
+                    raise
+                if _status_of(e) == 429:
+                    bucket.on_rate_limited(delay)
+                bucket.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            bucket.on_success()
+            return result
+
+
+def limiter_stats() -> dict:
+    """Per-provider rate, queue depth (callers waiting) and throttle/retry counters."""
+    with _buckets_lock:
+        return {
+            provider: {
+                "rate": round(bucket.rate, 3),
+                "max_rate": bucket.max_rate,
+                "queue_depth": bucket.stats["waiting"],
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in bucket.stats.items() if k != "waiting"}
+            }
+            for provider, bucket in _buckets.items()
+        }
+
+
+# PostgREST verbs by HTTP method
+_QUERY_OPS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def _query_span_name(query) -> str:
+    """e.g. "supabase.content_library.select" or "supabase.rpc.match_content"."""
+    request = getattr(query, "request", None)
+    path = str(getattr(request, "path", "")).split("/rest/v1/", 1)[-1].split("?", 1)[0]
+    if not path:
+        return "supabase.query"
+    if path.startswith("rpc/"):
+        return f"supabase.rpc.{path[4:]}"
+    return f"supabase.{path}.{_QUERY_OPS.get(getattr(request, 'http_method', ''), 'query')}"
+
+
+def _query_is_idempotent(query) -> bool:
+    """Everything but a plain insert: upserts, updates, deletes and RPCs can be repeated."""
+    request = getattr(query, "request", None)
+    if getattr(request, "http_method", None) != "POST" or "/rpc/" in str(getattr(request, "path", "")):
+        return True
+    prefer = (getattr(request, "headers", None) or {}).get("prefer", "")
+    return "resolution=merge-duplicates" in prefer or "resolution=ignore-duplicates" in prefer
+
+
+def execute(query, idempotent: bool = None) -> Any:
+    """
+    query.execute() for a Supabase/PostgREST builder under the "supabase" limit.
+    Inserts are detected and only retried when they can't have been applied;
+    pass idempotent=False for an RPC that writes non-repeatably.
+    """
+    if idempotent is None:
+        idempotent = _query_is_idempotent(query)
+    return _call("supabase", _query_span_name(query), query.execute, (), {}, idempotent)
+
+
+async def execute_async(query, idempotent: bool = None) -> Any:
+    if idempotent is None:
+        idempotent = _query_is_idempotent(query)
+    return await _call_async("supabase", _query_span_name(query), query.execute, (), {}, idempotent)
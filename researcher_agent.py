@@ -3,18 +3,20 @@ ICOS Researcher Agent
 Finds trending topics and automatically populates the Notion Content Ideas database.
 """
 
-import os
 import json
+import time
 from datetime import datetime
-from anthropic import Anthropic
+from clients import get_anthropic
 from sync_service import SyncService
+from llm_usage import record_usage
+from usage_ledger import workflow
+import rate_limiter
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class ResearcherAgent:
     def __init__(self):
-        self.client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
         self.sync = SyncService()
         self.topics = [
             "SaaS Growth", 
@@ -41,11 +43,15 @@ Rules:
 
 Output ONLY the JSON array."""
 
-        response = self.client.messages.create(
+        started = time.perf_counter()
+        response = rate_limiter.call(
+            "anthropic",
+            get_anthropic().messages.create,
             model="claude-3-5-sonnet-latest",
             max_tokens=1000,
             messages=[{"role": "user", "content": prompt}]
         )
+        record_usage("researcher", "anthropic", response, model="claude-3-5-sonnet-latest", started=started)
         
         try:
             # Simple extraction in case of markdown blocks
@@ -56,6 +62,7 @@ Output ONLY the JSON array."""
         except:
             return []
 
+    @workflow("research")
     def run(self):
         print(f"[{datetime.now()}] Starting Research Run...")
         
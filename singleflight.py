@@ -0,0 +1,152 @@
+"""
+ICOS Single-Flight
+Coalesces identical concurrent calls so only one of them does the work.
+
+`@coalesce("generate_post")` keys each call on its normalized arguments
+(whitespace-insensitive strings, defaults applied). While a call with that key
+is running, identical calls wait for its result instead of starting their own:
+threads block on the sync variant, coroutines await a shared task on the async
+one. Nothing is cached; the key is released as soon as the call finishes.
+
+Waiters get a deep copy of the result, so mutating it never affects another
+caller. Counters per group are in singleflight_stats().
+"""
+
+import copy
+import json
+import asyncio
+import hashlib
+import inspect
+import functools
+import threading
+from typing import Any, Callable
+from embedding_cache import normalize_text
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(payload: Any) -> str:
+    """Stable digest of a request payload, insensitive to whitespace and key order."""
+    encoded = json.dumps(_normalize(payload), sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self._tasks: dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def _count(self, leader: bool) -> None:
+        self.stats["calls"] += 1
+        self.stats["executed" if leader else "coalesced"] += 1
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless a call with `key` is in flight; then share its outcome."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """Async variant of do: callers share one task (a cancelled caller doesn't cancel it)."""
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn(*args, **kwargs))
+                task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+            self._count(leader)
+
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
+
+
+_groups: dict[str, Group] = {}
+
+
+def group(name: str) -> Group:
+    """The process-wide group for `name`."""
+    if name not in _groups:
+        _groups[name] = Group(name)
+    return _groups[name]
+
+
+def coalesce(name: str) -> Callable:
+    """Decorator: single-flight a sync or async function on its normalized arguments."""
+    flight = group(name)
+
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        def key_of(args, kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return make_key(bound.arguments)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper_async(*args, **kwargs):
+                return await flight.do_async(key_of(args, kwargs), fn, *args, **kwargs)
+            return wrapper_async
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key_of(args, kwargs), fn, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def singleflight_stats() -> dict:
+    """Per group: calls, calls that did the work, calls served by another's result, in flight now."""
+    return {
+        name: {
+            **g.stats,
+            "coalesced_ratio": round(g.stats["coalesced"] / g.stats["calls"], 4) if g.stats["calls"] else 0.0,
+            "in_flight": g.in_flight()
+        }
+        for name, g in _groups.items()
+    }
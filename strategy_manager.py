@@ -4,35 +4,38 @@ CRUD operations for topics and styles in the strategy matrix.
 """
 
 import os
+import threading
 from typing import Optional
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from clients import get_supabase
+from combo_sampler import ComboSampler
+import rate_limiter
 
 load_dotenv()
 
-supabase: Client = create_client(
-    os.environ.get("SUPABASE_URL", ""),
-    os.environ.get("SUPABASE_KEY", "")
-)
+# Sample weighted combos in-process (set ICOS_COMBO_SAMPLER=0 to use the get_weighted_combo RPC)
+COMBO_SAMPLER_ENABLED = os.environ.get("ICOS_COMBO_SAMPLER", "1") != "0"
+_combo_sampler: Optional[ComboSampler] = None
+_combo_sampler_lock = threading.Lock()
 
 
 # ========== TOPICS ==========
 
 def list_topics(active_only: bool = True) -> list[dict]:
     """List all topics."""
-    query = supabase.table("topics").select("*")
+    query = get_supabase().table("topics").select("*")
     if active_only:
         query = query.eq("is_active", True)
-    result = query.order("name").execute()
+    result = rate_limiter.execute(query.order("name"))
     return result.data if result.data else []
 
 
 def add_topic(name: str, description: str = "") -> dict:
     """Add a new topic."""
-    result = supabase.table("topics").insert({
+    result = rate_limiter.execute(get_supabase().table("topics").insert({
         "name": name,
         "description": description
-    }).execute()
+    }))
     return result.data[0] if result.data else {}
 
 
@@ -46,13 +49,13 @@ def update_topic(topic_id: str, name: str = None, description: str = None, is_ac
     if is_active is not None:
         updates["is_active"] = is_active
     
-    result = supabase.table("topics").update(updates).eq("id", topic_id).execute()
+    result = rate_limiter.execute(get_supabase().table("topics").update(updates).eq("id", topic_id))
     return result.data[0] if result.data else {}
 
 
 def delete_topic(topic_id: str) -> bool:
     """Soft delete a topic (set inactive)."""
-    result = supabase.table("topics").update({"is_active": False}).eq("id", topic_id).execute()
+    result = rate_limiter.execute(get_supabase().table("topics").update({"is_active": False}).eq("id", topic_id))
     return len(result.data) > 0 if result.data else False
 
 
@@ -60,19 +63,19 @@ def delete_topic(topic_id: str) -> bool:
 
 def list_styles(active_only: bool = True) -> list[dict]:
     """List all styles."""
-    query = supabase.table("styles").select("*")
+    query = get_supabase().table("styles").select("*")
     if active_only:
         query = query.eq("is_active", True)
-    result = query.order("name").execute()
+    result = rate_limiter.execute(query.order("name"))
     return result.data if result.data else []
 
 
 def add_style(name: str, instruction: str) -> dict:
     """Add a new style."""
-    result = supabase.table("styles").insert({
+    result = rate_limiter.execute(get_supabase().table("styles").insert({
         "name": name,
         "instruction": instruction
-    }).execute()
+    }))
     return result.data[0] if result.data else {}
 
 
@@ -86,13 +89,13 @@ def update_style(style_id: str, name: str = None, instruction: str = None, is_ac
     if is_active is not None:
         updates["is_active"] = is_active
     
-    result = supabase.table("styles").update(updates).eq("id", style_id).execute()
+    result = rate_limiter.execute(get_supabase().table("styles").update(updates).eq("id", style_id))
     return result.data[0] if result.data else {}
 
 
 def delete_style(style_id: str) -> bool:
     """Soft delete a style (set inactive)."""
-    result = supabase.table("styles").update({"is_active": False}).eq("id", style_id).execute()
+    result = rate_limiter.execute(get_supabase().table("styles").update({"is_active": False}).eq("id", style_id))
     return len(result.data) > 0 if result.data else False
 
 
@@ -100,31 +103,50 @@ def delete_style(style_id: str) -> bool:
 
 def get_next_combo() -> Optional[dict]:
     """Get a random unused topic/style combination."""
-    result = supabase.rpc("get_next_combo").execute()
+    result = rate_limiter.execute(get_supabase().rpc("get_next_combo"))
     return result.data[0] if result.data else None
 
 
+def get_combo_sampler() -> ComboSampler:
+    """Process-wide combo sampler, loaded on first use."""
+    global _combo_sampler
+    with _combo_sampler_lock:
+        if _combo_sampler is None:
+            _combo_sampler = ComboSampler(get_supabase())
+        return _combo_sampler
+
+
 def get_weighted_combo() -> Optional[dict]:
     """Get a performance-based topic/style combination."""
-    result = supabase.rpc("get_weighted_combo").execute()
+    if COMBO_SAMPLER_ENABLED:
+        return get_combo_sampler().sample()
+    result = rate_limiter.execute(get_supabase().rpc("get_weighted_combo"))
     return result.data[0] if result.data else None
 
 
+def record_style_score(style: str, virality_score: float, previous: float = None) -> None:
+    """Fold a stored score (or a row's change from `previous`) into the sampler's style weights, if loaded."""
+    if _combo_sampler is not None:
+        _combo_sampler.record_score(style, virality_score, previous)
+
+
 def schedule_content(topic_id: str, style_id: str, scheduled_date: str) -> dict:
     """Schedule a topic/style combo for a specific date."""
-    result = supabase.table("content_schedule").insert({
+    result = rate_limiter.execute(get_supabase().table("content_schedule").insert({
         "topic_id": topic_id,
         "style_id": style_id,
         "scheduled_date": scheduled_date
-    }).execute()
+    }))
+    if _combo_sampler is not None:
+        _combo_sampler.mark_used(topic_id, style_id)
     return result.data[0] if result.data else {}
 
 
 def get_schedule(days: int = 30) -> list[dict]:
     """Get upcoming scheduled content."""
-    result = supabase.table("content_schedule").select(
+    result = rate_limiter.execute(get_supabase().table("content_schedule").select(
         "*, topics(name), styles(name)"
-    ).gte("scheduled_date", "now()").order("scheduled_date").limit(days).execute()
+    ).gte("scheduled_date", "now()").order("scheduled_date").limit(days))
     return result.data if result.data else []
 
 
@@ -0,0 +1,55 @@
+-- Embedding model / dimension migration (e.g. 1536 -> 512 for text-embedding-3-small)
+-- Run this AFTER supabase_schema.sql. Replace 512 below with the target
+-- dimensions; see embedding_migration.py for the full rollout (dual-write,
+-- backfill, cutover).
+--
+-- Recall against the full vectors for candidate settings:
+--   python benchmarks/bench_embedding_recall.py --live
+
+-- Step 1: Shadow columns, dual-written and backfilled while the app keeps reading `embedding`
+alter table content_library add column if not exists embedding_next vector(512);
+alter table user_profile add column if not exists embedding_next vector(512);
+
+-- Function: Write many embeddings in one statement.
+-- p_rows is [{"id": "...", "embedding": "[0.1,...]"}, ...]
+create or replace function bulk_set_embeddings(p_table text, p_column text, p_rows jsonb)
+returns int
+language plpgsql
+as $$
+declare
+    updated int;
+begin
+    if p_table not in ('content_library', 'user_profile') or p_column not like 'embedding%' then
+        raise exception 'bulk_set_embeddings: %.% is not an embedding column', p_table, p_column;
+    end if;
+    execute format(
+        'update %I t set %I = (r->>''embedding'')::vector
+         from jsonb_array_elements($1) r
+         where t.id = (r->>''id'')::uuid',
+        p_table, p_column
+    ) using p_rows;
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$;
+
+-- Alternative to `--mode truncate` on pgvector >= 0.7: shorten in place, no round trips
+-- update content_library set embedding_next = l2_normalize(subvector(embedding, 1, 512)) where embedding is not null;
+-- update user_profile set embedding_next = l2_normalize(subvector(embedding, 1, 512)) where embedding is not null;
+
+-- Step 2: Cutover (once embedding_migration.py reports every row done), then
+-- deploy with the new ICOS_EMBEDDING_MODEL / ICOS_EMBEDDING_DIMENSIONS and no
+-- ICOS_EMBEDDING_SHADOW_* settings. Pause ingestion (scheduled syncs, analyst
+-- runs) from here until the deploy is done: old instances' vectors no longer
+-- fit `embedding`. Retrieval degrades to empty RAG context in that window.
+-- match_content and get_rag_bundle need no change: Postgres ignores the
+-- (1536) on their parameters.
+--
+-- begin;
+-- alter table content_library drop column embedding;
+-- alter table content_library rename column embedding_next to embedding;
+-- alter table user_profile drop column embedding;
+-- alter table user_profile rename column embedding_next to embedding;
+-- create index on content_library using ivfflat (embedding vector_cosine_ops) with (lists = 100);
+-- create index on user_profile using ivfflat (embedding vector_cosine_ops) with (lists = 100);
+-- commit;
@@ -0,0 +1,58 @@
+-- RAG Bundle: one round trip for the Ghostwriter context
+-- Run this AFTER supabase_schema.sql
+
+-- Function: Similar content, recent tips and top winners in a single response.
+-- Content is truncated server-side to the snippet length the prompt actually uses.
+create or replace function get_rag_bundle(
+    query_embedding vector(1536),
+    match_threshold float default 0.7,
+    match_count int default 3,
+    tips_count int default 5,
+    winners_count int default 5,
+    snippet_chars int default 300
+)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'similar', coalesce((
+            select jsonb_agg(m order by m.similarity desc)
+            from (
+                select
+                    cl.id,
+                    left(cl.content, snippet_chars) as content,
+                    cl.topic,
+                    cl.style,
+                    cl.virality_score,
+                    cl.verdict,
+                    cl.improvement_tip,
+                    1 - (cl.embedding <=> query_embedding) as similarity
+                from content_library cl
+                where 1 - (cl.embedding <=> query_embedding) > match_threshold
+                order by cl.embedding <=> query_embedding
+                limit match_count
+            ) m
+        ), '[]'::jsonb),
+        'tips', coalesce((
+            select jsonb_agg(t.improvement_tip order by t.analyzed_at desc)
+            from (
+                select improvement_tip, analyzed_at
+                from content_library
+                where improvement_tip is not null
+                order by analyzed_at desc
+                limit tips_count
+            ) t
+        ), '[]'::jsonb),
+        'winners', coalesce((
+            select jsonb_agg(w order by w.virality_score desc)
+            from (
+                select id, left(content, snippet_chars) as content, topic, virality_score, improvement_tip
+                from content_library
+                where verdict = 'WINNER'
+                order by virality_score desc
+                limit winners_count
+            ) w
+        ), '[]'::jsonb)
+    );
+$$;
@@ -0,0 +1,48 @@
+-- Running style performance aggregates for the in-process combo sampler
+-- Run this AFTER supabase_strategy_schema.sql
+
+-- Table: Style Stats (sum/count of virality_score per content_library.style)
+create table style_stats (
+    style text primary key,
+    score_sum double precision not null default 0,
+    score_count bigint not null default 0
+);
+
+-- Backfill from existing content
+insert into style_stats (style, score_sum, score_count)
+select style, sum(virality_score), count(virality_score)
+from content_library
+where style is not null and virality_score is not null
+group by style;
+
+-- Function: Apply one row's contribution (+1 / -1) to style_stats
+create or replace function bump_style_stats(p_style text, p_score float, p_sign int)
+returns void
+language sql
+as $$
+    insert into style_stats (style, score_sum, score_count)
+    values (p_style, p_sign * p_score, p_sign)
+    on conflict (style) do update set
+        score_sum = style_stats.score_sum + excluded.score_sum,
+        score_count = style_stats.score_count + excluded.score_count;
+$$;
+
+-- Trigger: Keep style_stats in step with content_library
+create or replace function content_library_style_stats()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') and old.style is not null and old.virality_score is not null then
+        perform bump_style_stats(old.style, old.virality_score, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and new.style is not null and new.virality_score is not null then
+        perform bump_style_stats(new.style, new.virality_score, 1);
+    end if;
+    return null;
+end;
+$$;
+
+create trigger content_library_style_stats
+after insert or delete or update of style, virality_score on content_library
+for each row execute function content_library_style_stats();
@@ -5,22 +5,21 @@ Unifies branding sync, strategy matrix sync, and content idea fetching.
 
 import os
 import json
+import asyncio
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from notion_client import Client
-from supabase import create_client, Client as SupabaseClient
 from dotenv import load_dotenv
-from rag_core import ingest_user_profile
+from clients import get_notion, get_async_notion, get_supabase
+from notion_reader import NotionReader
+import rate_limiter
+import tracing
+from usage_ledger import workflow
+from rag_core import ingest_user_profile_bulk, sync_user_profile_chunks
 
 load_dotenv()
 
 class SyncService:
     def __init__(self):
-        self.notion = Client(auth=os.environ.get("NOTION_API_KEY", ""))
-        self.supabase: SupabaseClient = create_client(
-            os.environ.get("SUPABASE_URL", ""),
-            os.environ.get("SUPABASE_KEY", "")
-        )
         self.branding_page_id = os.environ.get("NOTION_BRANDING_PAGE_ID")
         self.topics_db_id = os.environ.get("NOTION_TOPICS_DB_ID")
         self.styles_db_id = os.environ.get("NOTION_STYLES_DB_ID")
@@ -28,20 +27,35 @@ class SyncService:
         
         self.profile_path = os.path.join(os.path.dirname(__file__), "user_profile.json")
 
+    # Clients come from the shared registry, so they're built on first use
+    @property
+    def notion(self):
+        return get_notion()
+
+    @property
+    def async_notion(self):
+        return get_async_notion()
+
+    @property
+    def supabase(self):
+        return get_supabase()
+
+    @property
+    def reader(self) -> NotionReader:
+        return NotionReader(self.notion)
+
     def _get_page_text(self, page_id: str) -> str:
-        """Helper to extract text from a Notion page."""
-        blocks = self.notion.blocks.children.list(block_id=page_id)
-        text_parts = []
-        for block in blocks.get("results", []):
-            block_type = block.get("type")
-            if block_type in ["paragraph", "heading_1", "heading_2", "heading_3", 
-                              "bulleted_list_item", "numbered_list_item", "callout"]:
-                rich_text = block.get(block_type, {}).get("rich_text", [])
-                text_parts.append(" ".join([t.get("plain_text", "") for t in rich_text]))
-        return "\n".join(text_parts)
-
-    def sync_branding(self) -> Dict[str, Any]:
-        """Syncs the branding page to local JSON and Supabase RAG."""
+        """Helper to extract text from a Notion page (all pages of blocks, nested included)."""
+        return self.reader.page_text(page_id)
+
+    @tracing.traced("sync.branding")
+    @workflow("profile-sync")
+    def sync_branding(self, incremental: bool = True) -> Dict[str, Any]:
+        """Syncs the branding page to local JSON and Supabase RAG.
+        
+        Incremental mode only embeds new chunks and removes vanished ones;
+        pass incremental=False to re-ingest every chunk.
+        """
         if not self.branding_page_id:
             return {"error": "NOTION_BRANDING_PAGE_ID not set"}
             
@@ -59,52 +73,59 @@ class SyncService:
         # 2. Ingest into RAG (Supabase)
         # We split by double newlines for chunking
         chunks = [c for c in content.split("\n\n") if len(c.strip()) > 50]
-        for chunk in chunks:
-            ingest_user_profile(chunk, category="bio") # Defaulting to bio for now
+        tracing.annotate(content_chars=len(content), chunks=len(chunks), incremental=incremental)
+        if incremental:
+            diff = sync_user_profile_chunks(chunks, category="bio") # Defaulting to bio for now
+            return {"status": "success", **diff}
+
+        outcomes = ingest_user_profile_bulk(chunks, category="bio")
+        errors = [o["error"] for o in outcomes if "error" in o]
             
-        return {"status": "success", "chunks_ingested": len(chunks)}
+        return {"status": "success", "chunks_ingested": len(chunks) - len(errors), "errors": errors}
 
+    @tracing.traced("sync.strategy")
     def sync_strategy(self) -> Dict[str, Any]:
         """Syncs Topics and Styles databases to Supabase."""
         results = {"topics": 0, "styles": 0}
         
         if self.topics_db_id:
-            topics = self.notion.databases.query(database_id=self.topics_db_id).get("results", [])
+            topics = self.reader.iter_database(self.topics_db_id)
             for page in topics:
                 name = page["properties"]["Name"]["title"][0]["plain_text"]
                 desc_obj = page["properties"].get("Description", {}).get("rich_text", [])
                 description = desc_obj[0]["plain_text"] if desc_obj else ""
                 
-                self.supabase.table("topics").upsert({
+                rate_limiter.execute(self.supabase.table("topics").upsert({
                     "name": name,
                     "description": description,
                     "is_active": True
-                }, on_conflict="name").execute()
+                }, on_conflict="name"))
                 results["topics"] += 1
                 
         if self.styles_db_id:
-            styles = self.notion.databases.query(database_id=self.styles_db_id).get("results", [])
+            styles = self.reader.iter_database(self.styles_db_id)
             for page in styles:
                 name = page["properties"]["Name"]["title"][0]["plain_text"]
                 instr_obj = page["properties"].get("Instruction", {}).get("rich_text", [])
                 instruction = instr_obj[0]["plain_text"] if instr_obj else ""
                 
-                self.supabase.table("styles").upsert({
+                rate_limiter.execute(self.supabase.table("styles").upsert({
                     "name": name,
                     "instruction": instruction,
                     "is_active": True
-                }, on_conflict="name").execute()
+                }, on_conflict="name"))
                 results["styles"] += 1
                 
+        tracing.annotate(**results)
         return results
 
+    @tracing.traced("sync.pending_ideas")
     def get_pending_ideas(self) -> List[Dict[str, Any]]:
         """Fetches ideas with status 'Generate' or 'New'."""
         if not self.ideas_db_id:
             return []
             
         query = {
-            "database_id": self.ideas_db_id,
             "filter": {
                 "or": [
                     {"property": "Status", "select": {"equals": "Generate"}},
@@ -112,7 +133,7 @@ class SyncService:
                 ]
             }
         }
-        results = self.notion.databases.query(**query).get("results", [])
+        results = self.reader.iter_database(self.ideas_db_id, **query)
         
         ideas = []
         for page in results:
@@ -122,39 +143,79 @@ class SyncService:
                 "topic": name,
                 "platform": "linkedin" # Default
             })
+        tracing.annotate(ideas=len(ideas))
         return ideas
 
+    def _idea_properties(self, topic: str, platform: str, source: str) -> Dict[str, Any]:
+        return {
+            "Name": {"title": [{"text": {"content": topic}}]},
+            "Status": {"select": {"name": "Idea"}},
+            "Platform": {"select": {"name": platform.capitalize()}},
+            "Source": {"rich_text": [{"text": {"content": source}}]}
+        }
+
+    def _draft_blocks(self, draft: str) -> List[Dict[str, Any]]:
+        return [{
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": [{"type": "text", "text": {"content": draft}}]
+            }
+        }]
+
+    @tracing.traced("sync.add_idea")
     def add_idea(self, topic: str, platform: str = "linkedin", source: str = "Research Agent"):
         """Adds a new idea to the Notion database."""
         if not self.ideas_db_id:
             return
             
-        self.notion.pages.create(
+        rate_limiter.call_write(
+            "notion",
+            self.notion.pages.create,
             parent={"database_id": self.ideas_db_id},
-            properties={
-                "Name": {"title": [{"text": {"content": topic}}]},
-                "Status": {"select": {"name": "Idea"}},
-                "Platform": {"select": {"name": platform.capitalize()}},
-                "Source": {"rich_text": [{"text": {"content": source}}]}
-            }
+            properties=self._idea_properties(topic, platform, source)
         )
 
+    @tracing.traced("sync.update_idea_status")
     def update_idea_status(self, page_id: str, status: str, draft: str = None):
         """Updates the status and adds draft content to a Notion page."""
         properties = {"Status": {"select": {"name": status}}}
-        self.notion.pages.update(page_id=page_id, properties=properties)
+        rate_limiter.call("notion", self.notion.pages.update, page_id=page_id, properties=properties)
         
         if draft:
-            self.notion.blocks.children.append(
-                block_id=page_id,
-                children=[{
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": draft}}]
-                    }
-                }]
-            )
+            rate_limiter.call_write("notion", self.notion.blocks.children.append, block_id=page_id, children=self._draft_blocks(draft))
+
+    # ========== ASYNC ==========
+
+    @tracing.traced("sync.add_idea")
+    async def add_idea_async(self, topic: str, platform: str = "linkedin", source: str = "Research Agent"):
+        """Async variant of add_idea."""
+        if not self.ideas_db_id:
+            return
+            
+        await rate_limiter.call_write_async(
+            "notion",
+            self.async_notion.pages.create,
+            parent={"database_id": self.ideas_db_id},
+            properties=self._idea_properties(topic, platform, source)
+        )
+
+    @tracing.traced("sync.update_idea_status")
+    async def update_idea_status_async(self, page_id: str, status: str, draft: str = None):
+        """Async variant of update_idea_status."""
+        properties = {"Status": {"select": {"name": status}}}
+        await rate_limiter.call_async("notion", self.async_notion.pages.update, page_id=page_id, properties=properties)
+        
+        if draft:
+            await rate_limiter.call_write_async("notion", self.async_notion.blocks.children.append, block_id=page_id, children=self._draft_blocks(draft))
+
+    async def sync_branding_async(self, incremental: bool = True) -> Dict[str, Any]:
+        """Runs sync_branding off the event loop (it is a throttled, multi-call batch job)."""
+        return await asyncio.to_thread(self.sync_branding, incremental)
+
+    async def sync_strategy_async(self) -> Dict[str, Any]:
+        """Runs sync_strategy off the event loop."""
+        return await asyncio.to_thread(self.sync_strategy)
 
 if __name__ == "__main__":
     service = SyncService()
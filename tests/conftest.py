@@ -0,0 +1,37 @@
+"""
+Shared test setup: ICOS modules read their config at import time, so the
+environment is fixed here before any of them is imported. Provider clients
+are the in-memory fakes from benchmarks/fakes.py.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fakes
+
+os.environ["ICOS_EMBEDDING_CACHE"] = "0"
+os.environ["ICOS_ANALYSIS_CACHE"] = "0"
+os.environ["ICOS_LOCAL_INDEX"] = "0"
+os.environ["ICOS_USAGE_LEDGER"] = "0"
+for provider in fakes.PROVIDERS:
+    os.environ[f"ICOS_RATE_{provider.upper()}"] = "1000000"
+for name in ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "NOTION_API_KEY"):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture
+def fake_clients():
+    """Every provider client replaced by a fake; yields them with the shared fake database."""
+    import clients
+
+    installed = fakes.install()
+    yield installed
+    for name in list(clients._clients):
+        clients.override(name, None)
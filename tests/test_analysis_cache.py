@@ -0,0 +1,44 @@
+import pytest
+from analysis_cache import AnalysisCache, SCORE_BUCKET_EDGES, score_bucket
+
+
+@pytest.mark.parametrize("score, bucket", [
+    (0.0, 0), (9.99, 0), (10.0, 1), (19.99, 1), (20.0, 2), (49.99, 3), (50.0, 4), (80.0, 5), (500.0, 5)
+])
+def test_bucket_edges_belong_to_the_upper_bucket(score, bucket):
+    assert score_bucket(score) == bucket
+
+
+def test_every_edge_starts_a_new_bucket():
+    assert [score_bucket(edge) for edge in SCORE_BUCKET_EDGES] == list(range(1, len(SCORE_BUCKET_EDGES) + 1))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(path=str(tmp_path / "analyses.sqlite3"))
+
+
+def test_lookup_classifies_hit_stale_and_miss(cache):
+    analysis = {"verdict": "AVERAGE", "improvement_tip": "Shorter hook."}
+    cache.put("A post  about pricing", 15.0, analysis, "row-1")
+
+    status, entry = cache.lookup("A post about pricing", 19.99)
+    assert status == "hit"
+    assert entry["analysis"] == analysis and entry["stored_id"] == "row-1" and entry["score"] == 15.0
+
+    assert cache.lookup("A post about pricing", 20.0)[0] == "stale"
+    assert cache.lookup("Another post", 15.0) == ("miss", None)
+    assert cache.counters == {"hit": 1, "stale": 1, "miss": 1}
+
+
+def test_update_score_keeps_the_verdict(cache):
+    cache.put("post", 12.0, {"verdict": "AVERAGE"}, "row-1")
+    cache.update_score("post", 18.0)
+    status, entry = cache.lookup("post", 18.0)
+    assert status == "hit" and entry["score"] == 18.0 and entry["analysis"] == {"verdict": "AVERAGE"}
+
+
+def test_disabled_cache_always_misses(tmp_path):
+    cache = AnalysisCache(path=str(tmp_path / "analyses.sqlite3"), enabled=False)
+    cache.put("post", 12.0, {"verdict": "AVERAGE"}, "row-1")
+    assert cache.lookup("post", 12.0) == ("miss", None)
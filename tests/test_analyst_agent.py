@@ -0,0 +1,67 @@
+import csv
+import pytest
+from types import SimpleNamespace as ns
+import analyst_agent
+
+
+@pytest.fixture
+def llm_answer(monkeypatch):
+    def answer(text: str):
+        monkeypatch.setattr(analyst_agent.llm_router, "complete", lambda *a, **k: ns(text=text))
+    return answer
+
+
+@pytest.mark.parametrize("text", ["not json", "[1, 2]", "null", '{"verdict": "EPIC"}', '{"verdict": ""}'])
+def test_unusable_answers_fall_back(llm_answer, text):
+    llm_answer(text)
+    analysis = analyst_agent.analyze_post("post", 1, 1, 1, 100, 1.0)
+    assert analysis["verdict"] == "AVERAGE"
+    assert analysis["improvement_tip"] == analyst_agent.FALLBACK_ANALYSIS["improvement_tip"]
+
+
+def test_partial_answers_are_filled_in(llm_answer):
+    llm_answer('```json\n{"verdict": "WINNER", "primary_reason": "Strong hook."}\n```')
+    analysis = analyst_agent.analyze_post("post", 1, 1, 1, 100, 1.0)
+    assert analysis["verdict"] == "WINNER"
+    assert analysis["primary_reason"] == "Strong hook."
+    assert analysis["improvement_tip"] == "Review manually."
+
+
+def test_vectorized_scores_match_the_scalar_ones():
+    metrics = [(10, 2, 1, 1000), (0, 0, 0, 0), (5, 5, 5, 333)]
+    expected = [analyst_agent.calculate_virality_score(*m) for m in metrics]
+    assert analyst_agent.calculate_virality_scores(*zip(*metrics)).tolist() == pytest.approx(expected)
+
+
+def test_bulk_import_is_cached_so_reanalysis_updates_the_row(fake_clients, tmp_path, monkeypatch):
+    from analysis_cache import AnalysisCache
+
+    monkeypatch.setattr(analyst_agent, "analysis_cache", AnalysisCache(path=str(tmp_path / "analyses.sqlite3")))
+    path = tmp_path / "posts.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["content", "topic", "style", "platform", "likes", "comments", "shares", "impressions"])
+        for i in range(3):
+            writer.writerow([f"post {i}", "Pricing", "Story", "linkedin", 10, 1, 1, 1000])
+
+    summary = analyst_agent.bulk_analyze(str(path))
+    assert summary["stored"] == 3 and summary["failed"] == 0
+
+    result = analyst_agent.analyze_and_store("post 0", "Pricing", "Story", 12, 1, 1, 1000)
+    assert result["cached"]
+    assert len(fake_clients.db.tables["content_library"]) == 3
+
+
+def test_one_bad_analysis_does_not_stop_a_bulk_import(fake_clients, tmp_path, monkeypatch):
+    real = analyst_agent.analyze_post
+    monkeypatch.setattr(analyst_agent, "analyze_post",
+                        lambda content, *a: {"verdict": "WINNER"} if content == "post 1" else real(content, *a))
+    path = tmp_path / "posts.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["content", "topic", "style", "platform", "likes", "comments", "shares", "impressions"])
+        for i in range(3):
+            writer.writerow([f"post {i}", "Pricing", "Story", "linkedin", 10, 1, 1, 1000])
+
+    summary = analyst_agent.bulk_analyze(str(path))
+    assert summary["stored"] == 2 and summary["failed"] == 1
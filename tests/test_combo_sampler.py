@@ -0,0 +1,70 @@
+import random
+from collections import Counter
+import pytest
+from combo_sampler import AliasTable, ComboSampler
+
+
+def test_alias_table_draws_match_the_weights():
+    weights = [1.0, 2.0, 7.0]
+    table = AliasTable(weights)
+    rng = random.Random(0)
+    counts = Counter(table.draw(rng) for _ in range(100000))
+    for i, weight in enumerate(weights):
+        assert counts[i] / 100000 == pytest.approx(weight / sum(weights), abs=0.01)
+
+
+def test_alias_table_never_draws_a_zero_weight():
+    table = AliasTable([0.0, 1.0, 0.0])
+    rng = random.Random(1)
+    assert {table.draw(rng) for _ in range(1000)} == {1}
+
+
+def test_alias_table_single_entry():
+    assert AliasTable([3.0]).draw(random.Random(2)) == 0
+
+
+def test_record_score_adds_new_rows_and_swaps_rescored_ones():
+    sampler = ComboSampler(supabase=None)
+    sampler.record_score("Story", 10.0)
+    sampler.record_score("Story", 20.0)
+    assert sampler.style_scores["Story"] == [30.0, 2]
+    sampler.record_score("Story", 25.0, previous=10.0)
+    assert sampler.style_scores["Story"] == [45.0, 2]
+    assert sampler.style_weight("Story") == 1.0 + 22.5
+
+
+def test_sample_skips_combos_used_in_the_window(fake_clients):
+    from run_benchmarks import seed_strategy
+
+    seed_strategy(fake_clients.db)
+    sampler = ComboSampler(fake_clients.supabase, rng=random.Random(3))
+    sampler.refresh()
+    free = {(t["id"], s["id"]) for t in sampler.topics for s in sampler.styles}
+    for topic_id, style_id in list(free)[:-1]:
+        sampler.mark_used(topic_id, style_id)
+    combo = sampler.sample()
+    assert (combo["topic_id"], combo["style_id"]) == list(free)[-1]
+    sampler.mark_used(combo["topic_id"], combo["style_id"])
+    assert sampler.sample() is None
+
+
+def test_missing_style_stats_falls_back_to_scanning_content(fake_clients):
+    fake_clients.db.seed("content_library", [
+        {"content": "a", "style": "Story", "virality_score": 10.0},
+        {"content": "b", "style": "Story", "virality_score": 30.0},
+        {"content": "c", "style": "Story", "virality_score": None}
+    ])
+    sampler = ComboSampler(fake_clients.supabase)
+    assert sampler._load_style_scores() == {"Story": [40.0, 2]}
+
+
+def test_other_style_stats_errors_propagate():
+    class PermissionDenied(Exception):
+        code = "42501"
+
+    class Supabase:
+        def table(self, name):
+            raise PermissionDenied("permission denied for table style_stats")
+
+    with pytest.raises(PermissionDenied):
+        ComboSampler(Supabase())._load_style_scores()
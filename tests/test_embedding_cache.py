@@ -0,0 +1,58 @@
+import pytest
+import embedding_cache
+from embedding_cache import EmbeddingCache, cache_key
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+def test_keys_ignore_whitespace_but_not_model_or_size():
+    assert cache_key("m", 3, "a  b\n") == cache_key("m", 3, "a b")
+    assert cache_key("m", 3, "a b") != cache_key("m", 4, "a b")
+    assert cache_key("m", 3, "a b") != cache_key("n", 3, "a b")
+
+
+def test_hits_come_from_memory_then_disk(path):
+    cache = EmbeddingCache(path=path, memory_entries=1)
+    assert cache.get("m", 3, "a") is None
+    cache.put("m", 3, "a", [1.0, 2.0, 3.0])
+    cache.put("m", 3, "b", [4.0, 5.0, 6.0])
+    assert cache.get("m", 3, "b") == [4.0, 5.0, 6.0]
+    assert cache.get("m", 3, "a") == [1.0, 2.0, 3.0]
+    assert cache.counters["memory_hits"] == 1 and cache.counters["disk_hits"] == 1 and cache.counters["misses"] == 1
+
+
+def test_entry_count_is_tracked_without_rescanning(path):
+    cache = EmbeddingCache(path=path, max_entries=100)
+    for i in range(5):
+        cache.put("m", 1, f"t{i}", [float(i)])
+    cache.put("m", 1, "t0", [9.0])
+    assert cache._disk_entries == 5 == cache.stats()["disk_entries"]
+    # Reopening picks the count up from the file
+    assert EmbeddingCache(path=path).stats()["disk_entries"] == 5
+
+
+def test_eviction_drops_the_least_recently_used(path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "TOUCH_BATCH", 1000)
+    cache = EmbeddingCache(path=path, max_entries=10, memory_entries=0)
+    for i in range(10):
+        cache.put("m", 1, f"t{i}", [float(i)])
+    # Recency of these reads is only in memory until the eviction flushes it
+    for i in range(3):
+        assert cache.get("m", 1, f"t{i}") == [float(i)]
+    cache.put("m", 1, "new", [1.0])
+
+    kept = {i for i in range(10) if cache.get("m", 1, f"t{i}") is not None}
+    assert kept == {0, 1, 2, 5, 6, 7, 8, 9}
+    assert cache.counters["evictions"] == 2
+    assert cache.stats()["disk_entries"] == 9
+
+
+def test_clear_resets_the_count(path):
+    cache = EmbeddingCache(path=path)
+    cache.put("m", 1, "a", [1.0])
+    cache.clear()
+    assert cache.get("m", 1, "a") is None
+    assert cache.stats()["disk_entries"] == 0 == cache._disk_entries
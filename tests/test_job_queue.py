@@ -0,0 +1,153 @@
+import time
+import sqlite3
+import threading
+import pytest
+import job_queue
+from job_queue import JobQueue
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queues():
+    started = []
+    yield started
+    for queue in started:
+        queue.stop(timeout=1)
+
+
+def test_idempotency_key_returns_the_existing_job(db_path):
+    queue = JobQueue(db_path)
+    queue.register("sync", lambda payload: None)
+    first = queue.submit("sync", {"a": 1}, idempotency_key="k1")
+    again = queue.submit("sync", {"a": 2}, idempotency_key="k1")
+    other = queue.submit("sync", {"a": 1}, idempotency_key="k2")
+    assert again["id"] == first["id"] and again["payload"] == {"a": 1}
+    assert other["id"] != first["id"]
+    assert queue.stats()["by_status"] == {"queued": 2}
+
+
+def test_unknown_kind_is_rejected(db_path):
+    with pytest.raises(ValueError):
+        JobQueue(db_path).submit("nope")
+
+
+def test_per_kind_cap_limits_concurrency(db_path, queues):
+    queue = JobQueue(db_path, workers=4)
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def handler(payload):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return payload
+
+    queue.register("capped", handler, max_concurrent=1)
+    queue.register("free", handler)
+    jobs = [queue.submit("capped", {"i": i}) for i in range(4)] + [queue.submit("free", {"i": i}) for i in range(4)]
+    queue.start()
+    queues.append(queue)
+    wait_for(lambda: all(queue.get(j["id"])["status"] == "succeeded" for j in jobs))
+
+    capped = sorted((queue.get(j["id"])["started_at"], queue.get(j["id"])["finished_at"]) for j in jobs[:4])
+    for (_, finished), (next_started, _) in zip(capped, capped[1:]):
+        assert next_started >= finished
+    assert peak[0] > 1  # the uncapped kind ran alongside
+    assert queue.get(jobs[0]["id"])["result"] == {"i": 0}
+
+
+def test_handler_errors_fail_the_job(db_path, queues):
+    queue = JobQueue(db_path)
+    queue.register("boom", lambda payload: 1 / 0)
+    job = queue.submit("boom")
+    queue.start()
+    queues.append(queue)
+    wait_for(lambda: queue.get(job["id"])["status"] == "failed")
+    assert "ZeroDivisionError" in queue.get(job["id"])["error"]
+
+
+def test_interrupted_jobs_are_replayed_only_when_idempotent(db_path, queues):
+    queue = JobQueue(db_path)
+    runs = []
+    queue.register("auto-run", lambda payload: runs.append("auto-run"))
+    queue.register("sync", lambda payload: runs.append("sync"), idempotent=True)
+    auto_run, sync, exhausted = queue.submit("auto-run"), queue.submit("sync"), queue.submit("sync")
+    # As left by a crashed process: running, with a heartbeat long past the lease
+    queue._conn.execute("update jobs set status = 'running', started_at = 1, heartbeat_at = 1, attempts = 1")
+    queue._conn.execute("update jobs set attempts = ? where id = ?", (job_queue.MAX_ATTEMPTS, exhausted["id"]))
+    queue._conn.commit()
+
+    queue.start()
+    queues.append(queue)
+    wait_for(lambda: queue.get(sync["id"])["status"] == "succeeded")
+
+    assert runs == ["sync"]
+    assert queue.get(sync["id"])["attempts"] == 2
+    assert queue.get(auto_run["id"])["status"] == "failed"
+    assert "not idempotent" in queue.get(auto_run["id"])["error"]
+    assert queue.get(exhausted["id"])["status"] == "failed"
+
+
+def test_a_live_owners_job_is_not_taken_over(db_path, queues):
+    release = threading.Event()
+    first, second = JobQueue(db_path, workers=1), JobQueue(db_path, workers=1)
+    runs = []
+    for queue in (first, second):
+        queue.register("slow", lambda payload: (runs.append(1), release.wait(5)), idempotent=True)
+    job = first.submit("slow")
+    first.start()
+    queues.append(first)
+    wait_for(lambda: runs)
+
+    second.start()
+    queues.append(second)
+    time.sleep(0.1)
+    release.set()
+    wait_for(lambda: first.get(job["id"])["status"] == "succeeded")
+    assert len(runs) == 1
+
+
+def test_two_processes_never_claim_the_same_job(db_path, queues):
+    runs, lock = [], threading.Lock()
+
+    def handler(payload):
+        with lock:
+            runs.append(payload["i"])
+
+    for _ in range(2):
+        queue = JobQueue(db_path, workers=3)
+        queue.register("work", handler)
+        queues.append(queue)
+    jobs = [queues[i % 2].submit("work", {"i": i}) for i in range(60)]
+    for queue in queues:
+        queue.start()
+    wait_for(lambda: len(runs) == 60)
+    time.sleep(0.05)
+    assert sorted(runs) == list(range(60))
+
+
+def test_old_databases_get_the_new_columns(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        create table jobs (id text primary key, kind text not null, payload text not null, status text not null,
+                           result text, error text, idempotency_key text unique, created_at real not null,
+                           started_at real, finished_at real)
+    """)
+    conn.commit()
+    conn.close()
+    queue = JobQueue(db_path)
+    queue.register("sync", lambda payload: None)
+    assert queue.submit("sync")["attempts"] == 0
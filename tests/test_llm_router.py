@@ -0,0 +1,68 @@
+import time
+import asyncio
+import pytest
+import fakes
+import llm_router
+
+
+@pytest.fixture
+def route():
+    def register(name, backends, budget=5.0):
+        return llm_router.register_route(name, backends, budget=budget)
+    yield register
+    for name in [n for n in llm_router._routes if n.startswith("test-")]:
+        del llm_router._routes[name]
+
+
+def install(openai: fakes.Faults, anthropic: fakes.Faults):
+    fakes.install({"openai": openai, "anthropic": anthropic})
+
+
+def test_an_error_fails_over_without_retrying(fake_clients, route):
+    install(fakes.Faults(error_rate=1.0), fakes.Faults())
+    fakes.reset_counts()
+    route("test-failover", [("openai", "gpt-4o"), ("anthropic", "claude-3-5-sonnet-latest")])
+
+    completion = llm_router.complete("test-failover", "system", "user")
+
+    assert completion.backend == "anthropic:claude-3-5-sonnet-latest"
+    assert completion.failovers == 1 and not completion.hedged
+    assert fakes.snapshot_counts()["openai.chat.completions.create"] == 1
+
+
+def test_async_failover(fake_clients, route):
+    install(fakes.Faults(error_rate=1.0), fakes.Faults())
+    route("test-failover-async", [("openai", "gpt-4o"), ("anthropic", "claude-3-5-sonnet-latest")])
+    completion = asyncio.run(llm_router.complete_async("test-failover-async", "system", "user"))
+    assert completion.backend == "anthropic:claude-3-5-sonnet-latest" and completion.failovers == 1
+
+
+def test_slow_primary_is_hedged(fake_clients, route, monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGE_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(llm_router, "HEDGE_MIN_DELAY_SECONDS", 0.05)
+    install(fakes.Faults(latency_ms=1000), fakes.Faults())
+    route("test-hedge", [("openai", "gpt-4o"), ("anthropic", "claude-3-5-sonnet-latest")])
+
+    completion = llm_router.complete("test-hedge", "system", "user")
+    assert completion.backend == "anthropic:claude-3-5-sonnet-latest" and completion.hedged
+
+
+def test_hedge_timer_restarts_after_a_failover(fake_clients, route, monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGE_DELAY_SECONDS", 0.3)
+    monkeypatch.setattr(llm_router, "HEDGE_MIN_DELAY_SECONDS", 0.3)
+    # openai fails after 0.2s; the anthropic failover answers 0.2s later, before its own hedge delay
+    install(fakes.Faults(latency_ms=200, error_rate=1.0), fakes.Faults(latency_ms=200))
+    route("test-restart", [("openai", "a"), ("anthropic", "b"), ("openai", "c")])
+
+    completion = llm_router.complete("test-restart", "system", "user")
+    assert completion.backend == "anthropic:b"
+    assert completion.failovers == 1 and not completion.hedged
+
+
+def test_budget_is_enforced(fake_clients, route):
+    install(fakes.Faults(latency_ms=2000), fakes.Faults(latency_ms=2000))
+    route("test-budget", [("openai", "gpt-4o")], budget=0.2)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        llm_router.complete("test-budget", "system", "user")
+    assert time.monotonic() - started < 1.0
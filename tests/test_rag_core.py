@@ -0,0 +1,87 @@
+import json
+import numpy as np
+import pytest
+import rag_core
+from vector_index import parse_embedding
+
+
+# ========== EMBEDDING BATCHES ==========
+
+def test_batches_respect_the_input_count_limit(monkeypatch):
+    monkeypatch.setattr(rag_core, "EMBEDDING_MAX_BATCH_INPUTS", 3)
+    assert rag_core._embedding_batches(["a"] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batches_respect_the_token_limit(monkeypatch):
+    monkeypatch.setattr(rag_core, "EMBEDDING_MAX_BATCH_TOKENS", 100)
+    # ~4 chars per token: 200 chars is 51 tokens, so two don't fit in one batch
+    texts = ["x" * 200, "x" * 200, "x" * 100]
+    assert rag_core._embedding_batches(texts) == [[0], [1, 2]]
+
+
+def test_oversized_inputs_go_alone(monkeypatch):
+    monkeypatch.setattr(rag_core, "EMBEDDING_MAX_INPUT_TOKENS", 10)
+    assert rag_core._embedding_batches(["short", "x" * 100, "short"]) == [[1], [0, 2]]
+
+
+def test_no_texts_no_batches():
+    assert rag_core._embedding_batches([]) == []
+
+
+# ========== PGVECTOR LITERALS ==========
+
+def test_pgvector_literal_round_trips_at_float32_precision():
+    rng = np.random.default_rng(0)
+    vector = (rng.normal(size=1536) / 40).tolist() + [0.0, 1e-8, -1.0]
+    literal = rag_core.to_pgvector(vector)
+    assert literal.startswith("[") and literal.endswith("]") and " " not in literal
+    parsed = parse_embedding(literal)
+    assert len(parsed) == len(vector)
+    np.testing.assert_allclose(parsed, np.float32(vector), rtol=1e-6, atol=1e-12)
+
+
+def test_pgvector_literal_is_shorter_than_json():
+    vector = (np.random.default_rng(1).normal(size=256) / 16).tolist()
+    assert len(rag_core.to_pgvector(vector)) < len(json.dumps(vector))
+
+
+def test_shorten_embedding_renormalizes():
+    shortened = rag_core.shorten_embedding([3.0, 4.0, 12.0], 2)
+    assert shortened == pytest.approx([0.6, 0.8])
+
+
+# ========== PROFILE CHUNK SYNC ==========
+
+def profile_rows(db, category: str) -> list[str]:
+    return sorted(r["content"] for r in db.tables["user_profile"] if r["category"] == category)
+
+
+def test_profile_sync_only_embeds_new_chunks_and_removes_stale_ones(fake_clients):
+    import fakes
+
+    db = fake_clients.db
+    db.seed("user_profile", [
+        {"content": "Old chunk", "category": "branding", "embedding": [0.0] * rag_core.EMBEDDING_DIMENSIONS},
+        {"content": "Kept  chunk", "category": "branding", "embedding": [0.0] * rag_core.EMBEDDING_DIMENSIONS},
+        {"content": "Kept chunk", "category": "branding", "embedding": [0.0] * rag_core.EMBEDDING_DIMENSIONS},
+        {"content": "Other category", "category": "strategy", "embedding": [0.0] * rag_core.EMBEDDING_DIMENSIONS}
+    ])
+    fakes.reset_counts()
+
+    result = rag_core.sync_user_profile_chunks(["Kept chunk", "New chunk", " New  chunk "], "branding")
+
+    # The duplicate of the kept chunk goes too; whitespace variants are one chunk
+    assert result == {"added": 1, "removed": 2, "unchanged": 1, "errors": []}
+    assert profile_rows(db, "branding") in (["Kept  chunk", "New chunk"], ["Kept chunk", "New chunk"])
+    assert profile_rows(db, "strategy") == ["Other category"]
+    assert fakes.snapshot_counts().get("openai.embeddings.create") == 1
+
+
+def test_profile_sync_is_a_no_op_when_nothing_changed(fake_clients):
+    import fakes
+
+    rag_core.sync_user_profile_chunks(["One", "Two"], "branding")
+    fakes.reset_counts()
+    result = rag_core.sync_user_profile_chunks(["One", "Two"], "branding")
+    assert result == {"added": 0, "removed": 0, "unchanged": 2, "errors": []}
+    assert "openai.embeddings.create" not in fakes.snapshot_counts()
@@ -0,0 +1,141 @@
+import asyncio
+import httpx
+import pytest
+import rate_limiter
+from postgrest import SyncPostgrestClient
+from rate_limiter import TokenBucket
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = None
+
+
+class APIConnectionError(Exception):
+    """Named like the SDKs' wrapper around transport errors."""
+
+
+def wrapped(error: Exception) -> Exception:
+    """An SDK-style error raised `from` a transport error."""
+    try:
+        raise error
+    except Exception as cause:
+        try:
+            raise APIConnectionError("connection failed") from cause
+        except APIConnectionError as outer:
+            return outer
+
+
+def failing_once(error: Exception):
+    calls = []
+
+    def fn(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise error
+        return "ok"
+    return fn, calls
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "MAX_BACKOFF_SECONDS", 0.001)
+
+
+# ========== TOKEN BUCKET ==========
+
+def test_burst_is_free_then_calls_wait_for_tokens():
+    bucket = TokenBucket("test", rate=10.0, burst=2)
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == 0.0
+    assert bucket._reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket._reserve() == pytest.approx(0.2, abs=0.01)
+    assert bucket.stats["calls"] == 4
+    assert bucket.stats["throttled"] == 2
+
+
+def test_rate_limited_pauses_and_halves_the_rate():
+    bucket = TokenBucket("test", rate=10.0, burst=10)
+    bucket.on_rate_limited(1.0)
+    assert bucket.rate == 5.0
+    assert bucket._reserve() == pytest.approx(1.0, abs=0.05)
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(5.5)
+
+
+def test_max_wait_raises_and_returns_the_token():
+    bucket = TokenBucket("test", rate=1.0, burst=1)
+    bucket._reserve()
+    with pytest.raises(TimeoutError):
+        bucket._reserve(max_wait=0.5)
+    assert bucket.stats["calls"] == 1
+    assert bucket._reserve() == pytest.approx(1.0, abs=0.05)
+
+
+def test_cancelled_waiters_leave_the_queue():
+    bucket = TokenBucket("test", rate=1.0, burst=1)
+
+    async def main():
+        waiters = [asyncio.ensure_future(bucket.acquire_async()) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        assert bucket.stats["waiting"] == 3
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(main())
+    assert bucket.stats["waiting"] == 0
+
+
+# ========== RETRIES ==========
+
+@pytest.mark.parametrize("error", [StatusError(503), StatusError(429), httpx.ReadTimeout("read")])
+def test_idempotent_calls_retry_transient_errors(error):
+    fn, calls = failing_once(error)
+    assert rate_limiter.call("test-retry", fn) == "ok"
+    assert len(calls) == 2
+
+
+def test_client_errors_are_not_retried():
+    fn, calls = failing_once(StatusError(400))
+    with pytest.raises(StatusError):
+        rate_limiter.call("test-retry", fn)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("error", [StatusError(503), StatusError(504), wrapped(httpx.ReadTimeout("read"))])
+def test_writes_are_not_retried_once_they_may_have_been_applied(error):
+    fn, calls = failing_once(error)
+    with pytest.raises(type(error)):
+        rate_limiter.call_write("test-write", fn)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("error", [StatusError(429), wrapped(httpx.ConnectError("refused")), httpx.PoolTimeout("pool")])
+def test_writes_retry_when_the_request_never_took_effect(error):
+    fn, calls = failing_once(error)
+    assert rate_limiter.call_write("test-write", fn) == "ok"
+    assert len(calls) == 2
+
+
+def test_plain_inserts_are_the_only_non_idempotent_queries():
+    client = SyncPostgrestClient("http://localhost/rest/v1")
+    assert not rate_limiter._query_is_idempotent(client.table("t").insert({"a": 1}))
+    assert rate_limiter._query_is_idempotent(client.table("t").upsert({"a": 1}))
+    assert rate_limiter._query_is_idempotent(client.table("t").update({"a": 1}).eq("id", 1))
+    assert rate_limiter._query_is_idempotent(client.table("t").select("*"))
+    assert rate_limiter._query_is_idempotent(client.rpc("match_content", {}))
+
+
+def test_call_once_does_not_retry_and_bounds_the_timeout():
+    import time
+
+    fn, calls = failing_once(StatusError(503))
+    deadline = time.monotonic() + 5
+    with pytest.raises(StatusError):
+        rate_limiter.call_once("test-once", fn, deadline, model="m")
+    assert len(calls) == 1
+    assert 0 < calls[0]["timeout"] <= 5
+    assert calls[0]["model"] == "m"
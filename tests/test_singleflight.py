@@ -0,0 +1,114 @@
+import time
+import asyncio
+import threading
+import pytest
+import singleflight
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_keys_ignore_whitespace_and_key_order():
+    assert singleflight.make_key({"a": "x  y", "b": 1}) == singleflight.make_key({"b": 1, "a": " x y "})
+    assert singleflight.make_key({"a": "x y"}) != singleflight.make_key({"a": "x z"})
+
+
+def test_concurrent_identical_calls_run_once():
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    @singleflight.coalesce("test-sync")
+    def work(topic: str, style: str = "Story") -> dict:
+        runs.append(topic)
+        started.set()
+        release.wait(5)
+        return {"topic": topic, "tags": []}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(work("Pricing")))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(work(" Pricing ", style="Story"))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    wait_for(lambda: singleflight.group("test-sync").stats["coalesced"] == 4)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert runs == ["Pricing"]
+    assert len(results) == 5
+    # Waiters get copies: mutating one result doesn't leak into the others
+    results[0]["tags"].append("x")
+    assert sum(1 for r in results if r["tags"]) == 1
+
+
+def test_waiters_get_the_leaders_error():
+    started, release = threading.Event(), threading.Event()
+
+    @singleflight.coalesce("test-error")
+    def work(topic: str):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    errors = []
+
+    def run():
+        try:
+            work("Pricing")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=run))
+    threads[1].start()
+    wait_for(lambda: singleflight.group("test-error").stats["coalesced"] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert singleflight.group("test-error").in_flight() == 0
+
+
+def test_async_calls_share_one_task():
+    runs = []
+
+    @singleflight.coalesce("test-async")
+    async def work(topic: str) -> str:
+        runs.append(topic)
+        await asyncio.sleep(0.01)
+        return topic.upper()
+
+    async def main():
+        return await asyncio.gather(*(work("pricing") for _ in range(5)))
+
+    assert asyncio.run(main()) == ["PRICING"] * 5
+    assert runs == ["pricing"]
+
+
+def test_sequential_calls_are_not_cached():
+    runs = []
+
+    @singleflight.coalesce("test-sequential")
+    def work(topic: str) -> str:
+        runs.append(topic)
+        return topic
+
+    work("a")
+    work("a")
+    assert runs == ["a", "a"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_groups():
+    yield
+    for name in [n for n in singleflight._groups if n.startswith("test-")]:
+        del singleflight._groups[name]
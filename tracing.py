@@ -0,0 +1,196 @@
+"""
+ICOS Tracing
+In-process spans and Prometheus-style metrics, no collector required.
+
+`with span("rag.embedding", chars=len(text)):` (or `@traced("name")`) times a
+pipeline stage or outbound call, records its outcome and attributes, and links
+it to the current request id and parent span through contextvars. Finished
+spans feed per-name latency histograms, in-flight gauges and error counters
+(render_prometheus() for /metrics) and a bounded buffer of recent spans
+(recent_spans() for per-request breakdowns).
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+# Finished spans kept for /traces
+SPAN_BUFFER_SIZE = int(os.environ.get("ICOS_TRACE_BUFFER", "5000"))
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("icos_request_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("icos_span", default=None)
+
+_lock = threading.Lock()
+_recent: deque = deque(maxlen=SPAN_BUFFER_SIZE)
+_histograms: dict[str, list] = {}  # name -> [bucket counts..., +Inf count, sum seconds]
+_in_flight: dict[str, int] = {}
+_errors: dict[str, int] = {}
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "request_id", "started_at", "duration_ms", "outcome", "attrs")
+
+    def __init__(self, name: str, attrs: dict):
+        parent = _current_span.get()
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.request_id = request_id_var.get()
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.outcome = "ok"
+        self.attrs = dict(attrs)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "outcome": self.outcome,
+            "attrs": self.attrs
+        }
+
+
+def _observe(span: Span, seconds: float) -> None:
+    with _lock:
+        histogram = _histograms.setdefault(span.name, [0] * (len(BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[len(BUCKETS)] += 1  # +Inf
+        histogram[-1] += seconds
+        _in_flight[span.name] -= 1
+        if span.outcome != "ok":
+            _errors[span.name] = _errors.get(span.name, 0) + 1
+        _recent.append(span.as_dict())
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a stage; exceptions mark the span as errored and propagate."""
+    current = Span(name, attrs)
+    token = _current_span.set(current)
+    with _lock:
+        _in_flight[name] = _in_flight.get(name, 0) + 1
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = "cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else f"error:{type(e).__name__}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        current.duration_ms = round(elapsed * 1000, 3)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generator closed from another context (e.g. an abandoned stream)
+            pass
+        _observe(current, elapsed)
+
+
+def annotate(**attrs) -> None:
+    """Add attributes (sizes, cache status, ...) to the innermost open span."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() for sync and async functions."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper_async(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return wrapper_async
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def request_context(request_id: str = None) -> Iterator[str]:
+    """Bind a request id (a fresh one if not given) for everything inside the block."""
+    request_id = request_id or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(token)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Carry the caller's request id and parent span into worker threads
+    (ThreadPoolExecutor does not copy contextvars; asyncio.to_thread does).
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+# ========== READ SIDE ==========
+
+def recent_spans(request_id: str = None, limit: int = 200) -> list[dict]:
+    """Most recent finished spans, optionally for one request, oldest first."""
+    with _lock:
+        spans = [s for s in _recent if request_id is None or s["request_id"] == request_id]
+    return spans[-limit:]
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """All span metrics in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        histograms = {name: list(h) for name, h in _histograms.items()}
+        in_flight = dict(_in_flight)
+        errors = dict(_errors)
+
+    lines = [
+        "# HELP icos_span_duration_seconds Duration of ICOS pipeline stages and outbound calls.",
+        "# TYPE icos_span_duration_seconds histogram"
+    ]
+    for name, histogram in sorted(histograms.items()):
+        label = _label(name)
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'icos_span_duration_seconds_bucket{{span="{label}",le="{bound}"}} {count}')
+        lines.append(f'icos_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {histogram[len(BUCKETS)]}')
+        lines.append(f'icos_span_duration_seconds_sum{{span="{label}"}} {histogram[-1]:.6f}')
+        lines.append(f'icos_span_duration_seconds_count{{span="{label}"}} {histogram[len(BUCKETS)]}')
+
+    lines += ["# HELP icos_span_in_flight Stages currently running.", "# TYPE icos_span_in_flight gauge"]
+    for name, count in sorted(in_flight.items()):
+        lines.append(f'icos_span_in_flight{{span="{_label(name)}"}} {count}')
+
+    lines += ["# HELP icos_span_errors_total Stages that ended in an exception.", "# TYPE icos_span_errors_total counter"]
+    for name in sorted(histograms):
+        lines.append(f'icos_span_errors_total{{span="{_label(name)}"}} {errors.get(name, 0)}')
+    return "\n".join(lines) + "\n"
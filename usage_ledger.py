@@ -0,0 +1,214 @@
+"""
+ICOS Usage Ledger
+Append-only JSONL record of every LLM and embedding call: tokens, model,
+latency and the workflow that made it.
+
+llm_usage.record_usage() appends one line per call. Wrap a run in
+`with workflow("newsletter"):` to tag its calls (the API tags requests from
+an X-Workflow header, jobs by kind); untagged calls use ICOS_WORKFLOW or
+"adhoc".
+
+Usage:
+  python usage_ledger.py
+  python usage_ledger.py --by workflow,model --since 2026-01-01
+  python usage_ledger.py --workflow auto-run --json
+"""
+
+import os
+import json
+import argparse
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+DEFAULT_LEDGER_PATH = os.path.join(os.path.dirname(__file__), ".cache", "usage_ledger.jsonl")
+LEDGER_PATH = os.environ.get("ICOS_USAGE_LEDGER_PATH", DEFAULT_LEDGER_PATH)
+LEDGER_ENABLED = os.environ.get("ICOS_USAGE_LEDGER", "1") != "0"
+DEFAULT_WORKFLOW = os.environ.get("ICOS_WORKFLOW", "adhoc")
+
+# USD per million tokens (input, output); cached input is priced with
+# llm_usage.CACHE_PRICE_FACTORS. Models not listed get no cost estimate.
+MODEL_PRICES = {
+    "claude-3-5-sonnet-latest": (3.00, 15.00),
+    "gpt-4o": (2.50, 10.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0)
+}
+
+TOKEN_FIELDS = ["input_tokens", "cached_input_tokens", "cache_write_tokens", "output_tokens"]
+GROUP_FIELDS = ["day", "workflow", "agent", "provider", "model"]
+
+workflow_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("icos_workflow", default=None)
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def workflow(tag: str) -> Iterator[str]:
+    """Tag calls inside the block with `tag`, unless an outer block already set one."""
+    if workflow_var.get() is not None:
+        yield workflow_var.get()
+        return
+    token = workflow_var.set(tag)
+    try:
+        yield tag
+    finally:
+        workflow_var.reset(token)
+
+
+def current_workflow() -> str:
+    return workflow_var.get() or DEFAULT_WORKFLOW
+
+
+def append(entry: dict, path: str = None) -> None:
+    """Write one ledger line (a single O_APPEND write, safe across processes)."""
+    if not LEDGER_ENABLED:
+        return
+    path = path or LEDGER_PATH
+    line = json.dumps(entry, separators=(",", ":")) + "\n"
+    with _lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def record(
+    agent: str,
+    provider: str,
+    model: Optional[str],
+    usage: dict,
+    latency_ms: Optional[float] = None,
+    request_id: Optional[str] = None
+) -> dict:
+    """Append a call's normalized usage (see llm_usage.extract_usage) and return the entry."""
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "workflow": current_workflow(),
+        "agent": agent,
+        "provider": provider,
+        "model": model,
+        **{field: usage.get(field, 0) for field in TOKEN_FIELDS},
+        "latency_ms": latency_ms,
+        "request_id": request_id
+    }
+    append(entry)
+    return entry
+
+
+# ========== READ SIDE ==========
+
+def read(path: str = None, since: str = None) -> Iterator[dict]:
+    """Ledger entries in write order; a torn last line (crash mid-write) is skipped."""
+    path = path or LEDGER_PATH
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if since and entry["ts"][:10] < since:
+                continue
+            yield entry
+
+
+def _percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(pct * len(ordered))) - 1))], 1)
+
+
+def estimate_cost(entry: dict) -> Optional[float]:
+    """Estimated USD for one entry, or None for an unpriced model."""
+    from llm_usage import CACHE_PRICE_FACTORS
+
+    prices = MODEL_PRICES.get(entry.get("model"))
+    if prices is None:
+        return None
+    factors = CACHE_PRICE_FACTORS.get(entry["provider"], {"read": 1.0, "write": 1.0})
+    input_tokens = (
+        entry["input_tokens"]
+        + entry["cached_input_tokens"] * factors["read"]
+        + entry["cache_write_tokens"] * factors["write"]
+    )
+    return (input_tokens * prices[0] + entry["output_tokens"] * prices[1]) / 1_000_000
+
+
+def summarize(entries, by: list[str] = None) -> list[dict]:
+    """Calls, token totals, p50/p95 latency and estimated cost per group."""
+    by = by or ["day", "workflow", "model"]
+    groups: dict[tuple, dict] = defaultdict(lambda: {"calls": 0, "latencies": [], "cost": 0.0, "unpriced": 0,
+                                                       **{field: 0 for field in TOKEN_FIELDS}})
+    for entry in entries:
+        values = {**entry, "day": entry["ts"][:10]}
+        group = groups[tuple(values.get(field) for field in by)]
+        group["calls"] += 1
+        for field in TOKEN_FIELDS:
+            group[field] += entry.get(field) or 0
+        if entry.get("latency_ms") is not None:
+            group["latencies"].append(entry["latency_ms"])
+        cost = estimate_cost(entry)
+        if cost is None:
+            group["unpriced"] += 1
+        else:
+            group["cost"] += cost
+
+    rows = []
+    for key, group in sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])):
+        total_input = group["input_tokens"] + group["cached_input_tokens"] + group["cache_write_tokens"]
+        rows.append({
+            **dict(zip(by, key)),
+            "calls": group["calls"],
+            **{field: group[field] for field in TOKEN_FIELDS},
+            "cache_hit_ratio": round(group["cached_input_tokens"] / total_input, 4) if total_input else 0.0,
+            "p50_latency_ms": _percentile(group["latencies"], 0.50),
+            "p95_latency_ms": _percentile(group["latencies"], 0.95),
+            "est_cost_usd": round(group["cost"], 6),
+            "unpriced_calls": group["unpriced"]
+        })
+    return rows
+
+
+def _print_table(rows: list[dict], by: list[str]) -> None:
+    columns = by + ["calls", "input_tokens", "cached_input_tokens", "output_tokens", "cache_hit_ratio",
+                    "p50_latency_ms", "p95_latency_ms", "est_cost_usd"]
+    cells = [[("-" if row[c] is None else str(row[c])) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+    print(f"\nTotal: {sum(row['calls'] for row in rows)} calls, ${sum(row['est_cost_usd'] for row in rows):.4f} estimated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=LEDGER_PATH)
+    parser.add_argument("--by", default="day,workflow,model", help=f"Comma-separated, from: {', '.join(GROUP_FIELDS)}")
+    parser.add_argument("--since", help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--workflow", help="Only this workflow")
+    parser.add_argument("--json", action="store_true", help="Print rows as JSON")
+    args = parser.parse_args()
+
+    by = [field.strip() for field in args.by.split(",") if field.strip()]
+    unknown = [field for field in by if field not in GROUP_FIELDS]
+    if unknown:
+        parser.error(f"Unknown --by field(s): {', '.join(unknown)}")
+
+    entries = (e for e in read(args.path, args.since) if not args.workflow or e["workflow"] == args.workflow)
+    rows = summarize(entries, by)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    elif not rows:
+        print(f"No usage recorded in {args.path}")
+    else:
+        _print_table(rows, by)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+ICOS Local Vector Index
+In-process mirror of content_library for top-k cosine search without the match_content RPC.
+
+Vectors can be kept at fewer dimensions than stored (text-embedding-3 vectors
+stay meaningful when truncated and re-normalized) and as float16 or int8
+(one float32 scale per row) to cut memory 2-4x. Scoring is done in float32:
+int8 widens quickly, float16 roughly 10x slower than a float32 search
+(benchmarks/bench_embedding_recall.py has the numbers).
+"""
+
+import json
+import threading
+import numpy as np
+import rate_limiter
+
+# Columns returned by match_content (plus "similarity")
+MATCH_COLUMNS = ["id", "content", "topic", "style", "virality_score", "verdict", "improvement_tip"]
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Rows scored per block for float16/int8, bounding the float32 working copy
+SCORE_CHUNK_ROWS = 1024
+
+
+def parse_embedding(value) -> list[float]:
+    """PostgREST returns pgvector columns as '[0.1,0.2,...]' strings."""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class LocalVectorIndex:
+    def __init__(self, dimensions: int = 1536, dtype: str = "float32"):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported index dtype {dtype!r} (use one of {', '.join(STORAGE_DTYPES)})")
+        self.dimensions = dimensions
+        self.dtype = dtype
+        self.rows: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._matrix = np.zeros((0, dimensions), dtype=STORAGE_DTYPES[dtype])
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _normalize(self, embedding) -> np.ndarray:
+        """Unit vector of the first `dimensions` components (longer embeddings are truncated)."""
+        vector = np.asarray(embedding, dtype=np.float32)[:self.dimensions]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _encode(self, vector: np.ndarray) -> tuple[np.ndarray, float]:
+        """Stored form of a unit vector and its scale (1.0 unless int8)."""
+        if self.dtype != "int8":
+            return vector.astype(STORAGE_DTYPES[self.dtype]), 1.0
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def add(self, row: dict, embedding: list[float]) -> None:
+        """Insert or replace one content_library row."""
+        vector, scale = self._encode(self._normalize(embedding))
+        record = {c: row.get(c) for c in MATCH_COLUMNS}
+        with self._lock:
+            position = self._positions.get(record["id"])
+            if position is not None:
+                self.rows[position] = record
+                self._matrix[position] = vector
+                self._scales[position] = scale
+                return
+
+            count = len(self.rows)
+            if count == self._matrix.shape[0]:
+                # Grow geometrically so incremental ingests stay amortized O(1)
+                grown = np.zeros((max(64, count * 2), self.dimensions), dtype=self._matrix.dtype)
+                grown[:count] = self._matrix[:count]
+                self._matrix = grown
+                self._scales = np.concatenate([self._scales[:count], np.zeros(grown.shape[0] - count, dtype=np.float32)])
+            self._matrix[count] = vector
+            self._scales[count] = scale
+            self.rows.append(record)
+            if record["id"] is not None:
+                self._positions[record["id"]] = count
+
+    def update(self, content_id: str, **fields) -> None:
+        """Patch metadata (score, verdict, ...) of an indexed row in place."""
+        with self._lock:
+            position = self._positions.get(content_id)
+            if position is not None:
+                self.rows[position] = {**self.rows[position], **{
+                    k: v for k, v in fields.items() if k in MATCH_COLUMNS
+                }}
+
+    def load_snapshot(self, supabase, page_size: int = 1000) -> int:
+        """Load every embedded content_library row, paging through PostgREST."""
+        columns = ", ".join(MATCH_COLUMNS + ["embedding"])
+        start = 0
+        while True:
+            result = rate_limiter.execute(supabase.table("content_library").select(columns).not_.is_(
+                "embedding", "null"
+            ).order("id").range(start, start + page_size - 1))
+            page = result.data or []
+            for row in page:
+                self.add(row, parse_embedding(row["embedding"]))
+            if len(page) < page_size:
+                return len(self.rows)
+            start += page_size
+
+    def search(self, query_embedding: list[float], match_threshold: float = 0.7, match_count: int = 5) -> list[dict]:
+        """Top-k cosine search with the same result shape as the match_content RPC."""
+        with self._lock:
+            count = len(self.rows)
+            matrix = self._matrix[:count]
+            scales = self._scales[:count]
+            rows = self.rows[:count]
+        if not count or match_count <= 0:
+            return []
+
+        scores = self._scores(matrix, scales, self._normalize(query_embedding))
+        candidates = np.flatnonzero(scores > match_threshold)
+        if candidates.size > match_count:
+            top = np.argpartition(scores[candidates], -match_count)[-match_count:]
+            candidates = candidates[top]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [{**rows[i], "similarity": float(scores[i])} for i in ordered]
+
+    def _scores(self, matrix: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row with a unit query, computed in float32."""
+        if self.dtype == "float32":
+            return matrix @ query
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_CHUNK_ROWS):
+            block = slice(start, start + SCORE_CHUNK_ROWS)
+            scores[block] = matrix[block].astype(np.float32) @ query
+        return scores * scales if self.dtype == "int8" else scores
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the vectors (and int8 scales)."""
+        count = len(self.rows)
+        return self._matrix[:count].nbytes + (self._scales[:count].nbytes if self.dtype == "int8" else 0)
@@ -3,14 +3,18 @@ ICOS Visualist Agent - Gemini/Imagen Edition
 Uses Google's Gemini for concept generation and Imagen for image creation.
 """
 
-import os
 import json
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
+from clients import get_gemini
+from llm_usage import record_usage
+import rate_limiter
+import tracing
+from singleflight import coalesce
 
 load_dotenv()
 
-genai.configure(api_key=os.environ.get("GOOGLE_API_KEY", ""))
+VISUAL_MODEL = "gemini-2.0-flash"
 
 BRAND_STAMP = "Include a small 'WB' monogram stamp in the bottom right corner as a subtle watermark."
 
@@ -37,14 +41,11 @@ VISUAL_STYLES = """
 """
 
 
-def generate_visual_concept(topic: str, post_content: str, style_preference: str = None) -> dict:
-    """Generate a visual concept using Gemini."""
-    
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    
+def _visual_prompt(topic: str, post_content: str, style_preference: str = None) -> str:
+    """Build the Gemini concept prompt."""
     style_hint = f"\nPreferred style: {style_preference}" if style_preference else ""
     
-    prompt = f"""You are a visual content designer. Given this topic and post, create a visual concept.
+    return f"""You are a visual content designer. Given this topic and post, create a visual concept.
 
 {VISUAL_STYLES}
 
@@ -68,18 +69,43 @@ Return ONLY valid JSON:
     "imagen_prompt": "Detailed prompt for Google Imagen API with WB branding"
 }}"""
 
-    response = model.generate_content(prompt)
-    
+
+def _parse_concept(raw: str) -> dict:
+    """Parse Gemini's JSON answer, tolerating markdown fences."""
     try:
         # Clean response and parse JSON
-        text = response.text.strip()
+        text = raw.strip()
         if text.startswith("```"):
             text = text.split("```")[1]
             if text.startswith("json"):
                 text = text[4:]
         return json.loads(text)
     except:
-        return {"error": "Failed to parse", "raw": response.text}
+        return {"error": "Failed to parse", "raw": raw}
+
+
+@tracing.traced("visualist.generate_visual_concept")
+def generate_visual_concept(topic: str, post_content: str, style_preference: str = None) -> dict:
+    """Generate a visual concept using Gemini."""
+    
+    model = get_gemini(VISUAL_MODEL)
+    started = time.perf_counter()
+    response = rate_limiter.call("gemini", model.generate_content, _visual_prompt(topic, post_content, style_preference))
+    record_usage("visualist", "google", response, model=VISUAL_MODEL, started=started)
+    tracing.annotate(topic=topic, post_chars=len(post_content), output_chars=len(response.text))
+    return _parse_concept(response.text)
+
+
+@tracing.traced("visualist.generate_visual_concept")
+async def generate_visual_concept_async(topic: str, post_content: str, style_preference: str = None) -> dict:
+    """Async variant of generate_visual_concept."""
+    
+    model = get_gemini(VISUAL_MODEL)
+    started = time.perf_counter()
+    response = await rate_limiter.call_async("gemini", model.generate_content_async, _visual_prompt(topic, post_content, style_preference))
+    record_usage("visualist", "google", response, model=VISUAL_MODEL, started=started)
+    tracing.annotate(topic=topic, post_chars=len(post_content), output_chars=len(response.text))
+    return _parse_concept(response.text)
 
 
 def generate_image_with_imagen(prompt: str) -> str:
@@ -99,6 +125,7 @@ def generate_image_with_imagen(prompt: str) -> str:
     }
 
 
+@coalesce("create_visual_for_post")
 def create_visual_for_post(topic: str, post_content: str, style: str = None) -> dict:
     """Full pipeline: generate concept."""
     concept = generate_visual_concept(topic, post_content, style)
@@ -109,6 +136,17 @@ def create_visual_for_post(topic: str, post_content: str, style: str = None) ->
     return concept
 
 
+@coalesce("create_visual_for_post")
+async def create_visual_for_post_async(topic: str, post_content: str, style: str = None) -> dict:
+    """Async variant of create_visual_for_post."""
+    concept = await generate_visual_concept_async(topic, post_content, style)
+    
+    if "imagen_prompt" in concept:
+        concept["imagen_ready"] = generate_image_with_imagen(concept["imagen_prompt"])
+    
+    return concept
+
+
 if __name__ == "__main__":
     import sys
     